@@ -0,0 +1,103 @@
+"""
+Measures GET /todos/{id} latency while a storm of logins is running.
+
+Runs against a live server, with rate limits high enough not to get in the way,
+as every login comes from the same address:
+
+    GLOBAL_RATELIMIT_LIMIT=1000000000 AUTH_RATELIMIT_LIMIT=1000000000 python -m main.serve
+    python -m benchmarks.login_storm --base-url http://localhost:88/api/v1
+
+A run fails if any request is rate limited, as rate limited logins cost next to
+nothing and would hide the storm.
+
+Reports p50/p99 latency of the read path on its own, then again while
+--storm-concurrency clients log in as fast as they can.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+async def measure_reads(client: httpx.AsyncClient, path: str, headers: dict, count: int) -> list[float]:  # noqa: D103, E501
+    latencies = []
+
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+    return latencies
+
+
+async def login_forever(client: httpx.AsyncClient, credentials: dict, counter: list[int]) -> None:  # noqa: D103, E501
+    while True:
+        response = await client.post("/users/token", json=credentials)
+        counter[response.status_code == 200] += 1
+
+        if response.status_code == 429:
+            raise RuntimeError(
+                "Logins were rate limited, raise the server's AUTH_RATELIMIT_LIMIT and "
+                "GLOBAL_RATELIMIT_LIMIT"
+            )
+
+
+def report(name: str, latencies: list[float]) -> None:  # noqa: D103
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(  # noqa: T201
+        f"{name:<12} p50 {quantiles[49] * 1000:8.2f} ms   p99 {quantiles[98] * 1000:8.2f} ms"
+    )
+
+
+async def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:88/api/v1")
+    parser.add_argument("--reads", type=int, default=500)
+    parser.add_argument("--storm-concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    credentials = {"username": uuid.uuid4().hex[:16], "password": uuid.uuid4().hex}
+    limits = httpx.Limits(max_connections=args.storm_concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        (await client.post("/users/", json=credentials)).raise_for_status()
+        response = await client.post("/users/token", json=credentials)
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        todo = await client.post(
+            "/todos/",
+            headers=headers,
+            json={"title": "benchmark", "description": "", "due_at": "2030-01-01T00:00:00"},
+        )
+        todo.raise_for_status()
+        path = f"/todos/{todo.json()['id']}"
+
+        report("idle", await measure_reads(client, path, headers, args.reads))
+
+        counter = [0, 0]
+        storm = [
+            asyncio.create_task(login_forever(client, credentials, counter))
+            for _ in range(args.storm_concurrency)
+        ]
+        await asyncio.sleep(1)
+
+        report("login storm", await measure_reads(client, path, headers, args.reads))
+
+        for task in storm:
+            task.cancel()
+        for result in await asyncio.gather(*storm, return_exceptions=True):
+            if isinstance(result, RuntimeError):
+                raise result
+
+        print(f"logins: {counter[1]} succeeded, {counter[0]} rejected")  # noqa: T201
+
+        await client.delete("/users/", headers=headers)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+"""
+Compares todo insert and per-user query latency across storage layouts, Postgres only.
+
+Each layout is built from scratch in the database at --database-url, so point it at
+a scratch database, every table of the app in it is dropped:
+
+    python -m benchmarks.partitioning --database-url postgresql+asyncpg://... \\
+        --users 1000 --rows 1000000
+
+The layouts are the todo table with random UUIDv4 ids, as before, with time-ordered
+UUIDv7 ids, and with UUIDv7 ids hash partitioned by owner, see
+main.core.todo_partitions. Rows are inserted in batches spread over random owners,
+as many users creating todos at once do, and the insert latency is measured per
+batch. Then a user's first page, by due date, and their stats are read for random
+users, timing each query.
+
+Differences only show once the table and its indexes outgrow shared_buffers, so
+use enough --rows for that.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+# name: (id factory, partitioned)
+LAYOUTS = {
+    "uuid4": ("uuid4", False),
+    "uuid7": ("uuid7", False),
+    "uuid7 partitioned": ("uuid7", True),
+}
+
+PAGE_SIZE = 50
+
+
+def quantiles_ms(latencies: list[float]) -> dict:  # noqa: D103
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {"p50_ms": quantiles[49] * 1000, "p95_ms": quantiles[94] * 1000}
+
+
+async def reset(engine: AsyncEngine) -> None:  # noqa: D103
+    from sqlalchemy import text
+
+    async with engine.begin() as connection:
+        await connection.execute(
+            text(
+                "DROP TABLE IF EXISTS todo, todo_partitioned, todo_ids, todo_stats, tokens, "
+                "users, schema_version CASCADE"
+            )
+        )
+        await connection.execute(text("DROP FUNCTION IF EXISTS todo_partition_mirror()"))
+        await connection.execute(text("DROP FUNCTION IF EXISTS todo_ids_apply()"))
+
+
+async def build(engine: AsyncEngine, args: argparse.Namespace, partitioned: bool) -> list:  # noqa: E501
+    """
+    Migrate a fresh schema, partition it if asked, and create the users.
+    """
+    from main.core.migrations import migrate
+    from main.core.schema.user import Users
+    from main.core.todo_partitions import backfill, cutover, prepare
+    from sqlmodel import insert
+
+    await reset(engine)
+    await migrate(engine)
+
+    if partitioned:
+        async with engine.begin() as connection:
+            await prepare(connection, args.partitions)
+        await backfill(engine, 1000, 0)
+        async with engine.begin() as connection:
+            await cutover(connection)
+
+    users = [
+        {"id": uuid4(), "username": f"bench-{index}", "hashed_password": "-"}
+        for index in range(args.users)
+    ]
+    async with engine.begin() as connection:
+        await connection.execute(insert(Users), users)
+
+    return [user["id"] for user in users]
+
+
+async def insert_todos(engine: AsyncEngine, args: argparse.Namespace, owner_ids: list, id_factory: Callable[[], UUID]) -> list[float]:  # noqa: E501
+    from main.core.schema.todo import Todo
+    from sqlmodel import insert
+
+    now = datetime.now()
+    latencies = []
+
+    for _ in range(args.rows // args.batch_size):
+        rows = [
+            {
+                "id": id_factory(),
+                "owner_id": random.choice(owner_ids),  # noqa: S311
+                "title": "todo",
+                "description": "Created by the partitioning benchmark",
+                "completed": random.random() < 0.5,  # noqa: S311
+                "created_at": now,
+                "due_at": now + timedelta(hours=random.uniform(-240, 240)),  # noqa: S311
+                "version": 1,
+            }
+            for _ in range(args.batch_size)
+        ]
+
+        start = time.perf_counter()
+        async with engine.begin() as connection:
+            await connection.execute(insert(Todo), rows)
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+async def query_todos(engine: AsyncEngine, args: argparse.Namespace, owner_ids: list) -> tuple[list[float], list[float]]:  # noqa: E501
+    from main.core.schema.todo import Todo
+    from main.core.todo_stats import get_stats
+    from sqlalchemy.ext.asyncio.session import AsyncSession
+    from sqlmodel import select
+
+    pages, stats = [], []
+
+    async with AsyncSession(engine) as session:
+        for _ in range(args.queries):
+            owner_id = random.choice(owner_ids)  # noqa: S311
+
+            start = time.perf_counter()
+            await session.scalars(
+                select(Todo)
+                .where(Todo.owner_id == owner_id)
+                .order_by(Todo.due_at, Todo.id)
+                .limit(PAGE_SIZE)
+            )
+            pages.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await get_stats(session, owner_id, datetime.now())
+            stats.append(time.perf_counter() - start)
+
+    return pages, stats
+
+
+async def run(args: argparse.Namespace, layout: str) -> dict:  # noqa: D103
+    from main.core.database import create_engine
+    from main.utils.ids import uuid7
+    from sqlalchemy import text
+
+    id_name, partitioned = LAYOUTS[layout]
+    id_factory = uuid7 if id_name == "uuid7" else uuid4
+
+    engine = create_engine()
+
+    try:
+        owner_ids = await build(engine, args, partitioned)
+        inserts = await insert_todos(engine, args, owner_ids, id_factory)
+
+        async with engine.begin() as connection:
+            await connection.execute(text("ANALYZE todo"))
+            size = await connection.scalar(
+                text(
+                    "SELECT sum(pg_total_relation_size(relid)) "
+                    "FROM pg_partition_tree('todo')"
+                )
+            )
+
+        pages, stats = await query_todos(engine, args, owner_ids)
+    finally:
+        await engine.dispose()
+
+    return {
+        "layout": layout,
+        "size_mb": size / 2**20,
+        "insert": quantiles_ms(inserts),
+        "page": quantiles_ms(pages),
+        "stats": quantiles_ms(stats),
+    }
+
+
+def report(results: list[dict]) -> None:  # noqa: D103
+    print(  # noqa: T201
+        f"{'layout':<20}{'size MB':>9}"
+        + "".join(f"{name + ' p50/p95 ms':>24}" for name in ["insert", "page", "stats"])
+    )
+
+    for result in results:
+        print(  # noqa: T201
+            f"{result['layout']:<20}{result['size_mb']:>9.0f}"
+            + "".join(
+                f"{result[name]['p50_ms']:>15.2f} /{result[name]['p95_ms']:>7.2f}"
+                for name in ["insert", "page", "stats"]
+            )
+        )
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--database-url", required=True, help="a scratch Postgres database")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="comma separated")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--partitions", type=int, default=16)
+    args = parser.parse_args()
+
+    if not args.database_url.startswith("postgresql"):
+        parser.error("Partitioning is only supported on Postgres")
+
+    # Read by the app's settings, so it must be set before they're imported
+    os.environ["DATABASE_URL"] = args.database_url
+
+    results = [asyncio.run(run(args, layout)) for layout in args.layouts.split(",")]
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
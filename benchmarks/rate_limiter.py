@@ -0,0 +1,151 @@
+"""
+Compares the throughput of the rate limiter middlewares.
+
+Runs a trivial app in-process behind each middleware and drives it with httpx:
+
+    python -m benchmarks.rate_limiter --requests 5000 --concurrency 50
+
+By default this uses fakeredis. Each run flushes the database, so a real Redis is
+only used when given explicitly, with --yes-flush to confirm it can be flushed:
+
+    python -m benchmarks.rate_limiter --redis-url redis://localhost:6379/15 --yes-flush
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+import httpx  # noqa: E402
+import redis.asyncio as redis  # noqa: E402
+from fastapi import Request  # noqa: E402
+from main.core.rate_limiter import RateLimiterMiddleware  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.responses import JSONResponse, PlainTextResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+
+class LegacyRateLimiterMiddleware(BaseHTTPMiddleware):
+    """
+    The previous `BaseHTTPMiddleware` based implementation, kept for comparison.
+    """
+
+    def __init__(self, app, limit: int, interval: int, redis_pool: redis.ConnectionPool):  # noqa: ANN001, D107
+        super().__init__(app)
+        self.limit = limit
+        self.interval = interval
+        self.redis: redis.Redis = redis.Redis(connection_pool=redis_pool)
+
+    async def dispatch(self, request: Request, call_next):  # noqa: ANN001, ANN201, D102
+        ip = request.client.host
+        current_time = time.time()
+        if (
+            current_time - float(await self.redis.get(f"{ip}_time") or 0)
+            > self.interval
+        ):
+            await self.redis.set(f"{ip}_time", current_time)
+            await self.redis.set(f"{ip}_count", 0)
+            await self.redis.expire(f"{ip}_time", self.interval)
+            await self.redis.expire(f"{ip}_count", self.interval)
+
+        requests = int(await self.redis.get(f"{ip}_count") or 0)
+
+        if requests >= self.limit:
+            retry_after = self.interval - (
+                current_time - float(await self.redis.get(f"{ip}_time") or 0)
+            )
+            return JSONResponse(
+                {"detail": "Rate limit exceeded. Retry later."},
+                status_code=429,
+                headers={
+                    "X-Retry-After": str(
+                        datetime.datetime.now(tz=datetime.timezone.utc)
+                        + datetime.timedelta(seconds=retry_after)
+                    )
+                },
+            )
+
+        await self.redis.incr(f"{ip}_count")
+
+        response = await call_next(request)
+        response.headers["X-Ratelimit-Remaining"] = str(self.limit - (requests + 1))
+        await self.redis.aclose()
+
+        return response
+
+
+def build_app(variant: str, redis_client: redis.Redis, limit: int) -> Starlette:  # noqa: D103
+    app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("ok"))])
+
+    if variant == "legacy":
+        app.add_middleware(
+            LegacyRateLimiterMiddleware,
+            limit=limit,
+            interval=60,
+            redis_pool=redis_client.connection_pool,
+        )
+    else:
+        app.add_middleware(
+            RateLimiterMiddleware,
+            limit=limit,
+            interval=60,
+            redis_client=redis_client,
+            local_tier=variant == "asgi+local",
+        )
+
+    return app
+
+
+async def run(variant: str, redis_client: redis.Redis, requests: int, concurrency: int) -> float:  # noqa: D103, E501
+    await redis_client.flushdb()
+    app = build_app(variant, redis_client, limit=requests * 2)
+    transport = httpx.ASGITransport(app=app)
+    queue = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker() -> None:
+            for _ in queue:
+                response = await client.get("/")
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return requests / elapsed
+
+
+async def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--redis-url", help="defaults to fakeredis")
+    parser.add_argument(
+        "--yes-flush", action="store_true", help="confirm --redis-url can be flushed"
+    )
+    args = parser.parse_args()
+
+    if args.redis_url is None:
+        import fakeredis
+
+        redis_client = fakeredis.aioredis.FakeRedis()
+    elif args.yes_flush:
+        redis_client = redis.Redis.from_url(args.redis_url)
+    else:
+        parser.error("Every run flushes --redis-url, pass --yes-flush if that's fine")
+
+    for variant in ["legacy", "asgi", "asgi+local"]:
+        throughput = await run(variant, redis_client, args.requests, args.concurrency)
+        print(f"{variant:<12} {throughput:>10.0f} req/s")  # noqa: T201
+
+    await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Compares the cost of serializing todos to a response body.
+
+    python -m benchmarks.serialization --list-size 1000
+
+For a single todo and a page of --list-size todos, times:
+
+    jsonable_encoder   FastAPI's classic path, validate into the response model,
+                       encode to a dict and render with json.dumps
+    response_model     FastAPI's fast path, validate and dump with pydantic-core
+    trusted+orjson     skip validation and render the row's fields with orjson
+    trusted+msgspec    the same, rendered with msgspec
+"""
+
+import argparse
+import json
+import os
+import timeit
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from main.core.schema.todo import Todo, TodoPage, TodoRead  # noqa: E402
+from main.utils.responses import (  # noqa: E402
+    MsgspecJSONResponse,
+    ORJSONResponse,
+    trusted,
+    trusted_many,
+)
+from pydantic import TypeAdapter  # noqa: E402
+
+
+def make_todos(count: int) -> list[Todo]:  # noqa: D103
+    owner_id = uuid4()
+    now = datetime.now()
+
+    return [
+        Todo(
+            owner_id=owner_id,
+            title=f"Todo number {index}",
+            description="Something that needs doing, described at some length. " * 3,
+            due_at=now + timedelta(days=index),
+        )
+        for index in range(count)
+    ]
+
+
+def serializers(single: Todo, many: list[Todo]) -> dict[str, dict]:  # noqa: D103
+    read_adapter = TypeAdapter(TodoRead)
+    page_adapter = TypeAdapter(TodoPage)
+    orjson_response = ORJSONResponse.__new__(ORJSONResponse)
+    msgspec_response = MsgspecJSONResponse.__new__(MsgspecJSONResponse)
+
+    def classic(adapter: TypeAdapter, content: object) -> bytes:
+        value = adapter.validate_python(content, from_attributes=True)
+        return json.dumps(jsonable_encoder(value)).encode("utf-8")
+
+    def fast(adapter: TypeAdapter, content: object) -> bytes:
+        value = adapter.validate_python(content, from_attributes=True)
+        return adapter.dump_json(value)
+
+    page = {"items": many, "next_cursor": None}
+
+    return {
+        "single": {
+            "jsonable_encoder": lambda: classic(read_adapter, single),
+            "response_model": lambda: fast(read_adapter, single),
+            "trusted+orjson": lambda: orjson_response.render(trusted(TodoRead, single)),
+            "trusted+msgspec": lambda: msgspec_response.render(trusted(TodoRead, single)),
+        },
+        "list": {
+            "jsonable_encoder": lambda: classic(page_adapter, page),
+            "response_model": lambda: fast(page_adapter, page),
+            "trusted+orjson": lambda: orjson_response.render(
+                {"items": trusted_many(TodoRead, many), "next_cursor": None}
+            ),
+            "trusted+msgspec": lambda: msgspec_response.render(
+                {"items": trusted_many(TodoRead, many), "next_cursor": None}
+            ),
+        },
+    }
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--list-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    todos = make_todos(args.list_size)
+
+    for payload, functions in serializers(todos[0], todos).items():
+        number = 20000 if payload == "single" else max(10, 20000 // args.list_size)
+        print(f"{payload} ({number} runs)")  # noqa: T201
+
+        baseline = None
+        for name, function in functions.items():
+            best = min(timeit.repeat(function, number=number, repeat=args.repeat))
+            per_call = best / number * 1e6
+            baseline = baseline or per_call
+            print(  # noqa: T201
+                f"  {name:<18} {per_call:10.1f} us   {baseline / per_call:5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
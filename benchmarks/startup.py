@@ -0,0 +1,123 @@
+"""
+Measures how long a worker takes from a cold interpreter to its first served request.
+
+Each run is a fresh Python process that imports the app, runs its lifespan startup
+and serves GET /api/v1/system/pool in-process:
+
+    python -m benchmarks.startup --runs 10
+
+The database at DATABASE_URL is migrated once before the runs. Pass --create-all to
+also run the `create_all` every worker used to do on startup, for comparison, and
+--fake to use fakeredis instead of the Redis at REDIS_URL.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+async def serve_first_request(started: float, create_all: bool, fake: bool) -> dict:  # noqa: D103
+    import httpx
+
+    import server
+    from main.core.schema import todo, token, user  # noqa: F401
+    from sqlmodel import SQLModel
+
+    imported = time.perf_counter()
+
+    redis_client = None
+    if fake:
+        import fakeredis
+
+        redis_client = fakeredis.aioredis.FakeRedis()
+
+    app = server.create_app(redis_client=redis_client)
+
+    async with app.router.lifespan_context(app):
+        if create_all:
+            async with app.engine.begin() as connection:
+                await connection.run_sync(SQLModel.metadata.create_all)
+
+        ready = time.perf_counter()
+
+        transport = httpx.ASGITransport(app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get("/api/v1/system/pool")
+            response.raise_for_status()
+
+        served = time.perf_counter()
+
+    return {
+        "import": imported - started,
+        "startup": ready - imported,
+        "first_request": served - ready,
+        "total": served - started,
+    }
+
+
+def run_child(create_all: bool, fake: bool) -> dict:  # noqa: D103
+    command = [sys.executable, "-m", "benchmarks.startup", "--child"]
+    if create_all:
+        command.append("--create-all")
+    if fake:
+        command.append("--fake")
+
+    started = time.perf_counter()
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - started
+
+    return timings
+
+
+def report(name: str, runs: list[dict]) -> None:  # noqa: D103
+    print(name)  # noqa: T201
+    for phase in ("import", "startup", "first_request", "total", "process"):
+        values = [run[phase] * 1000 for run in runs]
+        print(  # noqa: T201
+            f"  {phase:<14} median {statistics.median(values):8.1f} ms"
+            f"   max {max(values):8.1f} ms"
+        )
+
+
+async def migrate_database() -> None:  # noqa: D103
+    from main.core.database import create_engine
+    from main.core.migrations import migrate
+
+    engine = create_engine()
+    try:
+        await migrate(engine)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--create-all", action="store_true")
+    parser.add_argument("--fake", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        started = time.perf_counter()
+        timings = asyncio.run(serve_first_request(started, args.create_all, args.fake))
+        print(json.dumps(timings))  # noqa: T201
+        return
+
+    asyncio.run(migrate_database())
+
+    # Inherited by every run, which serves it
+    os.environ["POOL_STATS_ENABLED"] = "true"
+    report("version check", [run_child(False, args.fake) for _ in range(args.runs)])
+    if args.create_all:
+        report("create_all", [run_child(True, args.fake) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Load tests the whole app in-process and records the results for comparison.
+
+The app runs behind httpx's ASGI transport, against SQLite (through aiosqlite) and
+fakeredis unless --database-url and --redis-url point somewhere real. Clients log
+in, create, read and delete todos in a weighted random mix:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.suite --duration 20 --output results.json
+
+Requests/sec, p50/p95/p99 latency and SQL statements per request are reported per
+endpoint and written to --output. Compare two runs, e.g. from two commits, with:
+
+    python -m benchmarks.suite --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+# name: (method, path, weight)
+ENDPOINTS: dict[str, tuple[str, str, int]] = {
+    "login": ("POST", "/users/token", 1),
+    "create_todo": ("POST", "/todos/", 3),
+    "get_todo": ("GET", "/todos/{todo_id}", 12),
+    "delete_todo": ("DELETE", "/todos/{todo_id}", 2),
+}
+
+METRICS = ["requests_per_second", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"]
+
+
+@dataclass
+class EndpointResults:  # noqa: D101
+    latencies: list[float] = field(default_factory=list)
+    sql_statements: list[int] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, elapsed: float) -> dict:  # noqa: D102
+        summary = {"requests": len(self.latencies), "errors": self.errors}
+
+        if len(self.latencies) < 2:
+            return summary
+
+        quantiles = statistics.quantiles(self.latencies, n=100)
+        summary.update(
+            requests_per_second=len(self.latencies) / elapsed,
+            p50_ms=quantiles[49] * 1000,
+            p95_ms=quantiles[94] * 1000,
+            p99_ms=quantiles[98] * 1000,
+            queries_per_request=statistics.fmean(self.sql_statements),
+        )
+
+        return summary
+
+
+@dataclass
+class Client:  # noqa: D101
+    credentials: dict
+    headers: dict = field(default_factory=dict)
+    todo_ids: list[str] = field(default_factory=list)
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """
+    Settings are read once, on first import, so this must run before the app is
+    imported.
+    """
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    # Every request comes from the same client address, so it must never be limited
+    for bucket in ["GLOBAL", "AUTH", "BULK"]:
+        os.environ[f"{bucket}_RATELIMIT_LIMIT"] = str(10**9)
+    # Statements are counted by the suite itself, see `send`
+    os.environ["METRICS_ENABLED"] = "false"
+
+
+def git_commit() -> str | None:  # noqa: D103
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class LoadTest:  # noqa: D101
+    def __init__(self, http, results: dict[str, EndpointResults], seed: int) -> None:  # noqa: ANN001, D107
+        self.http = http
+        self.results = results
+        self.random = random.Random(seed)  # noqa: S311
+
+    async def send(self, name: str, record: bool = True, **kwargs):  # noqa: ANN003, ANN201
+        """
+        Send a request to an endpoint, recording its latency and the SQL statements it
+        ran under `name`.
+        """
+        from main.core.metrics import RequestStats, request_stats
+
+        method, path, _ = ENDPOINTS[name]
+        path = path.format(**kwargs.pop("path_params", {}))
+
+        # httpx's ASGI transport runs the app in the calling task, and every client
+        # runs in its own task, so only this request's statements are counted
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, path, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_stats.reset(token)
+
+        if record:
+            results = self.results[name]
+            results.latencies.append(elapsed)
+            results.sql_statements.append(stats.sql_statements)
+            if response.is_error:
+                results.errors += 1
+
+        return response
+
+    async def login(self, client: Client, record: bool = True):  # noqa: ANN201, D102
+        response = await self.send("login", record, json=client.credentials)
+        if response.is_success:
+            client.headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+        return response
+
+    async def create_todo(self, client: Client):  # noqa: ANN201, D102
+        response = await self.send(
+            "create_todo",
+            headers=client.headers,
+            json={
+                "title": f"todo {self.random.randrange(10**6)}",
+                "description": "Created by the benchmark suite",
+                "due_at": "2031-01-01T00:00:00",
+            },
+        )
+        if response.is_success:
+            client.todo_ids.append(response.json()["id"])
+
+        return response
+
+    async def get_todo(self, client: Client) -> None:  # noqa: D102
+        await self.send(
+            "get_todo",
+            headers=client.headers,
+            path_params={"todo_id": self.random.choice(client.todo_ids)},
+        )
+
+    async def delete_todo(self, client: Client) -> None:  # noqa: D102
+        todo_id = client.todo_ids.pop(self.random.randrange(len(client.todo_ids)))
+        await self.send(
+            "delete_todo", headers=client.headers, path_params={"todo_id": todo_id}
+        )
+
+    async def setup(self, client: Client, todos: int) -> None:
+        """
+        Fails on any error, as a run with clients missing their user or todos would
+        measure something else.
+        """
+        (await self.http.post("/users/", json=client.credentials)).raise_for_status()
+        (await self.login(client, record=False)).raise_for_status()
+
+        for _ in range(todos):
+            (await self.create_todo(client)).raise_for_status()
+
+    async def run(self, client: Client, deadline: float) -> None:  # noqa: D102
+        names = list(ENDPOINTS)
+        weights = [weight for _, _, weight in ENDPOINTS.values()]
+
+        while time.perf_counter() < deadline:
+            name = self.random.choices(names, weights)[0]
+
+            # Reads and deletes need something to act on
+            if name in ["get_todo", "delete_todo"] and not client.todo_ids:
+                name = "create_todo"
+
+            await getattr(self, name)(client)
+
+
+async def run(args: argparse.Namespace) -> dict:  # noqa: D103
+    import fakeredis
+    import httpx
+    import redis.asyncio as redis
+
+    import server
+    from main.core.database import create_engine
+    from main.core.metrics import instrument_engine
+    from main.core.migrations import migrate
+
+    engine = create_engine()
+    await migrate(engine)
+    await engine.dispose()
+
+    if args.redis_url:
+        redis_client = redis.Redis.from_url(args.redis_url)
+    else:
+        redis_client = fakeredis.aioredis.FakeRedis()
+
+    app = server.create_app(redis_client=redis_client)
+    results: dict[str, EndpointResults] = defaultdict(EndpointResults)
+
+    async with app.router.lifespan_context(app):
+        instrument_engine(app.engine)
+
+        transport = httpx.ASGITransport(app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench/api/v1"
+        ) as http:
+            clients = [
+                Client({"username": f"bench-{index}", "password": f"password-{index}"})
+                for index in range(args.concurrency)
+            ]
+            tests = [
+                LoadTest(http, results, args.seed + index)
+                for index in range(args.concurrency)
+            ]
+
+            await asyncio.gather(
+                *(test.setup(client, args.todos) for test, client in zip(tests, clients))
+            )
+
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(
+                *(test.run(client, deadline) for test, client in zip(tests, clients))
+            )
+            elapsed = time.perf_counter() - start
+
+    total = EndpointResults()
+    for endpoint_results in results.values():
+        total.latencies += endpoint_results.latencies
+        total.sql_statements += endpoint_results.sql_statements
+        total.errors += endpoint_results.errors
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "todos": args.todos,
+            "seed": args.seed,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "database": args.database_url.split(":", 1)[0],
+            "redis": "redis" if args.redis_url else "fakeredis",
+        },
+        "elapsed": elapsed,
+        "endpoints": {
+            name: results[name].summary(elapsed) for name in ENDPOINTS if name in results
+        },
+        "total": total.summary(elapsed),
+    }
+
+
+def report(results: dict) -> None:  # noqa: D103
+    print(  # noqa: T201
+        f"{'endpoint':<14}{'requests':>10}{'errors':>8}{'req/s':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}"
+    )
+
+    for name, summary in [*results["endpoints"].items(), ("total", results["total"])]:
+        if "p50_ms" not in summary:
+            print(f"{name:<14}{summary['requests']:>10}{summary['errors']:>8}")  # noqa: T201
+            continue
+
+        print(  # noqa: T201
+            f"{name:<14}{summary['requests']:>10}{summary['errors']:>8}"
+            f"{summary['requests_per_second']:>10.1f}{summary['p50_ms']:>10.2f}"
+            f"{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+            f"{summary['queries_per_request']:>9.2f}"
+        )
+
+
+def compare(before_path: str, after_path: str) -> None:  # noqa: D103
+    with open(before_path) as file:
+        before = json.load(file)
+    with open(after_path) as file:
+        after = json.load(file)
+
+    print(f"{before['commit']} -> {after['commit']}")  # noqa: T201
+
+    names = [*after["endpoints"], "total"]
+    for name in names:
+        old = before["total"] if name == "total" else before["endpoints"].get(name)
+        new = after["total"] if name == "total" else after["endpoints"].get(name)
+        if not old or not new:
+            continue
+
+        changes = []
+        for metric in METRICS:
+            if metric in old and metric in new and old[metric]:
+                change = (new[metric] - old[metric]) / old[metric] * 100
+                changes.append(f"{metric} {new[metric]:.2f} ({change:+.1f}%)")
+
+        print(f"  {name:<14}" + "   ".join(changes))  # noqa: T201
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="in seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--todos", type=int, default=10, help="created per client")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite database")
+    parser.add_argument("--redis-url", help="defaults to fakeredis")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.database_url is None:
+            args.database_url = f"sqlite+aiosqlite:///{directory}/benchmark.sqlite"
+
+        configure_environment(args)
+        results = asyncio.run(run(args))
+
+    report(results)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Measures how throughput scales with the number of worker processes.
+
+Starts the production launcher, `python -m main.serve`, once per worker count and
+hammers GET /todos/{todo_id} from several client processes:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.workers --workers 1,2,4 --duration 10
+
+The workers share state through Redis, so this needs a real one, --redis-url
+defaults to the app's REDIS_URL. The database defaults to SQLite, point
+--database-url at Postgres for numbers that mean anything, as SQLite becomes the
+bottleneck long before the workers do. The clients share the machine with the
+servers, so leave them some cores, or the speedup is understated.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+# name: (method, path)
+ENDPOINT = ("GET", "/todos/{todo_id}")
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """
+    Inherited by every server, so it must run before they're started.
+    """
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+    os.environ["DATABASE_URL"] = args.database_url
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    os.environ["SERVER_HOST"] = "127.0.0.1"
+    os.environ["SERVER_PORT"] = str(args.port)
+    # Every request comes from the same client address, so it must never be limited
+    for bucket in ["GLOBAL", "AUTH", "BULK"]:
+        os.environ[f"{bucket}_RATELIMIT_LIMIT"] = str(10**9)
+    os.environ["GLOBAL_RATELIMIT_LOCAL_TIER"] = "true"
+    os.environ["TOKEN_REAPER_ENABLED"] = "false"
+    os.environ["BCRYPT_ROUNDS"] = "4"
+
+
+async def migrate_database() -> None:  # noqa: D103
+    from main.core.database import create_engine
+    from main.core.migrations import migrate
+
+    engine = create_engine()
+    await migrate(engine)
+    await engine.dispose()
+
+
+def base_url(args: argparse.Namespace) -> str:  # noqa: D103
+    from main.core.settings import get_settings
+
+    return f"http://127.0.0.1:{args.port}/{get_settings().API_PREFIX}/v1"
+
+
+def start_server(workers: int) -> subprocess.Popen:  # noqa: D103
+    return subprocess.Popen(
+        [sys.executable, "-m", "main.serve"],
+        env={**os.environ, "SERVER_WORKERS": str(workers)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    """
+    SIGTERM, like an orchestrator would, and wait for the workers to drain.
+    """
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def prepare(url: str, workers: int) -> tuple[dict, str]:
+    """
+    Wait for the server to come up, then create a user with a todo to read.
+    """
+    import httpx
+
+    async with httpx.AsyncClient(base_url=url) as http:
+        deadline = time.perf_counter() + 60
+        while True:
+            try:
+                await http.get("/users/")
+                break
+            except httpx.TransportError:
+                if time.perf_counter() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+        credentials = {"username": f"bench-{workers}", "password": "password"}
+        (await http.post("/users/", json=credentials)).raise_for_status()
+        response = await http.post("/users/token", json=credentials)
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+        response = await http.post(
+            "/todos/",
+            headers=headers,
+            json={
+                "title": "todo",
+                "description": "Created by the worker benchmark",
+                "due_at": "2031-01-01T00:00:00",
+            },
+        )
+        response.raise_for_status()
+
+        return headers, response.json()["id"]
+
+
+async def load(url: str, headers: dict, todo_id: str, concurrency: int, duration: float) -> tuple[int, int]:  # noqa: E501
+    """
+    Send requests from `concurrency` connections until `duration` is up, returning
+    how many succeeded and failed.
+    """
+    import httpx
+
+    method, path = ENDPOINT
+    path = path.format(todo_id=todo_id)
+    counts = [0, 0]
+
+    async def client(http: httpx.AsyncClient, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            try:
+                response = await http.request(method, path, headers=headers)
+                counts[0 if response.is_success else 1] += 1
+            except httpx.HTTPError:
+                counts[1] += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as http:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(client(http, deadline) for _ in range(concurrency)))
+
+    return counts[0], counts[1]
+
+
+def load_process(arguments: tuple) -> tuple[int, int]:  # noqa: D103
+    return asyncio.run(load(*arguments))
+
+
+def run(args: argparse.Namespace, workers: int, pool: multiprocessing.Pool) -> dict:  # noqa: D103
+    url = base_url(args)
+    process = start_server(workers)
+
+    try:
+        headers, todo_id = asyncio.run(prepare(url, workers))
+
+        concurrency = max(1, args.concurrency // args.client_processes)
+        start = time.perf_counter()
+        counts = pool.map(
+            load_process,
+            [(url, headers, todo_id, concurrency, args.duration)] * args.client_processes,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        stop_server(process)
+
+    requests = sum(succeeded for succeeded, _ in counts)
+    return {
+        "workers": workers,
+        "requests": requests,
+        "errors": sum(failed for _, failed in counts),
+        "requests_per_second": requests / elapsed,
+    }
+
+
+def report(results: list[dict]) -> None:  # noqa: D103
+    print(f"{'workers':>8}{'requests':>10}{'errors':>8}{'req/s':>10}{'speedup':>9}")  # noqa: T201
+
+    baseline = results[0]["requests_per_second"] or 1
+    for result in results:
+        print(  # noqa: T201
+            f"{result['workers']:>8}{result['requests']:>10}{result['errors']:>8}"
+            f"{result['requests_per_second']:>10.1f}"
+            f"{result['requests_per_second'] / baseline:>8.2f}x"
+        )
+
+
+def main() -> None:  # noqa: D103
+    cpus = os.cpu_count() or 1
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--workers",
+        default=",".join(str(count) for count in sorted({1, max(1, cpus // 2), cpus})),
+        help="comma separated worker counts",
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="in seconds")
+    parser.add_argument("--concurrency", type=int, default=64, help="across all clients")
+    parser.add_argument("--client-processes", type=int, default=max(1, cpus // 2))
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite database")
+    parser.add_argument("--redis-url", help="defaults to the app's REDIS_URL")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.database_url is None:
+            args.database_url = f"sqlite+aiosqlite:///{directory}/benchmark.sqlite"
+
+        configure_environment(args)
+        asyncio.run(migrate_database())
+
+        with multiprocessing.Pool(args.client_processes) as pool:
+            results = [
+                run(args, int(workers), pool) for workers in args.workers.split(",")
+            ]
+
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
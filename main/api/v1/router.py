@@ -1,8 +1,13 @@
 from fastapi import APIRouter
 
-from main.api.v1.routes import todo, user
+from main.api.v1.routes import system, todo, user
+from main.core.settings import get_settings
+
+settings = get_settings()
 
 router: APIRouter = APIRouter()
 
 router.include_router(user.router, prefix="/users", tags=["user"])
 router.include_router(todo.router, prefix="/todos", tags=["todo"])
+if settings.POOL_STATS_ENABLED:
+    router.include_router(system.router, prefix="/system", tags=["system"])
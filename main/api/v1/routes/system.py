@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from main.core.database import pool_stats
+from main.core.replicas import replica_set
+
+router = APIRouter()
+
+
+@router.get("/pool")
+async def get_pool_stats():
+    return {"primary": pool_stats(), "replicas": replica_set.stats()}
@@ -1,15 +1,77 @@
-from typing import Annotated
+import logging
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Annotated, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
-from main.api.v1.routes.user import get_logged_in_details
-from main.core.database import get_session
-from main.core.schema.todo import Todo, TodoBase, TodoCreate, TodoRead
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from main.api.v1.routes.user import (
+    get_logged_in_details,
+    get_streaming_logged_in_details,
+    get_user_read_session,
+)
+from main.core.change_feed import change_feed, parse_id
+from main.core.database import any_of, copy_rows, get_session, open_session
+from main.core.replicas import replica_set
+from main.core.schema.todo import (
+    Todo,
+    TodoBase,
+    TodoBatch,
+    TodoBatchCreate,
+    TodoBatchDelete,
+    TodoBatchResponse,
+    TodoBatchResult,
+    TodoCreate,
+    TodoExport,
+    TodoImport,
+    TodoImportError,
+    TodoImportResult,
+    TodoPage,
+    TodoRead,
+    TodoStats,
+    TodoUpdate,
+)
 from main.core.schema.user import Users
+from main.core.settings import get_settings
+from main.core.todo_cache import get_todo, get_todos, invalidate_todos
+from main.core.todo_search import search_todos
+from main.core.todo_stats import get_stats
+from main.utils.errors import invalid_cursor, no_changes
+from main.utils.etag import etag_matches, etag_versions, make_etag
+from main.utils.ndjson import iter_lines
+from main.utils.pagination import decode_cursor, encode_cursor
+from main.utils.responses import trusted, trusted_many, trusted_response
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlmodel import delete, insert, select, tuple_, update
 
 router = APIRouter()
 
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+MAX_IMPORT_ERRORS = 100
+
+
+def created_event(todo: Todo) -> dict:  # noqa: D103
+    return {
+        "type": "created",
+        "id": todo.id,
+        "version": todo.version,
+        "todo": trusted(TodoRead, todo),
+    }
+
 
 @router.post("/", response_model=TodoCreate)
 async def create_task(
@@ -17,31 +79,525 @@ async def create_task(
     logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
     session: AsyncSession = Depends(get_session),
 ):
-    todo = Todo(**task.dict())
+    todo = Todo(**task.model_dump())
     todo.due_at = todo.due_at.replace(tzinfo=None)
     todo.created_at = todo.created_at.replace(tzinfo=None)
     todo.owner_id = logged_in_details["User"].id
     session.add(todo)
+    # Every column has a client-side default, so there's nothing to read back
+    await session.commit()
+    await replica_set.mark_written(todo.owner_id)
+    await change_feed.publish(todo.owner_id, created_event(todo))
+    return trusted_response(trusted(TodoCreate, todo))
+
+
+@router.get("/", response_model=TodoPage)
+async def list_tasks(
+    logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
+    session: AsyncSession = Depends(get_user_read_session),
+    order_by: Literal["due_at", "created_at"] = "due_at",
+    cursor: str | None = None,
+    completed: bool | None = None,
+    due_after: datetime | None = None,
+    due_before: datetime | None = None,
+    limit: int = Query(
+        default=settings.TODO_PAGE_SIZE_DEFAULT, ge=1, le=settings.TODO_PAGE_SIZE_MAX
+    ),
+    ids: list[UUID] | None = Query(default=None, max_length=settings.TODO_PAGE_SIZE_MAX),
+):
+    """
+    List tasks a page at a time, or fetch the tasks given by `ids` all at once, in
+    that order, in which case every other parameter is ignored.
+    """
+    if ids:
+        todos = await get_todos(session, logged_in_details["User"].id, ids)
+        return trusted_response({"items": trusted_many(TodoRead, todos), "next_cursor": None})
+
+    column = getattr(Todo, order_by)
+
+    query = select(Todo).where(Todo.owner_id == logged_in_details["User"].id)
+
+    if completed is not None:
+        query = query.where(Todo.completed == completed)
+    if due_after is not None:
+        query = query.where(Todo.due_at >= due_after.replace(tzinfo=None))
+    if due_before is not None:
+        query = query.where(Todo.due_at < due_before.replace(tzinfo=None))
+
+    if cursor is not None:
+        value, todo_id = decode_cursor(cursor, order_by)
+        query = query.where(tuple_(column, Todo.id) > tuple_(value, todo_id))
+
+    # Fetch one extra row to know whether there's another page
+    result = await session.scalars(query.order_by(column, Todo.id).limit(limit + 1))
+    todos = result.all()
+
+    next_cursor = None
+    if len(todos) > limit:
+        todos = todos[:limit]
+        next_cursor = encode_cursor(order_by, getattr(todos[-1], order_by), todos[-1].id)
+
+    return trusted_response(
+        {"items": trusted_many(TodoRead, todos), "next_cursor": next_cursor}
+    )
+
+
+@router.get("/search", response_model=TodoPage)
+async def search_tasks(
+    logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
+    q: str = Query(min_length=1, max_length=256),
+    session: AsyncSession = Depends(get_user_read_session),
+    cursor: str | None = None,
+    limit: int = Query(
+        default=settings.TODO_PAGE_SIZE_DEFAULT, ge=1, le=settings.TODO_PAGE_SIZE_MAX
+    ),
+):
+    """
+    Search the titles and descriptions of tasks, best matches first.
+    """
+    query, rank = search_todos(
+        session.bind.dialect.name, logged_in_details["User"].id, q
+    )
+
+    if cursor is not None:
+        value, todo_id = decode_cursor(cursor, "rank")
+        query = query.where(tuple_(rank, Todo.id) < tuple_(value, todo_id))
+
+    # Fetch one extra row to know whether there's another page
+    result = await session.execute(
+        query.order_by(rank.desc(), Todo.id.desc()).limit(limit + 1)
+    )
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor("rank", rows[-1].rank, rows[-1].Todo.id)
+
+    return trusted_response(
+        {
+            "items": trusted_many(TodoRead, (row.Todo for row in rows)),
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+@router.get("/stats", response_model=TodoStats)
+async def task_stats(
+    logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
+    session: AsyncSession = Depends(get_user_read_session),
+):
+    """
+    Count all, completed, overdue and due in the next 24 hours tasks.
+    """
+    return trusted_response(
+        await get_stats(session, logged_in_details["User"].id, datetime.now())
+    )
+
+
+@router.get("/feed")
+async def task_feed(
+    logged_in_details: Annotated[Users, Depends(get_streaming_logged_in_details)],
+    last_event_id: Annotated[str | None, Header()] = None,
+    cursor: str | None = None,
+):
+    """
+    Stream changes to the user's tasks as server-sent events.
+
+    Events are "created", "updated" and "deleted" for single tasks, "imported" after
+    an import, and "reset" when changes were missed and everything must be fetched
+    again. Reconnecting with the last event's id, as the Last-Event-ID header or
+    the cursor, resumes right after it.
+    """
+    resume_from = last_event_id or cursor
+
+    if resume_from is not None:
+        try:
+            parse_id(resume_from)
+        except ValueError:
+            raise invalid_cursor from None
+
+    return StreamingResponse(
+        change_feed.stream(logged_in_details["User"].id, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/batch", response_model=TodoBatchResponse)
+async def batch_tasks(
+    batch: TodoBatch,
+    logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Apply many creates, updates and deletes in a single transaction.
+
+    Ownership is checked with one query, and each kind of change is applied as one
+    multi-row statement. Every operation gets its own result, one that can't be
+    applied doesn't stop the others.
+    """
+    if len(batch.operations) > settings.TODO_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batches are limited to {settings.TODO_BATCH_MAX_SIZE} operations",
+        )
+
+    user_id = logged_in_details["User"].id
+
+    existing_ids = {
+        operation.id
+        for operation in batch.operations
+        if not isinstance(operation, TodoBatchCreate)
+    }
+    existing = {}
+    if existing_ids:
+        result = await session.execute(
+            select(Todo.id, Todo.owner_id, Todo.version).where(
+                Todo.id.in_(existing_ids)
+            )
+        )
+        existing = {row.id: row for row in result.all()}
+
+    results: list[TodoBatchResult] = []
+    creates, updates, deletes = [], [], []
+    events = []
+    updated_events = {}
+    seen_ids = set()
+
+    for index, operation in enumerate(batch.operations):
+        if isinstance(operation, TodoBatchCreate):
+            todo = Todo(
+                **operation.model_dump(exclude={"op"}),
+                owner_id=user_id,
+            )
+            todo.due_at = todo.due_at.replace(tzinfo=None)
+            creates.append(todo.model_dump())
+            events.append(created_event(todo))
+            results.append(
+                TodoBatchResult(
+                    index=index, op=operation.op, id=todo.id, status=status.HTTP_201_CREATED
+                )
+            )
+            continue
+
+        result = TodoBatchResult(
+            index=index, op=operation.op, id=operation.id, status=status.HTTP_200_OK
+        )
+        results.append(result)
+
+        if operation.id in seen_ids:
+            result.status = status.HTTP_409_CONFLICT
+            result.detail = "Task is already changed by another operation in this batch"
+            continue
+        seen_ids.add(operation.id)
+
+        row = existing.get(operation.id)
+        if row is None:
+            result.status = status.HTTP_404_NOT_FOUND
+            result.detail = "Task not found"
+        elif row.owner_id != user_id:
+            result.status = status.HTTP_403_FORBIDDEN
+            result.detail = f"Not authorised to {operation.op} this task"
+        elif isinstance(operation, TodoBatchDelete):
+            deletes.append(operation.id)
+            events.append({"type": "deleted", "id": operation.id})
+        else:
+            values = operation.model_dump(exclude={"op"}, exclude_none=True)
+            if values.get("due_at") is not None:
+                values["due_at"] = values["due_at"].replace(tzinfo=None)
+            if len(values) > 1:
+                updates.append(values)
+                # The version is filled in once the update has bumped it
+                updated_events[operation.id] = {
+                    "type": "updated",
+                    "id": operation.id,
+                    "version": None,
+                    "changes": {
+                        key: value for key, value in values.items() if key != "id"
+                    },
+                }
+                events.append(updated_events[operation.id])
+
+    # Every row was checked to be the user's, scoping by owner as well only lets a
+    # partitioned table skip the other owners' partitions
+    if creates:
+        await session.execute(insert(Todo), creates)
+    if updates:
+        # The version is bumped in SQL, not from the read above, so an update that
+        # commits in between is never handed out the same version as this one
+        await session.execute(
+            update(Todo)
+            .where(Todo.owner_id == user_id)
+            .values(version=Todo.version + 1),
+            updates,
+            execution_options={"synchronize_session": None},
+        )
+        # The updated rows stay locked until the commit, so these are the versions
+        # this batch wrote
+        result = await session.execute(
+            select(Todo.id, Todo.version).where(Todo.id.in_(updated_events))
+        )
+        for row in result.all():
+            updated_events[row.id]["version"] = row.version
+    if deletes:
+        await session.execute(
+            delete(Todo).where(Todo.id.in_(deletes), Todo.owner_id == user_id)
+        )
+
+    await session.commit()
+
+    await replica_set.mark_written(user_id)
+    await invalidate_todos(*(values["id"] for values in updates), *deletes)
+    await change_feed.publish(user_id, *events)
+
+    return {"results": results}
+
+
+@router.get("/export")
+async def export_tasks(
+    logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
+):
+    """
+    Stream every task as NDJSON, straight from a server-side cursor.
+    """
+    user_id = logged_in_details["User"].id
+
+    async def stream_tasks() -> AsyncIterator[str]:
+        # The response outlives the request's session, so it gets its own
+        async with replica_set.open_session(user_id) or open_session() as session:
+            result = await session.stream_scalars(
+                select(Todo)
+                .where(Todo.owner_id == user_id)
+                .order_by(Todo.created_at, Todo.id)
+                .execution_options(yield_per=settings.TODO_EXPORT_BATCH_SIZE)
+            )
+
+            async for todos in result.partitions():
+                yield "".join(
+                    TodoExport.model_validate(todo).model_dump_json() + "\n"
+                    for todo in todos
+                )
+                session.expunge_all()
+
+    return StreamingResponse(stream_tasks(), media_type="application/x-ndjson")
+
+
+@router.post("/import", response_model=TodoImportResult)
+async def import_tasks(
+    request: Request,
+    logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Import NDJSON tasks, as produced by the export, from the request body.
+
+    The body is parsed as it arrives and written in chunks of
+    TODO_IMPORT_CHUNK_SIZE rows, each in its own transaction. A line that can't be
+    parsed, or a chunk that can't be written, is reported and skipped.
+    """
+    user_id = logged_in_details["User"].id
+    imported, failed, chunks = 0, 0, 0
+    errors: list[TodoImportError] = []
+    chunk: list[tuple[int, dict]] = []
+
+    def add_error(line: int, detail: str) -> None:
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append(TodoImportError(line=line, detail=detail))
+
+    async def write_chunk() -> None:
+        nonlocal imported, chunks
+        chunks += 1
+
+        # Turns away ids taken by anyone with a clear error. Once the table is
+        # partitioned, an import racing this one for an id fails on todo_ids instead,
+        # see main.core.todo_partitions
+        taken = set(
+            await session.scalars(
+                select(Todo.id).where(
+                    any_of(
+                        Todo.id,
+                        [row["id"] for _, row in chunk],
+                        session.bind.dialect.name,
+                    )
+                )
+            )
+        )
+        for line, row in chunk:
+            if row["id"] in taken:
+                add_error(line, "Task id is already taken")
+        chunk[:] = [(line, row) for line, row in chunk if row["id"] not in taken]
+        if not chunk:
+            return
+
+        try:
+            await copy_rows(session, Todo.__table__, [row for _, row in chunk])
+            await session.commit()
+            imported += len(chunk)
+        except Exception:  # noqa: BLE001
+            await session.rollback()
+
+            # Fall back to one row at a time, so only the bad lines are lost
+            for line, row in chunk:
+                try:
+                    await session.execute(insert(Todo), [row])
+                    await session.commit()
+                    imported += 1
+                except Exception as error:  # noqa: BLE001
+                    await session.rollback()
+                    add_error(line, f"Could not be written: {getattr(error, 'orig', error)}")
+
+        logger.info(
+            "Import for %s: %d chunks, %d imported, %d failed",
+            user_id,
+            chunks,
+            imported,
+            failed,
+        )
+        chunk.clear()
+
+    async for line, data in iter_lines(request.stream()):
+        if not data.strip():
+            continue
+
+        try:
+            task = TodoImport.model_validate_json(data)
+        except ValidationError as error:
+            add_error(
+                line,
+                "; ".join(
+                    f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e["loc"] else e["msg"]
+                    for e in error.errors()
+                ),
+            )
+            continue
+
+        todo = Todo(**task.model_dump(exclude_none=True), owner_id=user_id)
+        todo.due_at = todo.due_at.replace(tzinfo=None)
+        todo.created_at = todo.created_at.replace(tzinfo=None)
+        chunk.append((line, todo.model_dump()))
+
+        if len(chunk) >= settings.TODO_IMPORT_CHUNK_SIZE:
+            await write_chunk()
+
+    if chunk:
+        await write_chunk()
+
+    if imported:
+        await replica_set.mark_written(user_id)
+        await change_feed.publish(user_id, {"type": "imported", "count": imported})
+
+    return TodoImportResult(
+        imported=imported, failed=failed, chunks=chunks, errors=errors
+    )
+
+
+def owned_todo(todo_id: UUID, user_id: UUID, if_match: str | None) -> list:
+    """
+    Conditions matching a todo only if it's the user's and, given If-Match, only
+    at one of the versions it lists.
+    """
+    conditions = [Todo.id == todo_id, Todo.owner_id == user_id]
+
+    if if_match is not None:
+        versions = etag_versions(if_match, todo_id)
+        if versions is not None:
+            conditions.append(Todo.version.in_(versions))
+
+    return conditions
+
+
+async def mutation_failed(
+    session: AsyncSession, todo_id: UUID, user_id: UUID, action: str
+) -> HTTPException:
+    """
+    Work out why a statement scoped by `owned_todo` matched nothing. Only ever
+    called once it has, so successful mutations stay a single statement.
+    """
+    result = await session.execute(
+        select(Todo.owner_id, Todo.version).where(Todo.id == todo_id)
+    )
+    row = result.first()
+
+    if row is None:
+        return HTTPException(status_code=404, detail="Task not found")
+    if row.owner_id != user_id:
+        return HTTPException(
+            status_code=403, detail=f"Not authorised to {action} this task"
+        )
+
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="Task has changed since it was read",
+        headers={"ETag": make_etag(todo_id, row.version)},
+    )
+
+
+@router.patch("/{todo_id}", response_model=TodoRead)
+async def update_task(
+    todo_id: UUID,
+    changes: TodoUpdate,
+    logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
+    if_match: Annotated[str | None, Header()] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Update a todo in a single statement, only if it's still at a version listed in
+    If-Match when that's given, so concurrent edits are never silently lost.
+    """
+    user_id = logged_in_details["User"].id
+
+    values = changes.model_dump(exclude_none=True)
+    if not values:
+        raise no_changes
+    if "due_at" in values:
+        values["due_at"] = values["due_at"].replace(tzinfo=None)
+
+    result = await session.execute(
+        update(Todo)
+        .where(*owned_todo(todo_id, user_id, if_match))
+        .values(**values, version=Todo.version + 1)
+        .returning(Todo)
+    )
+    todo = result.scalar_one_or_none()
+    if todo is None:
+        raise await mutation_failed(session, todo_id, user_id, "update")
+
     await session.commit()
-    await session.refresh(todo)
-    return todo
+
+    await replica_set.mark_written(user_id)
+    await invalidate_todos(todo_id)
+    await change_feed.publish(
+        user_id,
+        {"type": "updated", "id": todo_id, "version": todo.version, "changes": values},
+    )
+
+    return trusted_response(
+        trusted(TodoRead, todo), headers={"ETag": make_etag(todo.id, todo.version)}
+    )
 
 
 @router.delete("/{todo_id}")
 async def delete_task(
     todo_id: UUID,
     logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
+    if_match: Annotated[str | None, Header()] = None,
     session: AsyncSession = Depends(get_session),
 ):
-    todo = await session.get(Todo, todo_id)
-    if not todo:
-        raise HTTPException(status_code=404, detail="Task not found")
-    if todo.owner_id != logged_in_details["User"].id:
-        raise HTTPException(
-            status_code=403, detail="Not authorised to delete this task"
-        )
-    await session.delete(todo)
+    user_id = logged_in_details["User"].id
+
+    result = await session.execute(
+        delete(Todo).where(*owned_todo(todo_id, user_id, if_match)).returning(Todo.id)
+    )
+    if result.first() is None:
+        raise await mutation_failed(session, todo_id, user_id, "delete")
+
     await session.commit()
+    await replica_set.mark_written(user_id)
+    await invalidate_todos(todo_id)
+    await change_feed.publish(user_id, {"type": "deleted", "id": todo_id})
     return {"message": "Todo deleted successfully"}
 
 
@@ -49,11 +605,17 @@ async def delete_task(
 async def get_task(
     todo_id: UUID,
     logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
-    session: AsyncSession = Depends(get_session),
+    if_none_match: Annotated[str | None, Header()] = None,
+    session: AsyncSession = Depends(get_user_read_session),
 ):
-    todo = await session.get(Todo, todo_id)
+    todo = await get_todo(session, todo_id)
     if not todo:
         raise HTTPException(status_code=404, detail="Task not found")
     if todo.owner_id != logged_in_details["User"].id:
         raise HTTPException(status_code=403, detail="Not authorised to view this task")
-    return todo
+
+    etag = make_etag(todo.id, todo.version)
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    return trusted_response(trusted(TodoRead, todo), headers={"ETag": etag})
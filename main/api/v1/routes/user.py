@@ -1,41 +1,70 @@
 from datetime import datetime, timedelta
 from typing import Annotated
+from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from main.core.database import get_session
+from main.core.auth_cache import token_cache
+from main.core.database import get_session, open_session
+from main.core.replicas import get_read_session, replica_set
+from main.core.revocation import revocation_list
+from main.core.schema.todo import Todo
 from main.core.schema.token import TokenBase, TokenCreate, Tokens
 from main.core.schema.user import UserCreate, UserRead, Users
-from main.core.settings import AppSettings
+from main.core.security import (
+    decode_access_token,
+    encode_access_token,
+    hash_password,
+    is_access_token,
+    verify_password,
+)
+from main.core.settings import get_settings
+from main.core.todo_cache import invalidate_todos
 from main.utils.errors import invalid_token, unauthorised
-from main.utils.user_authentication import hash_password, verify_password
+from main.utils.responses import trusted, trusted_response
 from passlib import pwd
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio.session import AsyncSession
-from sqlmodel import select
+from sqlmodel import delete, select, update
 
 router = APIRouter()
 
-settings = AppSettings()
+settings = get_settings()
 
 get_bearer_token = HTTPBearer()
 
 
-async def get_logged_in_details(
-    credentials: Annotated[HTTPAuthorizationCredentials, Depends(get_bearer_token)],
-    session: AsyncSession = Depends(get_session),
-) -> dict[str, Users | Tokens] | None:
-    result = await session.scalars(
-        select(Tokens).where(Tokens.token == credentials.credentials)
+async def find_token(session: AsyncSession, token: str) -> tuple[Users, Tokens] | None:  # noqa: D103
+    result = await session.execute(
+        select(Users, Tokens)
+        .join(Tokens, Tokens.user_id == Users.id)
+        .where(Tokens.token == token)
     )
-    token = result.first()
+    return result.first()
 
-    if not token:
-        raise unauthorised
 
-    authenticated_token = token if token.token == credentials.credentials else None
+async def authenticate(session: AsyncSession, token: str) -> dict[str, Users | Tokens]:  # noqa: D103
+    if settings.AUTH_TOKEN_MODE == "jwt" and is_access_token(token):
+        return await get_access_token_details(token)
 
-    if authenticated_token is None:
+    cached = await token_cache.get(token)
+
+    if cached is not None:
+        authenticated_user, authenticated_token = cached
+    else:
+        # Always on the primary, a replica may not have seen a logout or a reap yet,
+        # and what's read here is cached
+        row = await find_token(session, token)
+        # Ends the read so its connection goes back to the pool, a route reading
+        # through the cache or the loader may not need one of its own at all
+        await session.commit()
+
+        if not row:
+            raise unauthorised
+
+        authenticated_user, authenticated_token = row
+
+    if authenticated_token.token != token:
         raise invalid_token
 
     if not authenticated_token.active:
@@ -44,13 +73,62 @@ async def get_logged_in_details(
     if datetime.now() > authenticated_token.expires_at:
         raise invalid_token
 
-    result = await session.scalars(
-        select(Users).where(Users.id == authenticated_token.user_id)
-    )
+    if cached is None:
+        await token_cache.set(authenticated_user, authenticated_token)
+
+    return {"User": authenticated_user, "Token": authenticated_token}
+
+
+async def get_logged_in_details(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(get_bearer_token)],
+    session: AsyncSession = Depends(get_session),
+) -> dict[str, Users | Tokens] | None:
+    return await authenticate(session, credentials.credentials)
+
+
+async def get_streaming_logged_in_details(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(get_bearer_token)],
+) -> dict[str, Users | Tokens] | None:
+    """
+    For streamed responses, which would otherwise hold a session's connection until
+    the stream ends, as request scoped dependencies are only closed then.
+    """
+    async with open_session() as session:
+        return await authenticate(session, credentials.credentials)
+
+
+async def get_user_read_session(
+    logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
+    session: AsyncSession = Depends(get_session),
+    read_session: AsyncSession = Depends(get_read_session),
+) -> AsyncSession:
+    """
+    A session for the logged in user's reads, on the primary if they wrote recently.
+    """
+    if replica_set.is_sticky(logged_in_details["User"].id):
+        return session
+
+    return read_session
 
-    users = result.all()
 
-    authenticated_user = users[0] if users else None
+async def get_access_token_details(token: str) -> dict[str, Users | Tokens]:
+    """
+    Authenticate a JWT from its claims alone, without a database round trip.
+    """
+    claims = decode_access_token(token)
+
+    if await revocation_list.is_revoked(claims["jti"], claims["sub"], claims["iat"]):
+        raise invalid_token
+
+    authenticated_user = Users(id=UUID(claims["sub"]), username=claims["name"])
+    authenticated_token = Tokens(
+        id=UUID(claims["jti"]),
+        user_id=authenticated_user.id,
+        created_at=datetime.fromtimestamp(claims["iat"]),
+        expires_at=datetime.fromtimestamp(claims["exp"]),
+        token=token,
+        token_type="bearer",  # noqa: S106
+    )
 
     return {"User": authenticated_user, "Token": authenticated_token}
 
@@ -59,7 +137,7 @@ async def get_logged_in_details(
 async def return_logged_in_user(
     logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
 ):
-    return logged_in_details["User"]
+    return trusted_response(trusted(UserRead, logged_in_details["User"]))
 
 
 @router.post("/", response_model=UserRead)
@@ -70,7 +148,7 @@ async def create_user(user: UserCreate, session: AsyncSession = Depends(get_sess
             detail="Username must be less than 16 characters long.",
         )
 
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password(user.password)
 
     user_to_create = Users(username=user.username, hashed_password=hashed_password)
 
@@ -92,19 +170,24 @@ async def delete_user(
     logged_in_details: Annotated[Users, Depends(get_logged_in_details)],
     session: AsyncSession = Depends(get_session),
 ):
-    current_user = logged_in_details["User"]
+    user_id = logged_in_details["User"].id
 
-    tokens = await session.execute(
-        select(Tokens).where(Tokens.user_id == current_user.id)
+    # Everything the user owns goes with them, in one transaction
+    await session.execute(delete(Tokens).where(Tokens.user_id == user_id))
+    deleted_todos = await session.scalars(
+        delete(Todo).where(Todo.owner_id == user_id).returning(Todo.id)
     )
+    todo_ids = deleted_todos.all()
+    await session.execute(delete(Users).where(Users.id == user_id))
 
-    tokens = tokens.scalars().all()
+    await session.commit()
 
-    for i in tokens:
-        i.active = False
-        await session.delete(i)
+    await replica_set.mark_written(user_id)
+    await token_cache.invalidate_user(user_id)
+    await invalidate_todos(*todo_ids)
 
-    await session.commit()
+    if settings.AUTH_TOKEN_MODE == "jwt":
+        await revocation_list.revoke_user(user_id)
 
 
 @router.post("/token", response_model=TokenBase)
@@ -121,31 +204,36 @@ async def generate_token(
     if not user:
         raise unauthorised
 
-    if verify_password(token.password, user.hashed_password):
+    if not await verify_password(token.password, user.hashed_password):
         raise unauthorised
 
     authenticated_user = user
 
-    expires = datetime.now() + timedelta(minutes=settings.AUTH_TOKEN_EXPIRATION)
+    issued = datetime.now()
+    expires = issued + timedelta(minutes=settings.AUTH_TOKEN_EXPIRATION)
+    token_id = uuid4()
 
-    encoded_token = str(pwd.genword(entropy=512))
+    if settings.AUTH_TOKEN_MODE == "jwt":
+        # The row is only kept for auditing, requests are authenticated from the JWT
+        encoded_token = encode_access_token(token_id, authenticated_user, issued, expires)
+    else:
+        encoded_token = str(pwd.genword(entropy=512))
 
     created_token = Tokens(
+        id=token_id,
+        created_at=issued,
         token=encoded_token,
         token_type="bearer",  # noqa: S106
         expires_at=expires,
         user_id=authenticated_user.id,
     )
 
-    tokens = await session.execute(
-        select(Tokens).where(Tokens.user_id == authenticated_user.id)
-    )
-    tokens = tokens.scalars().all()
-
     session.add(created_token)
     await session.commit()
     await session.refresh(created_token)
 
+    await replica_set.mark_written(authenticated_user.id)
+
     return created_token
 
 
@@ -155,25 +243,39 @@ async def logout(
     session: AsyncSession = Depends(get_session),
 ):
     current_token = current_user["Token"]
+    token_id, token = current_token.id, current_token.token
+    expires_at = current_token.expires_at
 
-    current_token.active = False
-    session.add(current_token)
+    await session.execute(
+        update(Tokens).where(Tokens.id == token_id).values(active=False)
+    )
 
     await session.commit()
 
+    await replica_set.mark_written(current_user["User"].id)
+    await token_cache.invalidate_token(token)
+
+    if settings.AUTH_TOKEN_MODE == "jwt" and is_access_token(token):
+        await revocation_list.revoke_token(token_id, expires_at.timestamp())
+
 
 @router.post("/logout/all", status_code=status.HTTP_204_NO_CONTENT)
 async def logout_all(
     current_user: Annotated[Users, Depends(get_logged_in_details)],
     session: AsyncSession = Depends(get_session),
 ):
-    tokens = await session.execute(
-        select(Tokens).where(Tokens.user_id == current_user["User"].id)
-    )
-    tokens = tokens.scalars().all()
+    user_id = current_user["User"].id
 
-    for i in tokens:
-        i.active = False
-        session.add(i)
+    await session.execute(
+        update(Tokens)
+        .where(Tokens.user_id == user_id, Tokens.active)
+        .values(active=False)
+    )
 
     await session.commit()
+
+    await replica_set.mark_written(user_id)
+    await token_cache.invalidate_user(user_id)
+
+    if settings.AUTH_TOKEN_MODE == "jwt":
+        await revocation_list.revoke_user(user_id)
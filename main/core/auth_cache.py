@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+from datetime import datetime
+from uuid import UUID
+
+import redis.asyncio as redis
+
+from main.core.cache import LocalCache, invalidation_bus
+from main.core.schema.token import Tokens
+from main.core.schema.user import Users
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "auth:invalidate"
+
+
+def token_key(token: str) -> str:
+    """
+    Tokens are only ever cached, looked up and broadcast by their hash.
+    """
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def cached_user(fields: dict) -> Users:
+    """
+    The password hash is never cached, so the user is built without it, like one
+    authenticated by a JWT.
+    """
+    return Users(
+        id=UUID(fields["id"]),
+        username=fields["username"],
+        created_at=datetime.fromisoformat(fields["created_at"]),
+        disabled=fields["disabled"],
+    )
+
+
+class TokenCache:
+    """
+    Caches bearer token -> (user, token) lookups.
+
+    Every worker keeps a bounded TTL/LRU cache, optionally backed by a shared Redis
+    tier. Revocations are broadcast over the invalidation bus, so a revoked token is
+    evicted from every worker as soon as the message arrives, and never later than
+    `ttl` seconds after the revocation.
+    """
+
+    def __init__(self, max_size: int, ttl: int, use_redis: bool) -> None:  # noqa: D107
+        self.local = LocalCache(max_size, ttl)
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.redis: redis.Redis | None = None
+
+        invalidation_bus.subscribe(INVALIDATION_CHANNEL, self.handle_invalidation)
+
+    def bind(self, redis_client: redis.Redis | None) -> None:  # noqa: D102
+        self.redis = redis_client
+
+    @property
+    def enabled(self) -> bool:  # noqa: D102
+        return self.local.max_size > 0
+
+    @property
+    def shared(self) -> bool:  # noqa: D102
+        return self.enabled and self.use_redis and self.redis is not None
+
+    async def get(self, token: str) -> tuple[Users, Tokens] | None:  # noqa: D102
+        if not self.enabled:
+            return None
+
+        key = token_key(token)
+        cached = self.local.get(key)
+
+        if cached is None and self.shared:
+            try:
+                raw = await self.redis.get(f"auth:token:{key}")
+            except redis.RedisError:
+                logger.exception("Failed to read the shared token cache")
+                raw = None
+
+            if raw is not None:
+                cached = json.loads(raw)
+                self.local.set(key, cached, self.time_to_live(cached))
+
+        if cached is None:
+            return None
+
+        return cached_user(cached["User"]), Tokens.model_validate(cached["Token"])
+
+    def peek_user_id(self, token: str) -> str | None:
+        """
+        The id of the user a token belongs to, if it's in this worker's cache.
+
+        Never touches the network, so it's cheap enough to call before routing.
+        """
+        if not self.enabled:
+            return None
+
+        cached = self.local.get(token_key(token))
+        return cached["User"]["id"] if cached is not None else None
+
+    async def set(self, user: Users, token: Tokens) -> None:  # noqa: D102
+        if not self.enabled:
+            return
+
+        key = token_key(token.token)
+        cached = {
+            "User": user.model_dump(mode="json", exclude={"hashed_password"}),
+            "Token": token.model_dump(mode="json"),
+        }
+        ttl = self.time_to_live(cached)
+
+        if ttl <= 0:
+            return
+
+        self.local.set(key, cached, ttl)
+
+        if self.shared:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(f"auth:token:{key}", json.dumps(cached), ex=ttl)
+                    pipe.sadd(f"auth:user:{user.id}", key)
+                    pipe.expire(f"auth:user:{user.id}", self.ttl)
+                    await pipe.execute()
+            except redis.RedisError:
+                logger.exception("Failed to write the shared token cache")
+
+    def time_to_live(self, cached: dict) -> int:
+        """
+        Never keep a token cached past its own expiry.
+        """
+        expires_at = datetime.fromisoformat(cached["Token"]["expires_at"])
+        return min(self.ttl, int((expires_at - datetime.now()).total_seconds()))
+
+    async def invalidate_token(self, token: str) -> None:  # noqa: D102
+        key = token_key(token)
+        self.local.delete(key)
+
+        if self.shared:
+            try:
+                await self.redis.delete(f"auth:token:{key}")
+            except redis.RedisError:
+                logger.exception("Failed to invalidate the shared token cache")
+
+        await invalidation_bus.publish(INVALIDATION_CHANNEL, {"token": key})
+
+    async def invalidate_user(self, user_id: UUID) -> None:  # noqa: D102
+        self.drop_user(str(user_id))
+
+        if self.shared:
+            try:
+                keys = await self.redis.smembers(f"auth:user:{user_id}")
+                await self.redis.delete(
+                    f"auth:user:{user_id}",
+                    *(f"auth:token:{key.decode()}" for key in keys),
+                )
+            except redis.RedisError:
+                logger.exception("Failed to invalidate the shared token cache")
+
+        await invalidation_bus.publish(INVALIDATION_CHANNEL, {"user_id": str(user_id)})
+
+    def drop_user(self, user_id: str) -> None:  # noqa: D102
+        self.local.delete_where(lambda cached: cached["User"]["id"] == user_id)
+
+    def handle_invalidation(self, message: dict | None) -> None:  # noqa: D102
+        if message is None:
+            self.local.clear()
+        elif "token" in message:
+            self.local.delete(message["token"])
+        elif "user_id" in message:
+            self.drop_user(message["user_id"])
+
+
+token_cache = TokenCache(
+    settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL, settings.AUTH_CACHE_REDIS
+)
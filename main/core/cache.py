@@ -0,0 +1,279 @@
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """
+    A bounded, in-process LRU cache where every entry also has a time to live.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:  # noqa: D107
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:  # noqa: ANN401, D102
+        entry = self.entries.get(key)
+
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:  # noqa: ANN401, D102
+        if self.max_size <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:  # noqa: D102
+        self.entries.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Any], bool]) -> None:
+        """
+        Delete every entry whose value matches `predicate`.
+        """
+        for key in [key for key, (_, value) in self.entries.items() if predicate(value)]:
+            del self.entries[key]
+
+    def clear(self) -> None:  # noqa: D102
+        self.entries.clear()
+
+    def __len__(self) -> int:  # noqa: D105
+        return len(self.entries)
+
+
+InvalidationHandler = Callable[[dict | None], None]
+
+
+class InvalidationBus:
+    """
+    Broadcasts cache invalidations to every worker over Redis pub/sub.
+
+    Each worker holds a single subscriber connection for all channels. If that
+    connection drops, messages may have been missed, so every handler is called
+    with `None` once it is re-established and should drop everything it has cached.
+    Local entries are bounded by their TTL either way.
+    """
+
+    def __init__(self) -> None:  # noqa: D107
+        self.handlers: dict[str, list[InvalidationHandler]] = {}
+        self.redis: redis.Redis | None = None
+        self.listener: asyncio.Task | None = None
+
+    def subscribe(self, channel: str, handler: InvalidationHandler) -> None:  # noqa: D102
+        self.handlers.setdefault(channel, []).append(handler)
+
+    async def publish(self, channel: str, message: dict) -> None:  # noqa: D102
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.publish(channel, json.dumps(message))
+        except redis.RedisError:
+            logger.exception("Failed to publish invalidation on %s", channel)
+
+    async def start(self, redis_client: redis.Redis) -> None:  # noqa: D102
+        self.redis = redis_client
+
+        if self.handlers:
+            self.listener = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:  # noqa: D102
+        if self.listener is not None:
+            self.listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.listener
+            self.listener = None
+
+        self.redis = None
+
+    def dispatch(self, channel: str, message: dict | None) -> None:  # noqa: D102
+        for handler in self.handlers.get(channel, []):
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("Invalidation handler for %s failed", channel)
+
+    async def listen(self) -> None:  # noqa: D102
+        reconnecting = False
+
+        while True:
+            try:
+                async with self.redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(*self.handlers)
+
+                    if reconnecting:
+                        for channel in self.handlers:
+                            self.dispatch(channel, None)
+
+                    async for message in pubsub.listen():
+                        channel = message["channel"]
+                        if isinstance(channel, bytes):
+                            channel = channel.decode()
+                        self.dispatch(channel, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Invalidation listener disconnected, reconnecting")
+                reconnecting = True
+                await asyncio.sleep(1)
+
+
+invalidation_bus = InvalidationBus()
+
+
+class TieredCache:
+    """
+    A read-through cache of JSON-able values with an in-process tier and an optional
+    shared Redis tier.
+
+    Deleting a key evicts it from Redis and, over the invalidation bus, from every
+    worker's local tier. Writes that race with a delete can leave a stale entry
+    behind for at most `ttl` seconds.
+    """
+
+    def __init__(self, namespace: str, max_size: int, ttl: int, use_redis: bool) -> None:  # noqa: D107, E501
+        self.namespace = namespace
+        self.channel = f"{namespace}:invalidate"
+        self.local = LocalCache(max_size, ttl)
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.redis: redis.Redis | None = None
+
+        invalidation_bus.subscribe(self.channel, self.handle_invalidation)
+
+    def bind(self, redis_client: redis.Redis | None) -> None:  # noqa: D102
+        self.redis = redis_client
+
+    @property
+    def enabled(self) -> bool:  # noqa: D102
+        return self.local.max_size > 0
+
+    @property
+    def shared(self) -> bool:  # noqa: D102
+        return self.enabled and self.use_redis and self.redis is not None
+
+    async def get(self, key: str) -> dict | None:  # noqa: D102
+        if not self.enabled:
+            return None
+
+        value = self.local.get(key)
+
+        if value is None and self.shared:
+            try:
+                raw = await self.redis.get(f"{self.namespace}:{key}")
+            except redis.RedisError:
+                logger.exception("Failed to read the shared %s cache", self.namespace)
+                raw = None
+
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(key, value)
+
+        return value
+
+    async def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """
+        Look up many keys, with a single round trip for those missing locally.
+        """
+        if not self.enabled:
+            return {}
+
+        values = {}
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                values[key] = value
+
+        missing = [key for key in keys if key not in values]
+
+        if missing and self.shared:
+            try:
+                raws = await self.redis.mget(
+                    [f"{self.namespace}:{key}" for key in missing]
+                )
+            except redis.RedisError:
+                logger.exception("Failed to read the shared %s cache", self.namespace)
+                raws = []
+
+            for key, raw in zip(missing, raws):
+                if raw is not None:
+                    values[key] = json.loads(raw)
+                    self.local.set(key, values[key])
+
+        return values
+
+    async def set_many(self, values: dict[str, dict]) -> None:  # noqa: D102
+        if not self.enabled or not values:
+            return
+
+        for key, value in values.items():
+            self.local.set(key, value)
+
+        if self.shared:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, value in values.items():
+                        pipe.set(f"{self.namespace}:{key}", json.dumps(value), ex=self.ttl)
+                    await pipe.execute()
+            except redis.RedisError:
+                logger.exception("Failed to write the shared %s cache", self.namespace)
+
+    async def set(self, key: str, value: dict) -> None:  # noqa: D102
+        if not self.enabled:
+            return
+
+        self.local.set(key, value)
+
+        if self.shared:
+            try:
+                await self.redis.set(
+                    f"{self.namespace}:{key}", json.dumps(value), ex=self.ttl
+                )
+            except redis.RedisError:
+                logger.exception("Failed to write the shared %s cache", self.namespace)
+
+    async def delete(self, *keys: str) -> None:  # noqa: D102
+        if not self.enabled or not keys:
+            return
+
+        for key in keys:
+            self.local.delete(key)
+
+        if self.shared:
+            try:
+                await self.redis.delete(*(f"{self.namespace}:{key}" for key in keys))
+            except redis.RedisError:
+                logger.exception("Failed to invalidate the shared %s cache", self.namespace)
+
+        await invalidation_bus.publish(self.channel, {"keys": list(keys)})
+
+    def handle_invalidation(self, message: dict | None) -> None:  # noqa: D102
+        if message is None:
+            self.local.clear()
+            return
+
+        for key in message["keys"]:
+            self.local.delete(key)
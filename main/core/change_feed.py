@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from uuid import UUID
+
+import orjson
+import redis.asyncio as redis
+
+from main.core.cache import invalidation_bus
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+FEED_CHANNEL = "todo:feed"
+
+# Appends every event to the user's stream and publishes it to the live feed in one
+# step, so a client resuming from the stream and one listening live see the same
+# events with the same ids.
+#   KEYS[1]: the user's stream
+#   ARGV[1]: the feed channel, ARGV[2]: the user's id, ARGV[3]: stream length,
+#   ARGV[4]: stream time to live in seconds, ARGV[5...]: the events, as JSON
+PUBLISH_SCRIPT = """
+local ids = {}
+
+for i = 5, #ARGV do
+    local id = redis.call("XADD", KEYS[1], "MAXLEN", "~", ARGV[3], "*", "event", ARGV[i])
+    redis.call(
+        "PUBLISH",
+        ARGV[1],
+        '{"user_id":"' .. ARGV[2] .. '","id":"' .. id .. '","event":' .. ARGV[i] .. "}"
+    )
+    ids[#ids + 1] = id
+end
+
+redis.call("EXPIRE", KEYS[1], ARGV[4])
+return ids
+"""
+
+
+def stream_key(user_id: UUID | str) -> str:  # noqa: D103
+    return f"todo:feed:{user_id}"
+
+
+def parse_id(event_id: str) -> tuple[int, int]:
+    """
+    Stream ids are "<milliseconds>-<sequence>", and compare as that pair.
+    """
+    milliseconds, _, sequence = event_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+@dataclass
+class Event:  # noqa: D101
+    id: str
+    data: dict
+
+    def encode(self) -> str:
+        """
+        Format the event for a text/event-stream response.
+        """
+        return f"id: {self.id}\nevent: {self.data['type']}\ndata: {json.dumps(self.data)}\n\n"  # noqa: E501
+
+
+@dataclass(eq=False)
+class Subscription:
+    """
+    One connected client. Events are buffered in a bounded queue, a client that
+    falls `queue_size` events behind is caught up from the stream instead.
+    """
+
+    user_id: str
+    queue: asyncio.Queue
+    lagged: bool = False
+
+    def offer(self, event: Event | None) -> None:  # noqa: D102
+        if self.lagged:
+            return
+
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+
+class ChangeFeed:
+    """
+    Pushes todo changes to connected clients.
+
+    Every event is appended to a capped Redis stream per user, which clients resume
+    from by id, and published on a single channel that each worker receives through
+    the invalidation bus's one connection, whatever the number of clients. If that
+    connection drops, or a client's queue fills up, the client is caught up from
+    the stream, events older than the stream's retention are lost and the client is
+    told to refetch everything.
+    """
+
+    def __init__(self, queue_size: int, retention: int, ttl: int, heartbeat: float) -> None:  # noqa: D107, E501
+        self.queue_size = queue_size
+        self.retention = retention
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.redis: redis.Redis | None = None
+        self.script = None
+        self.subscriptions: dict[str, set[Subscription]] = {}
+
+        invalidation_bus.subscribe(FEED_CHANNEL, self.handle_message)
+
+    def bind(self, redis_client: redis.Redis | None) -> None:  # noqa: D102
+        self.redis = redis_client
+        self.script = redis_client.register_script(PUBLISH_SCRIPT) if redis_client else None
+
+    async def publish(self, user_id: UUID, *events: dict) -> None:
+        """
+        Publish events for a user's todos, e.g. {"type": "deleted", "id": ...}.
+        """
+        if self.script is None or not events:
+            return
+
+        try:
+            await self.script(
+                keys=[stream_key(user_id)],
+                args=[
+                    FEED_CHANNEL,
+                    str(user_id),
+                    self.retention,
+                    self.ttl,
+                    *(orjson.dumps(event).decode() for event in events),
+                ],
+            )
+        except redis.RedisError:
+            logger.exception("Failed to publish todo changes for %s", user_id)
+
+    def handle_message(self, message: dict | None) -> None:  # noqa: D102
+        if message is None:
+            # Messages may have been missed, every client catches up from its stream
+            for subscriptions in self.subscriptions.values():
+                for subscription in subscriptions:
+                    # Wakes the client up if it's waiting on an empty queue
+                    subscription.offer(None)
+                    subscription.lagged = True
+            return
+
+        event = Event(message["id"], message["event"])
+        for subscription in self.subscriptions.get(message["user_id"], ()):
+            subscription.offer(event)
+
+    async def read_since(self, user_id: str, after: str) -> tuple[list[Event], bool]:
+        """
+        Read the user's events after `after`, and whether none were trimmed before
+        they could be read. "0-0" means from the start of the stream.
+        """
+        key = stream_key(user_id)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xrange(key, count=1)
+            pipe.xrange(key, min=f"({after}")
+            oldest, entries = await pipe.execute()
+
+        events = [
+            Event(event_id.decode(), json.loads(fields[b"event"]))
+            for event_id, fields in entries
+        ]
+        complete = after == "0-0" or (
+            bool(oldest) and parse_id(oldest[0][0].decode()) <= parse_id(after)
+        )
+
+        return events, complete
+
+    async def latest_id(self, user_id: str) -> str:  # noqa: D102
+        entries = await self.redis.xrevrange(stream_key(user_id), count=1)
+        return entries[0][0].decode() if entries else "0-0"
+
+    async def stream(self, user_id: UUID, last_event_id: str | None) -> AsyncIterator[str]:
+        """
+        Stream a user's events as text/event-stream, after `last_event_id` if given.
+        """
+        user_id = str(user_id)
+        subscription = Subscription(user_id, asyncio.Queue(self.queue_size))
+        self.subscriptions.setdefault(user_id, set()).add(subscription)
+
+        try:
+            if last_event_id is None:
+                last_id = await self.latest_id(user_id)
+            else:
+                last_id = last_event_id
+                subscription.lagged = True
+
+            # Sends the headers straight away
+            yield ": connected\n\n"
+
+            while True:
+                if subscription.lagged:
+                    # Anything queued is also in the stream, and anything that
+                    # arrives from now on is queued again
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.lagged = False
+
+                    events, complete = await self.read_since(user_id, last_id)
+
+                    if not complete:
+                        last_id = events[-1].id if events else last_id
+                        yield Event(last_id, {"type": "reset"}).encode()
+                        continue
+
+                    for event in events:
+                        last_id = event.id
+                        yield event.encode()
+                    continue
+
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), self.heartbeat
+                    )
+                except TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                # Either a catch up was requested, or it was already sent
+                if event is None or parse_id(event.id) <= parse_id(last_id):
+                    continue
+
+                last_id = event.id
+                yield event.encode()
+        finally:
+            subscriptions = self.subscriptions.get(user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(user_id, None)
+
+
+change_feed = ChangeFeed(
+    settings.TODO_FEED_QUEUE_SIZE,
+    settings.TODO_FEED_RETENTION,
+    settings.TODO_FEED_TTL,
+    settings.TODO_FEED_HEARTBEAT,
+)
@@ -1,19 +1,174 @@
+import time
 from collections.abc import AsyncGenerator
+from typing import Any
 
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import ColumnElement, Table, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.asyncio.engine import AsyncEngine
 from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel import insert
 
-from main.core.settings import AppSettings
+from main.core.settings import get_settings
 
-settings = AppSettings()
+settings = get_settings()
 
-engine: AsyncEngine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-)
+# Owned by the app's lifespan, see `init_engine` and `dispose_engine`
+engine: AsyncEngine | None = None
+session_maker: async_sessionmaker[AsyncSession] | None = None
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    A queue pool that also records how often and how long checkouts wait for a
+    connection, because none was idle and no more could be opened.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:  # noqa: ANN401, D107
+        super().__init__(*args, **kwargs)
+        self.checkout_count = 0
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):  # noqa: ANN202
+        self.checkout_count += 1
+
+        # The same condition the queue pool blocks on
+        exhausted = self._max_overflow > -1 and self._overflow >= self._max_overflow
+        if not exhausted or self.checkedin() > 0:
+            return super()._do_get()
+
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            self.wait_count += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+
+def create_engine(url: str | None = None) -> AsyncEngine:
+    """
+    Create an engine with the pool configured from the settings.
+    """
+    url = make_url(url or settings.DATABASE_URL)
+
+    if url.get_backend_name() == "sqlite":
+        return create_async_engine(url, echo=settings.DEBUG)
+
+    connect_args = {}
+    if url.get_driver_name() == "asyncpg":
+        connect_args["prepared_statement_cache_size"] = (
+            settings.DATABASE_STATEMENT_CACHE_SIZE
+        )
+
+    return create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+def init_engine(new_engine: AsyncEngine | None = None) -> AsyncEngine:
+    """
+    Set the engine every session is opened on, creating one from the settings by default.
+    """  # noqa: E501
+    global engine, session_maker  # noqa: PLW0603
+
+    engine = new_engine or create_engine()
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    return engine
+
+
+async def dispose_engine() -> None:  # noqa: D103
+    global engine, session_maker  # noqa: PLW0603
+
+    if engine is not None:
+        await engine.dispose()
+
+    engine = None
+    session_maker = None
+
+
+def pool_stats(pool_engine: AsyncEngine | None = None) -> dict[str, Any]:
+    """
+    Live statistics for an engine's connection pool, the app's engine by default.
+    """
+    pool = (pool_engine or engine).pool
+    stats: dict[str, Any] = {"pool": pool.status()}
+
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(
+            checkout_count=pool.checkout_count,
+            wait_count=pool.wait_count,
+            wait_time_total=pool.wait_time_total,
+            wait_time_max=pool.wait_time_max,
+        )
+
+    return stats
+
+
+def open_session() -> AsyncSession:
+    """
+    Open a session outside of a request, e.g. for the lifetime of a streamed response.
+    """  # noqa: E501
+    return session_maker()
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async with AsyncSession(engine) as session:
+    async with open_session() as session:
         yield session
+
+
+def any_of(column: ColumnElement, values: list, dialect_name: str) -> ColumnElement:
+    """
+    Match any of `values`.
+
+    On Postgres this is `= ANY(:values)` with a single array parameter, so the
+    statement is the same for any number of values and stays prepared.
+    """
+    if dialect_name != "postgresql":
+        return column.in_(values)
+
+    return column == any_(bindparam(None, list(values), type_=ARRAY(column.type)))
+
+
+async def copy_rows(session: AsyncSession, table: Table, rows: list[dict]) -> None:
+    """
+    Insert many rows at once, using COPY when running on asyncpg.
+
+    Every row must have a value for every column of the table.
+    """
+    connection = await session.connection()
+
+    if connection.dialect.driver != "asyncpg":
+        await session.execute(insert(table), rows)
+        return
+
+    columns = [column.name for column in table.columns]
+    raw_connection = await connection.get_raw_connection()
+
+    await raw_connection.driver_connection.copy_records_to_table(
+        table.name,
+        records=[tuple(row[column] for column in columns) for row in rows],
+        columns=columns,
+    )
@@ -0,0 +1,75 @@
+import abc
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import socket
+from typing import Any
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElectedJob(abc.ABC):
+    """
+    A background job run in-process by every worker, of which only one runs it.
+
+    Every worker wakes up every `interval` seconds, jittered, and only the one that
+    wins `leader_key` in Redis runs the job. The key lasts a whole interval, so the
+    job runs at most once per interval across the deployment, however the workers'
+    wakeups line up.
+
+    Subclasses set `leader_key` and `name`, and implement `run_once`.
+    """
+
+    leader_key: str
+    name: str
+
+    def __init__(self, interval: int) -> None:  # noqa: D107
+        self.interval = interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.task: asyncio.Task | None = None
+
+    @abc.abstractmethod
+    async def run_once(self, engine: AsyncEngine) -> Any:  # noqa: ANN401, D102
+        ...
+
+    async def is_leader(self, redis_client: redis.Redis) -> bool:
+        """
+        Claim the run for the next `interval` seconds.
+        """
+        try:
+            return bool(
+                await redis_client.set(
+                    self.leader_key, self.worker_id, nx=True, px=int(self.interval * 1000)
+                )
+            )
+        except redis.RedisError:
+            logger.exception("Failed to run the %s's leader election", self.name)
+            return False
+
+    async def run_forever(self, engine: AsyncEngine, redis_client: redis.Redis) -> None:  # noqa: D102
+        while True:
+            # Jittered, so workers started together don't all race for the key
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))  # noqa: S311
+
+            if not await self.is_leader(redis_client):
+                continue
+
+            try:
+                await self.run_once(engine)
+            except Exception:
+                logger.exception("Failed to run the %s", self.name)
+
+    def start(self, engine: AsyncEngine, redis_client: redis.Redis) -> None:  # noqa: D102
+        self.task = asyncio.create_task(self.run_forever(engine, redis_client))
+
+    async def stop(self) -> None:  # noqa: D102
+        if self.task is not None:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
@@ -0,0 +1,78 @@
+import asyncio
+import contextvars
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+Fetch = Callable[[AsyncEngine, list], Awaitable[dict[Hashable, Any]]]
+
+
+class Loader:
+    """
+    Coalesces concurrent lookups by key into one fetch per engine, DataLoader-style.
+
+    The first lookup for an engine opens a batch, every lookup arriving in the next
+    `window` seconds joins it, and the whole batch is fetched at once when the
+    window closes, or as soon as it holds `max_batch` keys. Lookups of the same key
+    share one result. `fetch` gets the engine and the keys and returns what it
+    found by key, keys it didn't find resolve to None.
+
+    A batch is fetched in a context of its own, so its SQL is counted towards the
+    app's totals but charged to none of the requests waiting on it, rather than
+    to whichever of them happened to open the batch.
+    """
+
+    def __init__(self, fetch: Fetch, window: float, max_batch: int) -> None:  # noqa: D107
+        self.fetch = fetch
+        self.window = window
+        self.max_batch = max_batch
+        self.batches: dict[AsyncEngine, dict[Hashable, asyncio.Future]] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:  # noqa: D102
+        return self.window > 0
+
+    async def load(self, engine: AsyncEngine, key: Hashable) -> Any | None:  # noqa: ANN401, D102
+        loop = asyncio.get_running_loop()
+        batch = self.batches.get(engine)
+
+        if batch is None:
+            batch = self.batches[engine] = {}
+            loop.call_later(self.window, self.dispatch, engine, batch)
+
+        future = batch.get(key)
+        if future is None:
+            future = batch[key] = loop.create_future()
+            if len(batch) >= self.max_batch:
+                self.dispatch(engine, batch)
+
+        # Shielded, a caller giving up must not cancel the result for the others
+        return await asyncio.shield(future)
+
+    def dispatch(self, engine: AsyncEngine, batch: dict[Hashable, asyncio.Future]) -> None:  # noqa: D102
+        # Already dispatched when it filled up before the window closed
+        if self.batches.get(engine) is not batch:
+            return
+
+        del self.batches[engine]
+
+        task = asyncio.create_task(
+            self.run(engine, batch), context=contextvars.Context()
+        )
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run(self, engine: AsyncEngine, batch: dict[Hashable, asyncio.Future]) -> None:  # noqa: D102
+        try:
+            found = await self.fetch(engine, list(batch))
+        except Exception as error:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(found.get(key))
@@ -0,0 +1,185 @@
+"""
+Prometheus metrics for the app.
+
+When PROMETHEUS_MULTIPROC_DIR is set, every worker writes its samples to files in
+that directory and a scrape of any worker aggregates all of them, so it must be set
+(to an empty directory) whenever the app runs with more than one worker.
+"""
+
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, by route template.",
+    ["method", "route", "status"],
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed while handling a request.",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 10, 15, 20, 30, 50, 100),
+)
+REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds",
+    "Total time spent in SQL statements while handling a request.",
+    ["method", "route"],
+)
+SQL_STATEMENTS = Counter(
+    "sql_statements_total", "SQL statements executed, in or outside of requests."
+)
+SQL_DURATION = Counter(
+    "sql_statement_duration_seconds_total", "Total time spent in SQL statements."
+)
+REDIS_ROUND_TRIPS = Counter(
+    "redis_round_trips_total", "Round trips made to Redis.", ["component", "operation"]
+)
+
+# Requests that didn't match a route share a label, so stray paths can't blow up
+# the number of series
+UNMATCHED_ROUTE = "unmatched"
+
+
+@dataclass
+class RequestStats:  # noqa: D101
+    sql_statements: int = 0
+    sql_duration: float = 0.0
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001, ANN201, ARG001, D103, PLR0913
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001, ANN201, ARG001, D103, PLR0913
+    duration = time.perf_counter() - conn.info["query_started_at"].pop()
+
+    SQL_STATEMENTS.inc()
+    SQL_DURATION.inc(duration)
+
+    stats = request_stats.get()
+    if stats is not None:
+        stats.sql_statements += 1
+        stats.sql_duration += duration
+
+
+def handle_error(exception_context) -> None:  # noqa: ANN001, D103
+    if exception_context.connection is None:
+        return
+
+    started_at = exception_context.connection.info.get("query_started_at")
+    if started_at:
+        started_at.pop()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Count and time every statement run on `engine`, the request it ran for included.
+    """
+    sync_engine = engine.sync_engine
+
+    if event.contains(sync_engine, "before_cursor_execute", before_cursor_execute):
+        return
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
+
+
+def record_redis_round_trip(component: str, operation: str) -> None:  # noqa: D103
+    REDIS_ROUND_TRIPS.labels(component, operation).inc()
+
+
+def route_template(scope: Scope) -> str:
+    """
+    The path of the route that handled a request, with its parameters left as
+    placeholders, e.g. /api/v1/todos/{todo_id}.
+
+    This is rebuilt from the path and its parameters rather than read from the route,
+    since routes included through a router only know their path relative to it.
+    """
+    if "route" not in scope:
+        return UNMATCHED_ROUTE
+
+    placeholders = {
+        str(value): f"{{{name}}}" for name, value in scope.get("path_params", {}).items()
+    }
+    segments = scope["path"].split("/")
+
+    return "/".join(placeholders.get(segment, segment) for segment in segments)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency and SQL usage of every request by its route template.
+    """
+
+    def __init__(self, app: ASGIApp, metrics_path: str = "/metrics") -> None:  # noqa: D107
+        self.app = app
+        self.metrics_path = metrics_path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: D102
+        if scope["type"] != "http" or scope["path"] == self.metrics_path:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status = 500
+        started_at = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started_at
+            request_stats.reset(token)
+
+            method = scope["method"]
+            route = route_template(scope)
+
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(duration)
+            REQUEST_SQL_STATEMENTS.labels(method, route).observe(stats.sql_statements)
+            REQUEST_SQL_DURATION.labels(method, route).observe(stats.sql_duration)
+
+
+def metrics_endpoint(request: Request) -> Response:  # noqa: ARG001
+    """
+    Serve every metric in the Prometheus text format.
+
+    This is a sync endpoint, so reading the multiprocess files happens in the thread
+    pool and never blocks the event loop.
+    """
+    registry = REGISTRY
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
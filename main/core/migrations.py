@@ -0,0 +1,362 @@
+"""
+Versioned schema migrations.
+
+Migrations are applied once per deploy by `python -m main.migrate`, never by the
+app itself. At startup each worker only checks the recorded version, see
+`check_schema`.
+
+Migrations are frozen DDL, never derived from the current models, so every
+database is built the same way whatever the code looks like by then. They're
+idempotent too, as databases created by `create_all` before migrations existed
+may already have some of what they add.
+"""
+
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    inspect,
+    text,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import insert, select
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary, but must be the same for every process running migrations
+ADVISORY_LOCK_KEY = 7_141_592_653
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:  # noqa: D101
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def false(connection: Connection) -> str:
+    """
+    How booleans compare to false in index predicates.
+    """
+    return "false" if connection.dialect.name == "postgresql" else "0"
+
+
+def initial_schema(connection: Connection) -> None:
+    """
+    The tables as the app created them before migrations existed.
+    """
+    if connection.dialect.name == "postgresql":
+        uuid, timestamp = "UUID", "TIMESTAMP WITHOUT TIME ZONE"
+    else:
+        uuid, timestamp = "CHAR(32)", "DATETIME"
+
+    connection.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS users ("
+            f"id {uuid} NOT NULL, "
+            "username VARCHAR(16) NOT NULL, "
+            "hashed_password VARCHAR NOT NULL, "
+            f"created_at {timestamp} NOT NULL, "
+            "disabled BOOLEAN NOT NULL, "
+            "PRIMARY KEY (id), "
+            "UNIQUE (username))"
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS todo ("
+            f"id {uuid} NOT NULL, "
+            f"owner_id {uuid} NOT NULL, "
+            "title VARCHAR(128) NOT NULL, "
+            "description VARCHAR NOT NULL, "
+            "completed BOOLEAN NOT NULL, "
+            f"created_at {timestamp} NOT NULL, "
+            f"due_at {timestamp} NOT NULL, "
+            "PRIMARY KEY (id), "
+            "FOREIGN KEY (owner_id) REFERENCES users (id))"
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            f"id {uuid} NOT NULL, "
+            f"user_id {uuid} NOT NULL, "
+            f"created_at {timestamp} NOT NULL, "
+            f"expires_at {timestamp} NOT NULL, "
+            "active BOOLEAN NOT NULL, "
+            "token VARCHAR NOT NULL, "
+            "token_type VARCHAR NOT NULL, "
+            "PRIMARY KEY (id), "
+            "FOREIGN KEY (user_id) REFERENCES users (id))"
+        )
+    )
+
+
+def todo_pagination_and_versions(connection: Connection) -> None:  # noqa: D103
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            text(
+                "ALTER TABLE todo "
+                "ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1"
+            )
+        )
+    else:
+        # SQLite can't add a column only if it doesn't exist
+        columns = {column["name"] for column in inspect(connection).get_columns("todo")}
+        if "version" not in columns:
+            connection.execute(
+                text("ALTER TABLE todo ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            )
+
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_todo_owner_id_due_at_id "
+            "ON todo (owner_id, due_at, id)"
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_todo_owner_id_created_at_id "
+            "ON todo (owner_id, created_at, id)"
+        )
+    )
+
+
+def index_tokens_by_user(connection: Connection) -> None:  # noqa: D103
+    connection.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_tokens_user_id ON tokens (user_id)")
+    )
+
+
+def index_tokens_for_lookups(connection: Connection) -> None:  # noqa: D103
+    connection.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_tokens_token ON tokens (token)")
+    )
+    connection.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_tokens_expires_at ON tokens (expires_at)")
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_tokens_inactive ON tokens (id) "
+            f"WHERE active IS {false(connection)}"
+        )
+    )
+
+
+def todo_search(connection: Connection) -> None:  # noqa: D103
+    if connection.dialect.name != "postgresql":
+        return
+
+    # Titles weigh more than descriptions when ranking matches
+    connection.execute(
+        text(
+            "ALTER TABLE todo ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+            ") STORED"
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_todo_search_vector "
+            "ON todo USING GIN (search_vector)"
+        )
+    )
+
+
+def todo_stats(connection: Connection) -> None:  # noqa: D103
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_todo_open_owner_id_due_at "
+            f"ON todo (owner_id, due_at) WHERE completed IS {false(connection)}"
+        )
+    )
+
+    if connection.dialect.name != "postgresql":
+        return
+
+    connection.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS todo_stats ("
+            "owner_id uuid PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE, "
+            "total bigint NOT NULL DEFAULT 0, "
+            "completed bigint NOT NULL DEFAULT 0)"
+        )
+    )
+
+    # Statement level, so a batch or an import updates each owner's counters once
+    # rather than once per row. Rows are counted in by what they are after the
+    # statement and out by what they were before it
+    connection.execute(
+        text(
+            """
+            CREATE OR REPLACE FUNCTION todo_stats_apply() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO todo_stats (owner_id, total, completed)
+                    SELECT owner_id, count(*), count(*) FILTER (WHERE completed)
+                    FROM new_rows GROUP BY owner_id
+                    ON CONFLICT (owner_id) DO UPDATE SET
+                        total = todo_stats.total + excluded.total,
+                        completed = todo_stats.completed + excluded.completed;
+                ELSIF TG_OP = 'DELETE' THEN
+                    UPDATE todo_stats SET
+                        total = todo_stats.total - changes.total,
+                        completed = todo_stats.completed - changes.completed
+                    FROM (
+                        SELECT owner_id, count(*) AS total,
+                            count(*) FILTER (WHERE completed) AS completed
+                        FROM old_rows GROUP BY owner_id
+                    ) AS changes
+                    WHERE todo_stats.owner_id = changes.owner_id;
+                ELSE
+                    INSERT INTO todo_stats (owner_id, total, completed)
+                    SELECT owner_id, sum(total), sum(completed) FROM (
+                        SELECT owner_id, 1 AS total, completed::int AS completed
+                        FROM new_rows
+                        UNION ALL
+                        SELECT owner_id, -1, -completed::int FROM old_rows
+                    ) AS changes
+                    GROUP BY owner_id
+                    HAVING sum(total) <> 0 OR sum(completed) <> 0
+                    ON CONFLICT (owner_id) DO UPDATE SET
+                        total = todo_stats.total + excluded.total,
+                        completed = todo_stats.completed + excluded.completed;
+                END IF;
+                RETURN NULL;
+            END
+            $$
+            """
+        )
+    )
+
+    for statement in [
+        "DROP TRIGGER IF EXISTS todo_stats_insert ON todo",
+        "CREATE TRIGGER todo_stats_insert AFTER INSERT ON todo "
+        "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+        "EXECUTE FUNCTION todo_stats_apply()",
+        "DROP TRIGGER IF EXISTS todo_stats_update ON todo",
+        "CREATE TRIGGER todo_stats_update AFTER UPDATE ON todo "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT "
+        "EXECUTE FUNCTION todo_stats_apply()",
+        "DROP TRIGGER IF EXISTS todo_stats_delete ON todo",
+        "CREATE TRIGGER todo_stats_delete AFTER DELETE ON todo "
+        "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+        "EXECUTE FUNCTION todo_stats_apply()",
+    ]:
+        connection.execute(text(statement))
+
+    # Writes are blocked until the migration commits, so none is counted twice or
+    # missed between the backfill and the triggers taking over
+    connection.execute(text("LOCK TABLE todo IN SHARE MODE"))
+    connection.execute(
+        text(
+            "INSERT INTO todo_stats (owner_id, total, completed) "
+            "SELECT owner_id, count(*), count(*) FILTER (WHERE completed) "
+            "FROM todo GROUP BY owner_id "
+            "ON CONFLICT (owner_id) DO UPDATE SET "
+            "total = excluded.total, completed = excluded.completed"
+        )
+    )
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "Initial schema", initial_schema),
+    Migration(2, "Todo pagination indexes and versions", todo_pagination_and_versions),
+    Migration(3, "Index tokens by user", index_tokens_by_user),
+    Migration(4, "Index tokens for lookups and reaping", index_tokens_for_lookups),
+    Migration(5, "Todo full-text search", todo_search),
+    Migration(6, "Todo stats counters", todo_stats),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def get_version(connection: AsyncConnection) -> int:
+    """
+    The version the database is at, 0 if it has never been migrated.
+    """
+    has_table = await connection.run_sync(
+        lambda sync_connection: sync_connection.dialect.has_table(
+            sync_connection, schema_version.name
+        )
+    )
+
+    if not has_table:
+        return 0
+
+    result = await connection.execute(select(func.max(schema_version.c.version)))
+    return result.scalar() or 0
+
+
+async def check_schema(engine: AsyncEngine) -> None:
+    """
+    Make sure the database has been migrated to the version this code expects.
+    """
+    async with engine.connect() as connection:
+        version = await get_version(connection)
+
+    if version < LATEST_VERSION:
+        raise RuntimeError(
+            f"The database schema is at version {version}, but version {LATEST_VERSION}"
+            ' is required. Run "python -m main.migrate" first.'
+        )
+
+    if version > LATEST_VERSION:
+        logger.warning(
+            "The database schema is at version %d, newer than this code's %d",
+            version,
+            LATEST_VERSION,
+        )
+
+
+async def migrate(engine: AsyncEngine) -> list[Migration]:
+    """
+    Apply every pending migration in a single transaction, returning those applied.
+
+    On Postgres this holds an advisory lock, so concurrent runs apply each migration
+    exactly once.
+    """
+    async with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            await connection.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+            )
+
+        await connection.run_sync(schema_version.create, checkfirst=True)
+        version = await get_version(connection)
+        pending = [migration for migration in MIGRATIONS if migration.version > version]
+
+        for migration in pending:
+            logger.info("Applying migration %d: %s", migration.version, migration.description)
+            await connection.run_sync(migration.upgrade)
+            await connection.execute(
+                insert(schema_version).values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.now(),
+                )
+            )
+
+    return pending
@@ -0,0 +1,200 @@
+"""
+Optional range partitioning of the tokens table by `expires_at`, Postgres only.
+
+Every partition holds a calendar month of expiries, so once a month is over all of
+its tokens have expired and the whole partition can be dropped, instead of
+deleting its rows. Rows outside every partition land in a default partition and
+are reaped row by row. `partition_tokens` converts the table once, see
+`python -m main.reap_tokens partition`, after which the reaper keeps partitions
+created ahead of time and drops expired ones.
+"""
+
+import logging
+import math
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from main.core.schema.token import Tokens
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^tokens_p(\d{4})(\d{2})$")
+
+
+def month_start(moment: datetime, offset: int = 0) -> datetime:  # noqa: D103
+    month = moment.year * 12 + moment.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def months_ahead() -> int:
+    """
+    Enough months of partitions that a token issued now never lands in the default.
+    """
+    return math.ceil(settings.AUTH_TOKEN_EXPIRATION / (60 * 24 * 28)) + 1
+
+
+async def is_partitioned(connection: AsyncConnection) -> bool:  # noqa: D103
+    if connection.dialect.name != "postgresql":
+        return False
+
+    return await connection.scalar(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass('tokens'))"
+        )
+    )
+
+
+async def list_partitions(connection: AsyncConnection) -> list[str]:  # noqa: D103
+    result = await connection.scalars(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass('tokens')"
+        )
+    )
+    return list(result)
+
+
+async def create_partition(connection: AsyncConnection, table: str, start: datetime) -> str:  # noqa: D103, E501
+    name = f"tokens_p{start:%Y%m}"
+    end = month_start(start, 1)
+
+    await connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+    return name
+
+
+async def create_partition_from_default(connection: AsyncConnection, start: datetime) -> str:  # noqa: E501
+    """
+    Create a month's partition when the default partition already holds some of
+    its rows, which Postgres refuses to do in place.
+
+    The default is detached, the month's rows are moved out of it into the new
+    partition, and it's attached again. Detaching locks the whole table until the
+    transaction commits.
+    """
+    end = month_start(start, 1)
+    in_range = "expires_at >= :start AND expires_at < :end"
+    bounds = {"start": start, "end": end}
+
+    logger.warning(
+        "The default tokens partition holds rows from %s to %s, moving them into "
+        "their own partition",
+        start.isoformat(),
+        end.isoformat(),
+    )
+
+    await connection.execute(text("ALTER TABLE tokens DETACH PARTITION tokens_pdefault"))
+    name = await create_partition(connection, "tokens", start)
+    await connection.execute(
+        text(f"INSERT INTO tokens SELECT * FROM tokens_pdefault WHERE {in_range}"), bounds
+    )
+    await connection.execute(text(f"DELETE FROM tokens_pdefault WHERE {in_range}"), bounds)
+    await connection.execute(
+        text("ALTER TABLE tokens ATTACH PARTITION tokens_pdefault DEFAULT")
+    )
+
+    return name
+
+
+async def ensure_partitions(connection: AsyncConnection, now: datetime | None = None) -> list[str]:  # noqa: E501
+    """
+    Create the partitions for this month and the months ahead, if they're missing.
+    """
+    now = now or datetime.now()
+    existing = set(await list_partitions(connection))
+    created = []
+
+    for offset in range(months_ahead() + 1):
+        start = month_start(now, offset)
+        if f"tokens_p{start:%Y%m}" in existing:
+            continue
+
+        # Tokens land in the default when their month's partition is missing, e.g.
+        # after the reaper didn't run for a while or the expiration was raised
+        in_default = await connection.scalar(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM tokens_pdefault "
+                "WHERE expires_at >= :start AND expires_at < :end)"
+            ),
+            {"start": start, "end": month_start(start, 1)},
+        )
+        if in_default:
+            created.append(await create_partition_from_default(connection, start))
+        else:
+            created.append(await create_partition(connection, "tokens", start))
+
+    return created
+
+
+async def drop_expired_partitions(connection: AsyncConnection, now: datetime | None = None) -> list[str]:  # noqa: E501
+    """
+    Drop every monthly partition whose tokens have all expired.
+    """
+    now = now or datetime.now()
+    dropped = []
+
+    for name in await list_partitions(connection):
+        match = PARTITION_NAME.match(name)
+        if match is None:
+            continue
+
+        start = datetime(int(match[1]), int(match[2]), 1)
+        if month_start(start, 1) <= now:
+            await connection.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+
+    return dropped
+
+
+async def partition_tokens(connection: AsyncConnection) -> None:
+    """
+    Rebuild the tokens table as a partitioned table, copying every row.
+
+    The table is locked for the whole copy, so run this in a maintenance window.
+    """
+    if connection.dialect.name != "postgresql":
+        raise RuntimeError("Partitioning is only supported on Postgres")
+
+    if await is_partitioned(connection):
+        logger.info("The tokens table is already partitioned")
+        return
+
+    await connection.execute(text("LOCK TABLE tokens IN ACCESS EXCLUSIVE MODE"))
+
+    # The partition key has to be part of the primary key
+    await connection.execute(
+        text(
+            "CREATE TABLE tokens_partitioned ("
+            "LIKE tokens INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+            "PRIMARY KEY (id, expires_at), "
+            "FOREIGN KEY (user_id) REFERENCES users (id)"
+            ") PARTITION BY RANGE (expires_at)"
+        )
+    )
+    await connection.execute(
+        text("CREATE TABLE tokens_pdefault PARTITION OF tokens_partitioned DEFAULT")
+    )
+
+    now = datetime.now()
+    for offset in range(months_ahead() + 1):
+        await create_partition(connection, "tokens_partitioned", month_start(now, offset))
+
+    await connection.execute(text("INSERT INTO tokens_partitioned SELECT * FROM tokens"))
+    await connection.execute(text("DROP TABLE tokens"))
+    await connection.execute(text("ALTER TABLE tokens_partitioned RENAME TO tokens"))
+
+    # Indexes created on the parent are created on every partition
+    for index in Tokens.__table__.indexes:
+        await connection.run_sync(index.create)
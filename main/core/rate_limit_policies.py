@@ -0,0 +1,50 @@
+"""
+Which bucket every route is rate limited in, and what each request costs.
+
+Anything not listed here costs 1 from the global bucket, which is what the cheap
+reads use. Logging in and registering hash a password with bcrypt, so they get a
+small bucket of their own, keyed on the client's address as there's no user yet.
+Imports, exports and batches share the bulk bucket, weighted by how much work they
+do, so they can't crowd out the cheap reads either.
+"""
+
+from fastapi import HTTPException
+
+from main.core.auth_cache import token_cache
+from main.core.rate_limiter import RateLimitPolicy
+from main.core.security import decode_access_token, is_access_token
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+API_ROOT = f"/{settings.API_PREFIX}/{{version}}"
+
+BUCKETS: dict[str, tuple[int, int]] = {
+    "auth": (settings.AUTH_RATELIMIT_LIMIT, settings.AUTH_RATELIMIT_INTERVAL),
+    "bulk": (settings.BULK_RATELIMIT_LIMIT, settings.BULK_RATELIMIT_INTERVAL),
+}
+
+POLICIES: list[RateLimitPolicy] = [
+    RateLimitPolicy("POST", f"{API_ROOT}/users/token", bucket="auth", key="ip"),
+    RateLimitPolicy("POST", f"{API_ROOT}/users/", bucket="auth", key="ip"),
+    RateLimitPolicy("POST", f"{API_ROOT}/todos/import", bucket="bulk", cost=10),
+    RateLimitPolicy("GET", f"{API_ROOT}/todos/export", bucket="bulk", cost=5),
+    RateLimitPolicy("POST", f"{API_ROOT}/todos/batch", bucket="bulk", cost=2),
+    RateLimitPolicy("GET", f"{API_ROOT}/todos/search", cost=2),
+]
+
+
+def token_owner(token: str) -> str | None:
+    """
+    The id of the user a token belongs to, if it can be told without any I/O.
+
+    JWTs are verified by their signature, opaque tokens only count once they're in
+    this worker's token cache.
+    """
+    if settings.AUTH_TOKEN_MODE == "jwt" and is_access_token(token):
+        try:
+            return decode_access_token(token)["sub"]
+        except HTTPException:
+            return None
+
+    return token_cache.peek_user_id(token)
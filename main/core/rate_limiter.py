@@ -1,77 +1,529 @@
+import asyncio
+import contextlib
 import datetime
+import ipaddress
+import logging
+import re
 import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import NamedTuple
 
 import redis.asyncio as redis
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from main.core.settings import AppSettings
+from main.core.metrics import record_redis_round_trip
+from main.core.settings import get_settings
 
-settings = AppSettings()
+settings = get_settings()
 
+logger = logging.getLogger(__name__)
 
-class RateLimiterMiddleware(BaseHTTPMiddleware):
+# Every script takes the same arguments so the middleware doesn't care which
+# algorithm is in use:
+#   KEYS[1]: the bucket key, KEYS[2]: an auxiliary key (only used by some)
+#   ARGV[1]: limit, ARGV[2]: window in milliseconds, ARGV[3]: cost,
+#   ARGV[4]: requests that were already let through and must be recorded
+#            regardless of the limit
+# and return {allowed, remaining, reset_after_ms}. The whole check runs
+# server-side, so a request costs exactly one round trip and is atomic
+# across workers.
+
+FIXED_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local admitted = tonumber(ARGV[4])
+
+local current = tonumber(redis.call("GET", KEYS[1]) or "0")
+local allowed = 1
+
+if current + admitted + cost > limit then
+    allowed = 0
+    cost = 0
+end
+
+if admitted + cost > 0 then
+    current = redis.call("INCRBY", KEYS[1], admitted + cost)
+end
+
+local ttl = redis.call("PTTL", KEYS[1])
+if ttl < 0 then
+    if current > 0 then
+        redis.call("PEXPIRE", KEYS[1], window)
+    end
+    ttl = window
+end
+
+return {allowed, math.max(limit - current, 0), ttl}
+"""
+
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local admitted = tonumber(ARGV[4])
+
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - window)
+local current = redis.call("ZCARD", KEYS[1])
+local allowed = 1
+
+if current + admitted + cost > limit then
+    allowed = 0
+    cost = 0
+end
+
+if admitted + cost > 0 then
+    local sequence = redis.call("INCRBY", KEYS[2], admitted + cost)
+    for i = sequence - admitted - cost + 1, sequence do
+        redis.call("ZADD", KEYS[1], now, i)
+    end
+    redis.call("PEXPIRE", KEYS[1], window)
+    redis.call("PEXPIRE", KEYS[2], window)
+    current = current + admitted + cost
+end
+
+local reset_after = window
+if allowed == 0 then
+    local oldest = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")
+    if oldest[2] then
+        reset_after = tonumber(oldest[2]) + window - now
+    end
+end
+
+return {allowed, math.max(limit - current, 0), reset_after}
+"""
+
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local admitted = tonumber(ARGV[4])
+local emission_interval = window / limit
+
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local tat = tonumber(redis.call("GET", KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+tat = tat + emission_interval * admitted
+
+local new_tat = tat + emission_interval * cost
+local allowed = 1
+local reset_after = math.ceil(new_tat - now)
+
+if new_tat - window > now then
+    allowed = 0
+    reset_after = math.ceil(new_tat - window - now)
+    new_tat = tat
+end
+
+if new_tat > now then
+    redis.call("SET", KEYS[1], string.format("%d", math.floor(new_tat)), "PX", math.ceil(new_tat - now))
+end
+
+local remaining = math.floor((now - (new_tat - window)) / emission_interval)
+return {allowed, math.max(remaining, 0), reset_after}
+"""
+
+ALGORITHMS: dict[str, str] = {
+    "fixed_window": FIXED_WINDOW_SCRIPT,
+    "sliding_window": SLIDING_WINDOW_SCRIPT,
+    "gcra": GCRA_SCRIPT,
+}
+
+
+class RateLimitResult(NamedTuple):  # noqa: D101
+    allowed: bool
+    remaining: int
+    reset_after: float  # This is in seconds
+
+
+class RedisRateLimiter:
     """
-    Custom rate limiter middleware.
+    Runs one of the rate limiting algorithms against Redis.
 
-    Should add a rate limit to the application.
-    Will give X-Ratelimit-Remaining, X-Ratelimit and X-Retry-After headers.
+    Each call to `hit` is a single EVALSHA, so the check and the update are atomic.
     """
 
     def __init__(  # noqa: D107
         self,
-        app,  # noqa: ANN001
+        redis_client: redis.Redis,
         limit: int,
         interval: int,
-        redis_pool: redis.ConnectionPool,
-        *args: any,
-        **kwargs: any,
+        algorithm: str = "fixed_window",
     ) -> None:
-        super().__init__(app, *args, **kwargs)
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+
         self.limit = limit
         self.interval = interval
-        self.redis: redis.Redis = redis.Redis(connection_pool=redis_pool)
-
-    async def dispatch(self, request: Request, call_next):  # noqa: ANN001, ANN201, D102
-        ip = request.client.host
-        if not ip:
-            return JSONResponse({"detail": "Internal Server Error"}, status_code=500)
-
-        current_time = time.time()
-        if (
-            current_time - float(await self.redis.get(f"{ip}_time") or 0)
-            > self.interval
-        ):
-            await self.redis.set(f"{ip}_time", current_time)
-            await self.redis.set(f"{ip}_count", 0)
-            await self.redis.expire(f"{ip}_time", self.interval)
-            await self.redis.expire(f"{ip}_count", self.interval)
-
-        requests = int(await self.redis.get(f"{ip}_count") or 0)
-
-        if requests >= self.limit:
-            retry_after = self.interval - (
-                current_time - float(await self.redis.get(f"{ip}_time") or 0)
+        self.algorithm = algorithm
+        self.redis = redis_client
+        self.script = redis_client.register_script(ALGORITHMS[algorithm])
+
+    def script_arguments(self, key: str, cost: int, admitted: int) -> dict:  # noqa: D102
+        return {
+            "keys": [f"ratelimit:{self.algorithm}:{key}", f"ratelimit:seq:{key}"],
+            "args": [self.limit, self.interval * 1000, cost, admitted],
+        }
+
+    async def hit(self, key: str, cost: int = 1, admitted: int = 0) -> RateLimitResult:
+        """
+        Record `cost` requests against `key`, unless that would exceed the limit.
+
+        `admitted` requests are recorded regardless, which is used to account for
+        requests that have already been let through.
+        """
+        record_redis_round_trip("ratelimit", "hit")
+        allowed, remaining, reset_after = await self.script(
+            **self.script_arguments(key, cost, admitted)
+        )
+
+        return RateLimitResult(bool(allowed), int(remaining), int(reset_after) / 1000)
+
+    async def record_many(self, admitted: dict[str, int]) -> dict[str, RateLimitResult]:
+        """
+        Record already admitted requests for many keys in a single pipelined round trip.
+        """
+        record_redis_round_trip("ratelimit", "record_many")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, count in admitted.items():
+                await self.script(**self.script_arguments(key, 0, count), client=pipe)
+            results = await pipe.execute()
+
+        return {
+            key: RateLimitResult(bool(allowed), int(remaining), int(reset_after) / 1000)
+            for key, (allowed, remaining, reset_after) in zip(admitted, results)
+        }
+
+
+@dataclass
+class LocalBucket:  # noqa: D101
+    remaining: int
+    reset_at: float
+    budget: int = 0
+    pending: int = 0
+
+
+class LocalRateLimiter:
+    """
+    A per-worker tier in front of `RedisRateLimiter`.
+
+    After a key has been checked against Redis, the worker may admit up to
+    `limit * max_error` further requests for it without asking Redis again, as long
+    as Redis reported more than that remaining. Those admissions are pushed to Redis
+    in one batch every `sync_interval` seconds, so a client that is clearly under its
+    limit never waits on the network, and keys close to their limit are always
+    checked against Redis directly. Across N workers the limit can be exceeded by at
+    most `N * limit * max_error` requests.
+    """
+
+    def __init__(  # noqa: D107
+        self, limiter: RedisRateLimiter, sync_interval: float, max_error: float
+    ) -> None:
+        self.limiter = limiter
+        self.sync_interval = sync_interval
+        self.local_budget = int(limiter.limit * max_error)
+        self.buckets: dict[str, LocalBucket] = {}
+        self.sync_task: asyncio.Task | None = None
+
+    async def hit(self, key: str, cost: int = 1) -> RateLimitResult:  # noqa: D102
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+
+        if bucket is not None and now < bucket.reset_at and bucket.budget >= cost:
+            bucket.budget -= cost
+            bucket.pending += cost
+            bucket.remaining -= cost
+            return RateLimitResult(True, max(bucket.remaining, 0), bucket.reset_at - now)
+
+        if self.sync_task is None:
+            self.sync_task = asyncio.create_task(self.sync_forever())
+
+        admitted = bucket.pending if bucket is not None else 0
+        if bucket is not None:
+            bucket.pending = 0
+
+        try:
+            result = await self.limiter.hit(key, cost, admitted)
+        except Exception:
+            if bucket is not None:
+                bucket.pending += admitted
+            raise
+
+        self.update(key, result, now)
+
+        return result
+
+    def update(self, key: str, result: RateLimitResult, now: float) -> None:  # noqa: D102
+        bucket = self.buckets.setdefault(key, LocalBucket(0, 0))
+        bucket.remaining = result.remaining
+        bucket.reset_at = now + min(result.reset_after, self.sync_interval)
+        bucket.budget = (
+            self.local_budget if result.remaining > self.local_budget else 0
+        )
+
+    async def sync(self) -> None:
+        """
+        Push every locally admitted request to Redis and refresh the local buckets.
+        """
+        now = time.monotonic()
+        pending = {}
+
+        for key, bucket in list(self.buckets.items()):
+            if bucket.pending:
+                pending[key] = bucket.pending
+                bucket.pending = 0
+            elif now >= bucket.reset_at:
+                del self.buckets[key]
+
+        if not pending:
+            return
+
+        try:
+            results = await self.limiter.record_many(pending)
+        except Exception:
+            for key, count in pending.items():
+                self.buckets.setdefault(key, LocalBucket(0, 0)).pending += count
+            raise
+
+        for key, result in results.items():
+            self.update(key, result, now)
+
+    async def sync_forever(self) -> None:  # noqa: D102
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Failed to sync local rate limits with Redis")
+
+    async def close(self) -> None:
+        """
+        Stop the sync loop and flush whatever is still pending.
+        """
+        if self.sync_task is not None:
+            self.sync_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.sync_task
+            self.sync_task = None
+
+        await self.sync()
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """
+    How requests to a route are rate limited.
+
+    `path` is matched against the whole request path, "{name}" matches any single
+    segment and "*" matches every path, as does a `method` of "*". Each request is
+    charged `cost` against `bucket`. With a `key` of "user", requests carrying a
+    token the worker already knows are counted against its user, wherever they come
+    from, anything else is counted against the client's address, as with "ip".
+    """
+
+    method: str
+    path: str
+    bucket: str = "global"
+    cost: int = 1
+    key: str = "user"
+
+    def compile(self) -> re.Pattern:  # noqa: D102
+        if self.path == "*":
+            return re.compile(".*")
+
+        pattern = re.sub(r"\\{\w+\\}", "[^/]+", re.escape(self.path.rstrip("/")))
+        return re.compile(f"{pattern}/?")
+
+
+DEFAULT_POLICY = RateLimitPolicy("*", "*")
+
+
+class RateLimiterMiddleware:
+    """
+    Custom rate limiter middleware.
+
+    Should add a rate limit to the application.
+    Will give X-Ratelimit-Remaining, X-Ratelimit, X-Ratelimit-Bucket and
+    X-Retry-After headers.
+
+    Requests are matched against `policies` in order, falling back to the global
+    bucket of `limit` requests per `interval`. Every other bucket has its own limit
+    in `buckets`, so expensive routes can be limited without eating into the budget
+    of cheap ones. `token_owner` maps a bearer token to its user's id, if it's
+    known without any I/O. Behind `trusted_proxies` the client's address is taken
+    from X-Forwarded-For.
+
+    This is a pure ASGI middleware, so requests aren't wrapped in the extra tasks
+    and streams `BaseHTTPMiddleware` would add.
+    """
+
+    def __init__(  # noqa: D107
+        self,
+        app: ASGIApp,
+        limit: int,
+        interval: int,
+        redis_client: redis.Redis,
+        algorithm: str = "fixed_window",
+        local_tier: bool = False,
+        sync_interval: float = 1.0,
+        max_error: float = 0.05,
+        buckets: dict[str, tuple[int, int]] | None = None,
+        policies: Sequence[RateLimitPolicy] = (),
+        trusted_proxies: Sequence[str] = (),
+        token_owner: Callable[[str], str | None] | None = None,
+    ) -> None:
+        self.app = app
+        self.buckets = {"global": (limit, interval), **(buckets or {})}
+        self.limiters: dict[str, RedisRateLimiter | LocalRateLimiter] = {}
+
+        for name, (bucket_limit, bucket_interval) in self.buckets.items():
+            limiter = RedisRateLimiter(redis_client, bucket_limit, bucket_interval, algorithm)
+            if local_tier:
+                limiter = LocalRateLimiter(limiter, sync_interval, max_error)
+            self.limiters[name] = limiter
+
+        for policy in policies:
+            if policy.bucket not in self.buckets:
+                raise ValueError(f"Unknown rate limit bucket: {policy.bucket}")
+            if policy.key not in ("user", "ip"):
+                raise ValueError(f"Unknown rate limit key: {policy.key}")
+
+        self.policies = [(policy.method, policy.compile(), policy) for policy in policies]
+        self.trusted_proxies = [
+            ipaddress.ip_network(proxy, strict=False) for proxy in trusted_proxies
+        ]
+        self.token_owner = token_owner
+
+    def match(self, scope: Scope) -> RateLimitPolicy:  # noqa: D102
+        for method, pattern, policy in self.policies:
+            if method in ("*", scope["method"]) and pattern.fullmatch(scope["path"]):
+                return policy
+
+        return DEFAULT_POLICY
+
+    def is_trusted(self, address: str) -> bool:  # noqa: D102
+        try:
+            parsed = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+
+        return any(parsed in network for network in self.trusted_proxies)
+
+    def client_address(self, scope: Scope, headers: Headers) -> str | None:
+        """
+        The address of the client, skipping every trusted proxy in front of it.
+
+        Each proxy appends the address it received the request from to
+        X-Forwarded-For, so the chain is walked from the right, and the first hop
+        that isn't a trusted proxy is the client. Anything further left could have
+        been sent by the client itself.
+        """
+        client = scope.get("client")
+        address = client[0] if client else None
+
+        if not address or not self.trusted_proxies:
+            return address
+
+        hops = [
+            hop.strip()
+            for header in headers.getlist("x-forwarded-for")
+            for hop in header.split(",")
+            if hop.strip()
+        ]
+
+        while hops and self.is_trusted(address):
+            address = hops.pop()
+
+        return address
+
+    def identify(self, scope: Scope, policy: RateLimitPolicy) -> str | None:
+        """
+        The key a request is counted against, None if the client can't be told apart.
+
+        Unknown tokens are counted against the address they come from, so a client
+        can't get a fresh limit by making tokens up.
+        """
+        headers = Headers(scope=scope)
+
+        if policy.key == "user" and self.token_owner is not None:
+            scheme, _, token = headers.get("authorization", "").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                user_id = self.token_owner(token.strip())
+                if user_id is not None:
+                    return f"user:{user_id}"
+
+        address = self.client_address(scope, headers)
+        return f"ip:{address}" if address else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: D102
+        if scope["type"] == "lifespan":
+            await self.app(scope, self.wrap_lifespan(receive), send)
+            return
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.match(scope)
+        identity = self.identify(scope, policy)
+        if identity is None:
+            response = JSONResponse({"detail": "Internal Server Error"}, status_code=500)
+            await response(scope, receive, send)
+            return
+
+        limit, interval = self.buckets[policy.bucket]
+        result = await self.limiters[policy.bucket].hit(
+            f"{policy.bucket}:{identity}", policy.cost
+        )
+
+        headers = {
+            "X-Ratelimit-Remaining": str(result.remaining),
+            "X-Ratelimit": str(limit),
+            "X-Ratelimit-Interval": str(interval),
+            "X-Ratelimit-Bucket": policy.bucket,
+        }
+
+        if not result.allowed:
+            headers["X-Retry-After"] = str(
+                datetime.datetime.now(tz=datetime.timezone.utc)
+                + datetime.timedelta(seconds=result.reset_after)
             )
-            return JSONResponse(
+            response = JSONResponse(
                 {"detail": "Rate limit exceeded. Retry later."},
                 status_code=429,
-                headers={
-                    "X-Retry-After": str(datetime.datetime.now(tz=datetime.timezone.utc)
-                    + datetime.timedelta(seconds=retry_after)),
-                    "X-Ratelimit-Remaining": str(self.limit - requests),
-                    "X-Ratelimit": str(self.limit),
-                    "X-Ratelimit-Interval": str(self.interval),
-                },
+                headers=headers,
             )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
 
-        await self.redis.incr(f"{ip}_count")
+    def wrap_lifespan(self, receive: Receive) -> Receive:
+        """
+        Flush the local tier when the server shuts down.
+        """
 
-        response = await call_next(request)
-        response.headers["X-Ratelimit-Remaining"] = str(self.limit - (requests + 1))
-        response.headers["X-Ratelimit"] = str(self.limit)
-        response.headers["X-Ratelimit-Interval"] = str(self.interval)
-        await self.redis.aclose()
+        async def receive_lifespan() -> Message:
+            message = await receive()
+            if message["type"] == "lifespan.shutdown":
+                for limiter in self.limiters.values():
+                    if isinstance(limiter, LocalRateLimiter):
+                        await limiter.close()
+            return message
 
-        return response
+        return receive_lifespan
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import or_
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import delete, select
+
+from main.core.leader import LeaderElectedJob
+from main.core.partitions import drop_expired_partitions, ensure_partitions, is_partitioned
+from main.core.schema.token import Tokens
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "reaper:tokens:leader"
+
+
+@dataclass
+class ReapResult:  # noqa: D101
+    deleted: int = 0
+    batches: int = 0
+    dropped_partitions: int = 0
+
+
+class TokenReaper(LeaderElectedJob):
+    """
+    Deletes expired and inactive tokens.
+
+    Rows are deleted in batches of `batch_size`, each in its own short transaction
+    and followed by a `batch_pause` second pause, so the reaper never holds locks
+    for long or saturates the database. Rows locked by a request are skipped and
+    picked up by a later run. When the table is partitioned, expired partitions are
+    dropped first.
+
+    Run in-process by every worker, the table is reaped at most once per interval
+    across the deployment, see `LeaderElectedJob`.
+    """
+
+    leader_key = LEADER_KEY
+    name = "token reaper"
+
+    def __init__(  # noqa: D107
+        self, interval: int, batch_size: int, batch_pause: float, max_batches: int
+    ) -> None:
+        super().__init__(interval)
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.max_batches = max_batches
+
+    async def reap_batch(self, engine: AsyncEngine, now: datetime) -> int:  # noqa: D102
+        stale_ids = (
+            select(Tokens.id)
+            .where(or_(Tokens.expires_at < now, Tokens.active.is_(False)))
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+
+        async with engine.begin() as connection:
+            result = await connection.execute(
+                delete(Tokens).where(Tokens.id.in_(stale_ids.scalar_subquery()))
+            )
+
+        return result.rowcount
+
+    async def run_once(self, engine: AsyncEngine) -> ReapResult:
+        """
+        Reap until there's nothing left or `max_batches` batches have run.
+        """
+        result = ReapResult()
+        now = datetime.now()
+
+        async with engine.begin() as connection:
+            if await is_partitioned(connection):
+                await ensure_partitions(connection, now)
+                dropped = await drop_expired_partitions(connection, now)
+                result.dropped_partitions = len(dropped)
+
+        while result.batches < self.max_batches:
+            deleted = await self.reap_batch(engine, now)
+            result.deleted += deleted
+            result.batches += 1
+
+            if deleted < self.batch_size:
+                break
+
+            await asyncio.sleep(self.batch_pause)
+
+        logger.info(
+            "Reaped %d tokens in %d batches, dropped %d partitions",
+            result.deleted,
+            result.batches,
+            result.dropped_partitions,
+        )
+
+        return result
+
+
+token_reaper = TokenReaper(
+    settings.TOKEN_REAPER_INTERVAL,
+    settings.TOKEN_REAPER_BATCH_SIZE,
+    settings.TOKEN_REAPER_BATCH_PAUSE,
+    settings.TOKEN_REAPER_MAX_BATCHES,
+)
@@ -0,0 +1,213 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlalchemy.ext.asyncio.session import AsyncSession
+
+from main.core.cache import LocalCache, invalidation_bus
+from main.core.database import create_engine, get_session, pool_stats
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+STICKY_CHANNEL = "db:sticky"
+
+# Only the primary's clock is comparable, so a replica with nothing to replay
+# reports no lag rather than the time since its last replayed transaction
+REPLICATION_LAG_QUERY = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+@dataclass
+class Replica:  # noqa: D101
+    name: str
+    engine: AsyncEngine
+    session_maker: async_sessionmaker[AsyncSession]
+    healthy: bool = True
+    lag: float = 0.0
+
+
+class ReplicaSet:
+    """
+    Routes reads to read replicas, round-robin over those that passed their last
+    health check.
+
+    A user who has just written is "sticky" to the primary for `sticky_seconds`, so
+    they always read their own writes. Writes are broadcast over the invalidation
+    bus, so this holds whichever worker serves the next request. If the bus
+    reconnects, and so may have missed some, every read goes to the primary for the
+    next `sticky_seconds`.
+    """
+
+    def __init__(self, sticky_seconds: float, health_interval: float, max_lag: float) -> None:  # noqa: D107, E501
+        self.sticky_seconds = sticky_seconds
+        self.health_interval = health_interval
+        self.max_lag = max_lag
+        self.replicas: list[Replica] = []
+        self.counter = itertools.count()
+        self.sticky_users = LocalCache(100_000, sticky_seconds)
+        self.sticky_until = 0.0
+        self.health_task: asyncio.Task | None = None
+
+        invalidation_bus.subscribe(STICKY_CHANNEL, self.handle_invalidation)
+
+    @property
+    def enabled(self) -> bool:  # noqa: D102
+        return bool(self.replicas)
+
+    def start(self, urls: list[str]) -> list[AsyncEngine]:
+        """
+        Create an engine for every replica and start checking their health.
+        """
+        for url in urls:
+            engine = create_engine(url)
+            self.replicas.append(
+                Replica(
+                    name=make_url(url).render_as_string(hide_password=True),
+                    engine=engine,
+                    session_maker=async_sessionmaker(engine, expire_on_commit=False),
+                )
+            )
+
+        if self.replicas:
+            self.health_task = asyncio.create_task(self.check_health_forever())
+
+        return [replica.engine for replica in self.replicas]
+
+    async def stop(self) -> None:  # noqa: D102
+        if self.health_task is not None:
+            self.health_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.health_task
+            self.health_task = None
+
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+        self.replicas = []
+
+    def choose(self) -> Replica | None:  # noqa: D102
+        healthy = [replica for replica in self.replicas if replica.healthy]
+
+        if not healthy or time.monotonic() < self.sticky_until:
+            return None
+
+        return healthy[next(self.counter) % len(healthy)]
+
+    def open_session(self, user_id: UUID | None = None) -> AsyncSession | None:
+        """
+        Open a session on a replica, or return None if reads should go to the primary.
+        """
+        if user_id is not None and self.is_sticky(user_id):
+            return None
+
+        replica = self.choose()
+
+        if replica is None:
+            return None
+
+        session = replica.session_maker()
+        session.info["replica"] = replica.name
+        return session
+
+    def is_sticky(self, user_id: UUID) -> bool:  # noqa: D102
+        return self.sticky_users.get(str(user_id)) is not None
+
+    async def mark_written(self, user_id: UUID) -> None:
+        """
+        Send the user's reads to the primary until the replicas have caught up.
+        """
+        if not self.enabled:
+            return
+
+        self.sticky_users.set(str(user_id), True)
+        await invalidation_bus.publish(STICKY_CHANNEL, {"user_id": str(user_id)})
+
+    def handle_invalidation(self, message: dict | None) -> None:  # noqa: D102
+        if message is None:
+            self.sticky_until = time.monotonic() + self.sticky_seconds
+        else:
+            self.sticky_users.set(message["user_id"], True)
+
+    async def check_health(self, replica: Replica) -> None:  # noqa: D102
+        try:
+            async with asyncio.timeout(self.health_interval):
+                async with replica.engine.connect() as connection:
+                    if connection.dialect.name == "postgresql" and self.max_lag > 0:
+                        replica.lag = float(
+                            await connection.scalar(text(REPLICATION_LAG_QUERY))
+                        )
+                    else:
+                        await connection.execute(text("SELECT 1"))
+        except Exception:  # noqa: BLE001
+            if replica.healthy:
+                logger.warning("Replica %s failed its health check", replica.name)
+            replica.healthy = False
+            return
+
+        healthy = self.max_lag <= 0 or replica.lag <= self.max_lag
+
+        if healthy != replica.healthy:
+            logger.warning(
+                "Replica %s is %s, %.1fs behind",
+                replica.name,
+                "healthy" if healthy else "lagging",
+                replica.lag,
+            )
+        replica.healthy = healthy
+
+    async def check_health_forever(self) -> None:  # noqa: D102
+        while True:
+            await asyncio.gather(*(self.check_health(replica) for replica in self.replicas))
+            await asyncio.sleep(self.health_interval)
+
+    def stats(self) -> list[dict]:
+        """
+        Health and pool statistics for every replica.
+        """
+        return [
+            {
+                "name": replica.name,
+                "healthy": replica.healthy,
+                "lag": replica.lag,
+                **pool_stats(replica.engine),
+            }
+            for replica in self.replicas
+        ]
+
+
+replica_set = ReplicaSet(
+    settings.DATABASE_REPLICA_STICKY_SECONDS,
+    settings.DATABASE_REPLICA_HEALTH_INTERVAL,
+    settings.DATABASE_REPLICA_MAX_LAG,
+)
+
+
+async def get_read_session(session: AsyncSession = Depends(get_session)):  # noqa: ANN201
+    """
+    A session for reads that can tolerate replication lag, on the primary when there
+    is no healthy replica.
+    """
+    replica_session = replica_set.open_session()
+
+    if replica_session is None:
+        yield session
+        return
+
+    async with replica_session:
+        yield replica_session
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from uuid import UUID
+
+import redis.asyncio as redis
+
+from main.core.cache import invalidation_bus
+from main.core.settings import get_settings
+from main.utils.bloom import BloomFilter
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "auth:revoke"
+EPOCHS_KEY = "auth:revoked:epochs"
+TOKENS_KEY = "auth:revoked:tokens"
+
+
+class RevocationList:
+    """
+    Tracks revoked JWTs without touching the database.
+
+    `logout_all` stores a per-user epoch, every token issued before it is revoked.
+    `logout` adds the token's id to a sorted set scored by its expiry. Both live in
+    Redis and are mirrored in every worker, the epochs as a dict and the token ids
+    as a bloom filter, so checking a token is a local lookup. Only a bloom filter
+    hit, which is either a revoked token or a rare false positive, goes to Redis.
+    """
+
+    def __init__(self, capacity: int) -> None:  # noqa: D107
+        self.capacity = capacity
+        self.epochs: dict[str, float] = {}
+        self.revoked = BloomFilter(capacity)
+        self.redis: redis.Redis | None = None
+        self.reload_task: asyncio.Task | None = None
+
+        invalidation_bus.subscribe(INVALIDATION_CHANNEL, self.handle_invalidation)
+
+    async def load(self, redis_client: redis.Redis) -> None:
+        """
+        Rebuild the local copies from Redis, dropping anything that has expired.
+        """
+        self.redis = redis_client
+        now = time.time()
+        oldest_epoch = now - settings.AUTH_TOKEN_EXPIRATION * 60
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(TOKENS_KEY, "-inf", now)
+            pipe.zrange(TOKENS_KEY, 0, -1)
+            pipe.hgetall(EPOCHS_KEY)
+            _, token_ids, epochs = await pipe.execute()
+
+        revoked = BloomFilter(max(self.capacity, len(token_ids) * 2))
+        for token_id in token_ids:
+            revoked.add(token_id.decode())
+
+        expired_epochs = [
+            user_id for user_id, epoch in epochs.items() if float(epoch) < oldest_epoch
+        ]
+        if expired_epochs:
+            await redis_client.hdel(EPOCHS_KEY, *expired_epochs)
+
+        self.revoked = revoked
+        self.epochs = {
+            user_id.decode(): float(epoch)
+            for user_id, epoch in epochs.items()
+            if user_id not in expired_epochs
+        }
+
+    async def revoke_token(self, token_id: UUID, expires_at: float) -> None:  # noqa: D102
+        self.add_token(str(token_id))
+
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.zadd(TOKENS_KEY, {str(token_id): expires_at})
+        except redis.RedisError:
+            logger.exception("Failed to store the revoked token")
+
+        await invalidation_bus.publish(INVALIDATION_CHANNEL, {"token_id": str(token_id)})
+
+    async def revoke_user(self, user_id: UUID) -> None:  # noqa: D102
+        epoch = time.time()
+        self.epochs[str(user_id)] = epoch
+
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.hset(EPOCHS_KEY, str(user_id), epoch)
+        except redis.RedisError:
+            logger.exception("Failed to store the revocation epoch")
+
+        await invalidation_bus.publish(
+            INVALIDATION_CHANNEL, {"user_id": str(user_id), "epoch": epoch}
+        )
+
+    async def is_revoked(self, token_id: str, user_id: str, issued_at: float) -> bool:  # noqa: D102
+        if issued_at <= self.epochs.get(user_id, 0):
+            return True
+
+        if token_id not in self.revoked:
+            return False
+
+        if self.redis is None:
+            return True
+
+        try:
+            return await self.redis.zscore(TOKENS_KEY, token_id) is not None
+        except redis.RedisError:
+            logger.exception("Failed to check a revoked token, treating it as revoked")
+            return True
+
+    def add_token(self, token_id: str) -> None:  # noqa: D102
+        self.revoked.add(token_id)
+
+        if self.revoked.count > self.revoked.capacity and self.redis is not None:
+            self.schedule_reload()
+
+    def schedule_reload(self) -> None:  # noqa: D102
+        if self.reload_task is None or self.reload_task.done():
+            self.reload_task = asyncio.create_task(self.load(self.redis))
+
+    def handle_invalidation(self, message: dict | None) -> None:  # noqa: D102
+        if message is None:
+            if self.redis is not None:
+                self.schedule_reload()
+        elif "token_id" in message:
+            self.add_token(message["token_id"])
+        elif "user_id" in message:
+            self.epochs[message["user_id"]] = max(
+                message["epoch"], self.epochs.get(message["user_id"], 0)
+            )
+
+
+revocation_list = RevocationList(settings.AUTH_REVOCATION_CAPACITY)
@@ -1,17 +1,38 @@
 from datetime import datetime
-from uuid import UUID, uuid4
+from typing import Annotated, Literal
+from uuid import UUID
 
-from sqlmodel import Field, SQLModel
+from sqlmodel import Field, Index, SQLModel, column  # type: ignore
+
+from main.utils.ids import uuid7
 
 
 class Todo(SQLModel, table=True):
-    id: UUID = Field(primary_key=True, default_factory=uuid4)
+    # Keyset pagination walks these, so a page is a range scan of one owner's rows
+    __table_args__ = (
+        Index("ix_todo_owner_id_due_at_id", "owner_id", "due_at", "id"),
+        Index("ix_todo_owner_id_created_at_id", "owner_id", "created_at", "id"),
+        # Overdue and due soon counts are range scans of one owner's open todos, see
+        # main.core.todo_stats
+        Index(
+            "ix_todo_open_owner_id_due_at",
+            "owner_id",
+            "due_at",
+            postgresql_where=column("completed").is_(False),
+            sqlite_where=column("completed").is_(False),
+        ),
+    )
+
+    # Time-ordered, so inserts append to the primary key index
+    id: UUID = Field(primary_key=True, default_factory=uuid7)
     owner_id: UUID = Field(foreign_key="users.id")
     title: str = Field(max_length=128)
     description: str = Field()
     completed: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.now)
     due_at: datetime = Field()
+    # Bumped on every update, ETags are derived from it
+    version: int = Field(default=1)
 
 
 class TodoBase(SQLModel):
@@ -27,3 +48,79 @@ class TodoCreate(TodoBase):
 class TodoRead(TodoBase):
     id: UUID
     completed: bool = Field(default=False)
+
+
+class TodoPage(SQLModel):
+    items: list[TodoRead]
+    next_cursor: str | None = None
+
+
+class TodoBatchCreate(TodoBase):
+    op: Literal["create"]
+
+
+class TodoUpdate(SQLModel):
+    title: str | None = Field(default=None, max_length=128)
+    description: str | None = None
+    due_at: datetime | None = None
+    completed: bool | None = None
+
+
+class TodoBatchUpdate(TodoUpdate):
+    op: Literal["update"]
+    id: UUID
+
+
+class TodoBatchDelete(SQLModel):
+    op: Literal["delete"]
+    id: UUID
+
+
+TodoBatchOperation = Annotated[
+    TodoBatchCreate | TodoBatchUpdate | TodoBatchDelete, Field(discriminator="op")
+]
+
+
+class TodoBatch(SQLModel):
+    operations: list[TodoBatchOperation]
+
+
+class TodoBatchResult(SQLModel):
+    index: int
+    op: str
+    id: UUID
+    status: int
+    detail: str | None = None
+
+
+class TodoBatchResponse(SQLModel):
+    results: list[TodoBatchResult]
+
+
+class TodoStats(SQLModel):
+    total: int
+    completed: int
+    overdue: int
+    due_next_24h: int
+
+
+class TodoExport(TodoRead):
+    created_at: datetime
+
+
+class TodoImport(TodoBase):
+    id: UUID | None = None
+    completed: bool = Field(default=False)
+    created_at: datetime | None = None
+
+
+class TodoImportError(SQLModel):
+    line: int
+    detail: str
+
+
+class TodoImportResult(SQLModel):
+    imported: int
+    failed: int
+    chunks: int
+    errors: list[TodoImportError]
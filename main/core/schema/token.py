@@ -1,16 +1,26 @@
 from datetime import datetime
 from uuid import UUID, uuid4
 
-from sqlmodel import Field, SQLModel  # type: ignore
+from sqlmodel import Field, Index, SQLModel, column  # type: ignore
 
 
 class Tokens(SQLModel, table=True):
+    # The reaper walks these, see main.core.reaper
+    __table_args__ = (
+        Index(
+            "ix_tokens_inactive",
+            "id",
+            postgresql_where=column("active").is_(False),
+            sqlite_where=column("active").is_(False),
+        ),
+    )
+
     id: UUID = Field(primary_key=True, default_factory=uuid4)
-    user_id: UUID = Field(foreign_key="users.id")
+    user_id: UUID = Field(foreign_key="users.id", index=True)
     created_at: datetime = Field(default_factory=datetime.now)
-    expires_at: datetime = Field()
+    expires_at: datetime = Field(index=True)
     active: bool = Field(default=True)
-    token: str = Field()
+    token: str = Field(index=True)
     token_type: str = Field()
 
 
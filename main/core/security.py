@@ -1,18 +1,118 @@
+import asyncio
 import base64
 import hashlib
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, TypeVar
+from uuid import UUID
 
-from passlib.hash import bcrypt
+import bcrypt
+import jwt
 
+from main.core.schema.user import Users
+from main.core.settings import get_settings
+from main.utils.errors import invalid_token, service_unavailable
 
-def verify_password(plain_password: str, hashed_password: str):
-    password = plain_password.encode("utf-8")
-    sha_password = base64.b64encode(hashlib.sha256(password).digest())
+settings = get_settings()
 
-    return bcrypt.verify(sha_password, hashed_password)
+T = TypeVar("T")
 
 
-def hash_password(user_password: str):
-    password = user_password.encode("utf-8")
-    sha_password = base64.b64encode(hashlib.sha256(password).digest())
+class PasswordHasher:
+    """
+    Runs bcrypt in a thread pool so it never blocks the event loop.
 
-    return bcrypt.hash(sha_password)
+    bcrypt releases the GIL while hashing, so `workers` threads give real
+    parallelism. At most `workers + queue_limit` hashes may be in flight, anything
+    beyond that is rejected straight away with a 503 instead of queueing forever.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, rounds: int) -> None:  # noqa: D107
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.rounds = rounds
+        self.in_flight = 0
+        self.executor: ThreadPoolExecutor | None = None
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:  # noqa: ANN401, D102
+        if self.in_flight >= self.workers + self.queue_limit:
+            raise service_unavailable
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="password-hasher"
+            )
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, func, *args
+            )
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self) -> None:  # noqa: D102
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASHING_WORKERS,
+    settings.PASSWORD_HASHING_QUEUE_LIMIT,
+    settings.BCRYPT_ROUNDS,
+)
+
+
+def prehash_password(password: str) -> bytes:
+    """
+    bcrypt only looks at the first 72 bytes, so hash the password down first.
+    """
+    return base64.b64encode(hashlib.sha256(password.encode("utf-8")).digest())
+
+
+def hash_password_sync(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(prehash_password(password), bcrypt.gensalt(rounds)).decode()
+
+
+def verify_password_sync(password: str, hashed_password: str) -> bool:
+    try:
+        return bcrypt.checkpw(prehash_password(password), hashed_password.encode())
+    except ValueError:
+        return False
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(
+        hash_password_sync, password, password_hasher.rounds
+    )
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password_sync, password, hashed_password)
+
+
+def encode_access_token(
+    token_id: UUID, user: Users, issued_at: datetime, expires_at: datetime
+) -> str:
+    payload = {
+        "sub": str(user.id),
+        "jti": str(token_id),
+        "name": user.username,
+        "iat": issued_at.timestamp(),
+        "exp": expires_at.timestamp(),
+    }
+
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def decode_access_token(token: str) -> dict:
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except jwt.PyJWTError:
+        raise invalid_token from None
+
+
+def is_access_token(token: str) -> bool:
+    return token.count(".") == 2
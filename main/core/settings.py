@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import functools
+import importlib.util
+import ipaddress
 import json
 import logging
 import os
@@ -26,16 +29,124 @@ class AppSettings:
     DATABASE_USERNAME: str = "TodoAPI"
     DATABASE_PASSWORD: str | None = None
     DATABASE_NAME: str = "TodoAPI"
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30.0  # This is in seconds
+    DATABASE_POOL_RECYCLE: int = 1800  # This is in seconds, -1 disables it
+    DATABASE_POOL_PRE_PING: bool = False
+    # asyncpg's per-connection prepared statement cache, 0 disables it
+    DATABASE_STATEMENT_CACHE_SIZE: int = 100
+    # Read replicas, as a JSON list of URLs, reads go to the primary when empty
+    DATABASE_REPLICA_URLS: list[str] = []
+    # How long a user's reads stay on the primary after they write
+    DATABASE_REPLICA_STICKY_SECONDS: float = 5.0  # This is in seconds
+    DATABASE_REPLICA_HEALTH_INTERVAL: float = 5.0  # This is in seconds
+    # Replicas further behind than this are taken out of rotation, 0 disables it
+    DATABASE_REPLICA_MAX_LAG: float = 0.0  # This is in seconds
 
     SECRET_KEY: str
     # Can't be changed by user
     ALGORITHM: str = "HS256"
     AUTH_TOKEN_EXPIRATION: int = 3600  # This is in minutes
+    # "opaque" tokens are looked up in the database, "jwt" tokens are verified by signature
+    AUTH_TOKEN_MODE: str = "opaque"
+    # Expected number of revoked, unexpired JWTs, used to size the revocation filter
+    AUTH_REVOCATION_CAPACITY: int = 100000
+
+    BCRYPT_ROUNDS: int = 12
+    # Threads bcrypt runs in, so hashing never blocks the event loop
+    PASSWORD_HASHING_WORKERS: int = min(4, os.cpu_count() or 1)
+    # Hashes allowed to wait for a thread before requests are rejected with a 503
+    PASSWORD_HASHING_QUEUE_LIMIT: int = 32
+
+    TODO_PAGE_SIZE_DEFAULT: int = 50
+    TODO_PAGE_SIZE_MAX: int = 200
+    TODO_BATCH_MAX_SIZE: int = 500
+    # Rows fetched per round trip when exporting, and written per COPY when importing
+    TODO_EXPORT_BATCH_SIZE: int = 500
+    TODO_IMPORT_CHUNK_SIZE: int = 1000
+
+    # Caches todo reads, 0 disables the cache
+    TODO_CACHE_SIZE: int = 10000
+    TODO_CACHE_TTL: int = 30  # This is in seconds
+    # Shares cached todos between workers through Redis
+    TODO_CACHE_REDIS: bool = False
+    # Lookups of single todos arriving within this window are made with one query,
+    # 0 disables it
+    TODO_LOADER_WINDOW: float = 0.002  # This is in seconds
+    TODO_LOADER_MAX_BATCH: int = 100
+    # Recounts the todo stats counters kept on Postgres, correcting any drift
+    TODO_STATS_RECONCILE_ENABLED: bool = True
+    TODO_STATS_RECONCILE_INTERVAL: int = 3600  # This is in seconds
+    TODO_STATS_RECONCILE_BATCH_SIZE: int = 1000
+    TODO_STATS_RECONCILE_BATCH_PAUSE: float = 0.1  # This is in seconds
+    # Used by `python -m main.partition_todos`, which hash partitions todos by owner
+    TODO_PARTITIONS: int = 16
+    TODO_PARTITION_BATCH_SIZE: int = 5000
+    TODO_PARTITION_BATCH_PAUSE: float = 0.05  # This is in seconds
+    # Events buffered per change feed client, one that falls further behind is
+    # caught up from the user's stream, which keeps the last TODO_FEED_RETENTION
+    TODO_FEED_QUEUE_SIZE: int = 100
+    TODO_FEED_RETENTION: int = 1000
+    TODO_FEED_TTL: int = 86400  # This is in seconds
+    TODO_FEED_HEARTBEAT: float = 15.0  # This is in seconds
 
     GLOBAL_RATELIMIT_INTERVAL: int = 60
     GLOBAL_RATELIMIT_LIMIT: int = 100
+    # One of "fixed_window", "sliding_window" or "gcra"
+    GLOBAL_RATELIMIT_ALGORITHM: str = "fixed_window"
+    # Lets each worker admit requests from a local token bucket, syncing with Redis in batches
+    GLOBAL_RATELIMIT_LOCAL_TIER: bool = False
+    GLOBAL_RATELIMIT_SYNC_INTERVAL: float = 1.0  # This is in seconds
+    # Fraction of the limit each worker may admit between syncs
+    GLOBAL_RATELIMIT_MAX_ERROR: float = 0.05
+    # Separate buckets for the routes in main.core.rate_limit_policies, logging in and
+    # registering share the auth bucket, imports, exports and batches the bulk one
+    AUTH_RATELIMIT_INTERVAL: int = 60
+    AUTH_RATELIMIT_LIMIT: int = 10
+    BULK_RATELIMIT_INTERVAL: int = 60
+    BULK_RATELIMIT_LIMIT: int = 30
+    # Proxies, as a JSON list of addresses or CIDRs, whose X-Forwarded-For is trusted
+    RATELIMIT_TRUSTED_PROXIES: list[str] = []
     REDIS_PASSWORD: str | None = None
 
+    # Caches bearer token lookups, 0 disables the cache
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: int = 60  # This is in seconds
+    # Shares cached lookups between workers through Redis
+    AUTH_CACHE_REDIS: bool = False
+
+    # Deletes expired and inactive tokens in the background, see main.core.reaper
+    TOKEN_REAPER_ENABLED: bool = True
+    TOKEN_REAPER_INTERVAL: int = 300  # This is in seconds
+    TOKEN_REAPER_BATCH_SIZE: int = 1000
+    TOKEN_REAPER_BATCH_PAUSE: float = 0.1  # This is in seconds
+    TOKEN_REAPER_MAX_BATCHES: int = 1000
+
+    # Renders every JSON response, either "orjson" or "msgspec", which must be installed
+    JSON_RESPONSE_CLASS: str = "orjson"
+
+    # Prometheus metrics, set PROMETHEUS_MULTIPROC_DIR when running several workers
+    METRICS_ENABLED: bool = True
+    METRICS_PATH: str = "/metrics"
+    # GET /system/pool, unauthenticated and showing the replicas' names and lag, so
+    # only enable it where the API can't be reached from outside
+    POOL_STATS_ENABLED: bool = False
+
+    # Used by the production launcher, see main.serve
+    SERVER_HOST: str = "0.0.0.0"  # noqa: S104
+    SERVER_PORT: int = 88
+    # Worker processes, 0 starts one per CPU
+    SERVER_WORKERS: int = 0
+    # Imports the app once before forking, so workers start faster and share memory
+    SERVER_PRELOAD: bool = False
+    # Restarts a worker after this many requests, plus up to the jitter, 0 never does
+    SERVER_MAX_REQUESTS: int = 0
+    SERVER_MAX_REQUESTS_JITTER: int = 0
+    # How long in-flight requests get to finish on SIGTERM
+    SERVER_GRACEFUL_TIMEOUT: int = 30  # This is in seconds
+    SERVER_KEEPALIVE: int = 5  # This is in seconds
+
     def __init__(self):
         """
         Calls all the functions to verify the settings exist, and are of the proper type and expected value.
@@ -45,14 +156,37 @@ class AppSettings:
         self.set_deprecated_apis()
         self.set_allowed_hosts()
         self.set_logging_level()
-        self.set_database_url()
         self.set_database_port()
         self.set_database_password()
         self.set_secret_key()
         self.set_redis_password()
+        self.set_ratelimit_limit()
+        self.set_ratelimit_algorithm()
+        self.set_ratelimit_local_tier()
+        self.set_ratelimit_trusted_proxies()
+        self.set_auth_cache()
+        self.set_auth_token_mode()
+        self.set_password_hashing()
+        self.set_todo_page_size()
+        self.set_todo_batch_size()
+        self.set_todo_cache()
+        self.set_todo_loader()
+        self.set_todo_stats_reconciler()
+        self.set_todo_partitions()
+        self.set_todo_feed()
+        self.set_database_pool()
+        self.set_database_replicas()
+        self.set_token_reaper()
+        self.set_json_response_class()
+        self.set_metrics()
+        self.set_server()
 
         self.DATABASE_URL = f"postgresql+asyncpg://{self.DATABASE_USERNAME}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
-        self.REDIS_URL = f"redis://:{self.REDIS_PASSWORD}@TodoAPI-Redis:6379/0"
+        # An explicit DATABASE_URL takes precedence over the individual parts
+        self.set_database_url()
+        self.REDIS_URL = os.getenv(
+            "REDIS_URL", f"redis://:{self.REDIS_PASSWORD}@TodoAPI-Redis:6379/0"
+        )
 
     def set_debug(self):
         env_debug = os.getenv("DEBUG")
@@ -169,3 +303,371 @@ class AppSettings:
             )
 
         self.REDIS_PASSWORD = redis_password
+
+    def set_ratelimit_limit(self):
+        self.GLOBAL_RATELIMIT_LIMIT = self._get_int(
+            "GLOBAL_RATELIMIT_LIMIT", self.GLOBAL_RATELIMIT_LIMIT
+        )
+        self.GLOBAL_RATELIMIT_INTERVAL = self._get_int(
+            "GLOBAL_RATELIMIT_INTERVAL", self.GLOBAL_RATELIMIT_INTERVAL
+        )
+
+        if self.GLOBAL_RATELIMIT_LIMIT < 1 or self.GLOBAL_RATELIMIT_INTERVAL < 1:
+            raise ValueError("Rate limit and its interval must be at least 1")
+
+        for bucket in ["AUTH", "BULK"]:
+            limit = self._get_int(
+                f"{bucket}_RATELIMIT_LIMIT", getattr(self, f"{bucket}_RATELIMIT_LIMIT")
+            )
+            interval = self._get_int(
+                f"{bucket}_RATELIMIT_INTERVAL",
+                getattr(self, f"{bucket}_RATELIMIT_INTERVAL"),
+            )
+
+            if limit < 1 or interval < 1:
+                raise ValueError(
+                    f"{bucket.title()} rate limit and its interval must be at least 1"
+                )
+
+            setattr(self, f"{bucket}_RATELIMIT_LIMIT", limit)
+            setattr(self, f"{bucket}_RATELIMIT_INTERVAL", interval)
+
+    def set_ratelimit_algorithm(self):
+        env_algorithm = os.getenv("GLOBAL_RATELIMIT_ALGORITHM")
+
+        if env_algorithm is None:
+            return
+
+        if env_algorithm.lower() not in ["fixed_window", "sliding_window", "gcra"]:
+            raise ValueError(
+                "Rate limit algorithm must be one of fixed_window, sliding_window or gcra"
+            )
+
+        self.GLOBAL_RATELIMIT_ALGORITHM = env_algorithm.lower()
+
+    def set_ratelimit_local_tier(self):
+        self.GLOBAL_RATELIMIT_LOCAL_TIER = self._get_bool(
+            "GLOBAL_RATELIMIT_LOCAL_TIER", self.GLOBAL_RATELIMIT_LOCAL_TIER
+        )
+        self.GLOBAL_RATELIMIT_SYNC_INTERVAL = self._get_float(
+            "GLOBAL_RATELIMIT_SYNC_INTERVAL", self.GLOBAL_RATELIMIT_SYNC_INTERVAL
+        )
+        self.GLOBAL_RATELIMIT_MAX_ERROR = self._get_float(
+            "GLOBAL_RATELIMIT_MAX_ERROR", self.GLOBAL_RATELIMIT_MAX_ERROR
+        )
+
+        if self.GLOBAL_RATELIMIT_SYNC_INTERVAL <= 0:
+            raise ValueError("Rate limit sync interval must be greater than 0")
+
+        if not 0 <= self.GLOBAL_RATELIMIT_MAX_ERROR < 1:
+            raise ValueError("Rate limit max error must be between 0 and 1")
+
+    def set_ratelimit_trusted_proxies(self):
+        trusted_proxies = json.loads(os.getenv("RATELIMIT_TRUSTED_PROXIES", "[]"))
+
+        if not isinstance(trusted_proxies, list) or not all(
+            isinstance(i, str) for i in trusted_proxies
+        ):
+            raise ValueError("Rate limit trusted proxies must be a list of strings")
+
+        for proxy in trusted_proxies:
+            try:
+                ipaddress.ip_network(proxy, strict=False)
+            except ValueError:
+                raise ValueError(
+                    f"Rate limit trusted proxy {proxy!r} is not an address or CIDR"
+                ) from None
+
+        self.RATELIMIT_TRUSTED_PROXIES = trusted_proxies
+
+    def set_auth_cache(self):
+        self.AUTH_CACHE_SIZE = self._get_int("AUTH_CACHE_SIZE", self.AUTH_CACHE_SIZE)
+        self.AUTH_CACHE_TTL = self._get_int("AUTH_CACHE_TTL", self.AUTH_CACHE_TTL)
+        self.AUTH_CACHE_REDIS = self._get_bool("AUTH_CACHE_REDIS", self.AUTH_CACHE_REDIS)
+
+    def set_auth_token_mode(self):
+        env_token_mode = os.getenv("AUTH_TOKEN_MODE")
+
+        if env_token_mode is not None:
+            if env_token_mode.lower() not in ["opaque", "jwt"]:
+                raise ValueError("Auth token mode must be either opaque or jwt")
+
+            self.AUTH_TOKEN_MODE = env_token_mode.lower()
+
+        self.AUTH_REVOCATION_CAPACITY = self._get_int(
+            "AUTH_REVOCATION_CAPACITY", self.AUTH_REVOCATION_CAPACITY
+        )
+
+    def set_password_hashing(self):
+        self.BCRYPT_ROUNDS = self._get_int("BCRYPT_ROUNDS", self.BCRYPT_ROUNDS)
+        self.PASSWORD_HASHING_WORKERS = self._get_int(
+            "PASSWORD_HASHING_WORKERS", self.PASSWORD_HASHING_WORKERS
+        )
+        self.PASSWORD_HASHING_QUEUE_LIMIT = self._get_int(
+            "PASSWORD_HASHING_QUEUE_LIMIT", self.PASSWORD_HASHING_QUEUE_LIMIT
+        )
+
+        if not 4 <= self.BCRYPT_ROUNDS <= 31:
+            raise ValueError("Bcrypt rounds must be between 4 and 31")
+
+        if self.PASSWORD_HASHING_WORKERS < 1:
+            raise ValueError("Password hashing workers must be at least 1")
+
+    def set_todo_page_size(self):
+        self.TODO_PAGE_SIZE_DEFAULT = self._get_int(
+            "TODO_PAGE_SIZE_DEFAULT", self.TODO_PAGE_SIZE_DEFAULT
+        )
+        self.TODO_PAGE_SIZE_MAX = self._get_int(
+            "TODO_PAGE_SIZE_MAX", self.TODO_PAGE_SIZE_MAX
+        )
+
+        if not 1 <= self.TODO_PAGE_SIZE_DEFAULT <= self.TODO_PAGE_SIZE_MAX:
+            raise ValueError(
+                "Default todo page size must be between 1 and the max page size"
+            )
+
+    def set_todo_batch_size(self):
+        self.TODO_BATCH_MAX_SIZE = self._get_int(
+            "TODO_BATCH_MAX_SIZE", self.TODO_BATCH_MAX_SIZE
+        )
+        self.TODO_EXPORT_BATCH_SIZE = self._get_int(
+            "TODO_EXPORT_BATCH_SIZE", self.TODO_EXPORT_BATCH_SIZE
+        )
+        self.TODO_IMPORT_CHUNK_SIZE = self._get_int(
+            "TODO_IMPORT_CHUNK_SIZE", self.TODO_IMPORT_CHUNK_SIZE
+        )
+
+    def set_todo_cache(self):
+        self.TODO_CACHE_SIZE = self._get_int("TODO_CACHE_SIZE", self.TODO_CACHE_SIZE)
+        self.TODO_CACHE_TTL = self._get_int("TODO_CACHE_TTL", self.TODO_CACHE_TTL)
+        self.TODO_CACHE_REDIS = self._get_bool("TODO_CACHE_REDIS", self.TODO_CACHE_REDIS)
+
+    def set_todo_loader(self):
+        self.TODO_LOADER_WINDOW = self._get_float(
+            "TODO_LOADER_WINDOW", self.TODO_LOADER_WINDOW
+        )
+        self.TODO_LOADER_MAX_BATCH = self._get_int(
+            "TODO_LOADER_MAX_BATCH", self.TODO_LOADER_MAX_BATCH
+        )
+
+        if self.TODO_LOADER_WINDOW < 0:
+            raise ValueError("Todo loader window must be 0 or more")
+
+        if self.TODO_LOADER_MAX_BATCH < 1:
+            raise ValueError("Todo loader max batch must be at least 1")
+
+    def set_todo_stats_reconciler(self):
+        self.TODO_STATS_RECONCILE_ENABLED = self._get_bool(
+            "TODO_STATS_RECONCILE_ENABLED", self.TODO_STATS_RECONCILE_ENABLED
+        )
+        self.TODO_STATS_RECONCILE_INTERVAL = self._get_int(
+            "TODO_STATS_RECONCILE_INTERVAL", self.TODO_STATS_RECONCILE_INTERVAL
+        )
+        self.TODO_STATS_RECONCILE_BATCH_SIZE = self._get_int(
+            "TODO_STATS_RECONCILE_BATCH_SIZE", self.TODO_STATS_RECONCILE_BATCH_SIZE
+        )
+        self.TODO_STATS_RECONCILE_BATCH_PAUSE = self._get_float(
+            "TODO_STATS_RECONCILE_BATCH_PAUSE", self.TODO_STATS_RECONCILE_BATCH_PAUSE
+        )
+
+        if (
+            self.TODO_STATS_RECONCILE_INTERVAL < 1
+            or self.TODO_STATS_RECONCILE_BATCH_SIZE < 1
+        ):
+            raise ValueError(
+                "Todo stats reconcile interval and batch size must be at least 1"
+            )
+
+    def set_todo_partitions(self):
+        self.TODO_PARTITIONS = self._get_int("TODO_PARTITIONS", self.TODO_PARTITIONS)
+        self.TODO_PARTITION_BATCH_SIZE = self._get_int(
+            "TODO_PARTITION_BATCH_SIZE", self.TODO_PARTITION_BATCH_SIZE
+        )
+        self.TODO_PARTITION_BATCH_PAUSE = self._get_float(
+            "TODO_PARTITION_BATCH_PAUSE", self.TODO_PARTITION_BATCH_PAUSE
+        )
+
+        if self.TODO_PARTITIONS < 1 or self.TODO_PARTITION_BATCH_SIZE < 1:
+            raise ValueError("Todo partitions and partition batch size must be at least 1")
+
+    def set_todo_feed(self):
+        self.TODO_FEED_QUEUE_SIZE = self._get_int(
+            "TODO_FEED_QUEUE_SIZE", self.TODO_FEED_QUEUE_SIZE
+        )
+        self.TODO_FEED_RETENTION = self._get_int(
+            "TODO_FEED_RETENTION", self.TODO_FEED_RETENTION
+        )
+        self.TODO_FEED_TTL = self._get_int("TODO_FEED_TTL", self.TODO_FEED_TTL)
+        self.TODO_FEED_HEARTBEAT = self._get_float(
+            "TODO_FEED_HEARTBEAT", self.TODO_FEED_HEARTBEAT
+        )
+
+        if self.TODO_FEED_QUEUE_SIZE < 1 or self.TODO_FEED_HEARTBEAT <= 0:
+            raise ValueError("Todo feed queue size and heartbeat must be positive")
+
+    def set_database_pool(self):
+        self.DATABASE_POOL_SIZE = self._get_int(
+            "DATABASE_POOL_SIZE", self.DATABASE_POOL_SIZE
+        )
+        self.DATABASE_MAX_OVERFLOW = self._get_int(
+            "DATABASE_MAX_OVERFLOW", self.DATABASE_MAX_OVERFLOW
+        )
+        self.DATABASE_POOL_TIMEOUT = self._get_float(
+            "DATABASE_POOL_TIMEOUT", self.DATABASE_POOL_TIMEOUT
+        )
+        self.DATABASE_POOL_RECYCLE = int(
+            self._get_float("DATABASE_POOL_RECYCLE", self.DATABASE_POOL_RECYCLE)
+        )
+        self.DATABASE_POOL_PRE_PING = self._get_bool(
+            "DATABASE_POOL_PRE_PING", self.DATABASE_POOL_PRE_PING
+        )
+        self.DATABASE_STATEMENT_CACHE_SIZE = self._get_int(
+            "DATABASE_STATEMENT_CACHE_SIZE", self.DATABASE_STATEMENT_CACHE_SIZE
+        )
+
+        # -1 lifts the overflow limit
+        if self.DATABASE_POOL_SIZE < 1 or self.DATABASE_MAX_OVERFLOW < -1:
+            raise ValueError(
+                "Database pool size must be at least 1 and its max overflow -1 or more"
+            )
+        if self.DATABASE_STATEMENT_CACHE_SIZE < 0:
+            raise ValueError("Database statement cache size must be 0 or more")
+
+    def set_database_replicas(self):
+        replica_urls = json.loads(os.getenv("DATABASE_REPLICA_URLS", "[]"))
+
+        if not isinstance(replica_urls, list) or not all(
+            isinstance(i, str) for i in replica_urls
+        ):
+            raise ValueError("Database replica URLs must be a list of strings")
+
+        self.DATABASE_REPLICA_URLS = replica_urls
+        self.DATABASE_REPLICA_STICKY_SECONDS = self._get_float(
+            "DATABASE_REPLICA_STICKY_SECONDS", self.DATABASE_REPLICA_STICKY_SECONDS
+        )
+        self.DATABASE_REPLICA_HEALTH_INTERVAL = self._get_float(
+            "DATABASE_REPLICA_HEALTH_INTERVAL", self.DATABASE_REPLICA_HEALTH_INTERVAL
+        )
+        self.DATABASE_REPLICA_MAX_LAG = self._get_float(
+            "DATABASE_REPLICA_MAX_LAG", self.DATABASE_REPLICA_MAX_LAG
+        )
+
+        if self.DATABASE_REPLICA_HEALTH_INTERVAL <= 0:
+            raise ValueError("Database replica health interval must be positive")
+
+    def set_token_reaper(self):
+        self.TOKEN_REAPER_ENABLED = self._get_bool(
+            "TOKEN_REAPER_ENABLED", self.TOKEN_REAPER_ENABLED
+        )
+        self.TOKEN_REAPER_INTERVAL = self._get_int(
+            "TOKEN_REAPER_INTERVAL", self.TOKEN_REAPER_INTERVAL
+        )
+        self.TOKEN_REAPER_BATCH_SIZE = self._get_int(
+            "TOKEN_REAPER_BATCH_SIZE", self.TOKEN_REAPER_BATCH_SIZE
+        )
+        self.TOKEN_REAPER_BATCH_PAUSE = self._get_float(
+            "TOKEN_REAPER_BATCH_PAUSE", self.TOKEN_REAPER_BATCH_PAUSE
+        )
+        self.TOKEN_REAPER_MAX_BATCHES = self._get_int(
+            "TOKEN_REAPER_MAX_BATCHES", self.TOKEN_REAPER_MAX_BATCHES
+        )
+
+        if self.TOKEN_REAPER_INTERVAL < 1 or self.TOKEN_REAPER_BATCH_SIZE < 1:
+            raise ValueError("Token reaper interval and batch size must be at least 1")
+
+    def set_json_response_class(self):
+        env_response_class = os.getenv("JSON_RESPONSE_CLASS")
+
+        if env_response_class is None:
+            return
+
+        if env_response_class.lower() not in ["orjson", "msgspec"]:
+            raise ValueError("JSON response class must be either orjson or msgspec")
+
+        # Optional, and only imported once rendering, so check it's there up front
+        is_missing = importlib.util.find_spec("msgspec") is None
+        if env_response_class.lower() == "msgspec" and is_missing:
+            raise ValueError("msgspec must be installed to use it as the JSON response class")
+
+        self.JSON_RESPONSE_CLASS = env_response_class.lower()
+
+    def set_metrics(self):
+        self.METRICS_ENABLED = self._get_bool("METRICS_ENABLED", self.METRICS_ENABLED)
+        self.POOL_STATS_ENABLED = self._get_bool(
+            "POOL_STATS_ENABLED", self.POOL_STATS_ENABLED
+        )
+        env_metrics_path = os.getenv("METRICS_PATH")
+
+        if env_metrics_path is None:
+            return
+
+        if not env_metrics_path.startswith("/"):
+            raise ValueError("Metrics path must start with a /")
+
+        self.METRICS_PATH = env_metrics_path
+
+    def set_server(self):
+        self.SERVER_HOST = os.getenv("SERVER_HOST", self.SERVER_HOST)
+        self.SERVER_PORT = self._get_int("SERVER_PORT", self.SERVER_PORT)
+        self.SERVER_WORKERS = self._get_int("SERVER_WORKERS", self.SERVER_WORKERS)
+        self.SERVER_PRELOAD = self._get_bool("SERVER_PRELOAD", self.SERVER_PRELOAD)
+        self.SERVER_MAX_REQUESTS = self._get_int(
+            "SERVER_MAX_REQUESTS", self.SERVER_MAX_REQUESTS
+        )
+        self.SERVER_MAX_REQUESTS_JITTER = self._get_int(
+            "SERVER_MAX_REQUESTS_JITTER", self.SERVER_MAX_REQUESTS_JITTER
+        )
+        self.SERVER_GRACEFUL_TIMEOUT = self._get_int(
+            "SERVER_GRACEFUL_TIMEOUT", self.SERVER_GRACEFUL_TIMEOUT
+        )
+        self.SERVER_KEEPALIVE = self._get_int("SERVER_KEEPALIVE", self.SERVER_KEEPALIVE)
+
+        if self.SERVER_WORKERS < 0:
+            raise ValueError("Server workers must be 0 or more")
+
+        if self.SERVER_MAX_REQUESTS < 0 or self.SERVER_MAX_REQUESTS_JITTER < 0:
+            raise ValueError("Server max requests and its jitter must be 0 or more")
+
+        if self.SERVER_GRACEFUL_TIMEOUT < 1:
+            raise ValueError("Server graceful timeout must be at least 1")
+
+    @staticmethod
+    def _get_bool(name: str, default: bool) -> bool:
+        value = os.getenv(name)
+
+        if value is None or value.lower() not in ["true", "false"]:
+            return default
+
+        return value.lower() == "true"
+
+    @staticmethod
+    def _get_int(name: str, default: int) -> int:
+        value = os.getenv(name)
+
+        if value is None:
+            return default
+
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number") from None
+
+    @staticmethod
+    def _get_float(name: str, default: float) -> float:
+        value = os.getenv(name)
+
+        if value is None:
+            return default
+
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number") from None
+
+
+@functools.cache
+def get_settings() -> AppSettings:
+    """
+    The process-wide settings, the environment is only parsed the first time this is called.
+    """  # noqa: E501
+    return AppSettings()
@@ -0,0 +1,99 @@
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlmodel import select
+
+from main.core.cache import TieredCache
+from main.core.database import any_of
+from main.core.loader import Loader
+from main.core.schema.todo import Todo
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+todo_cache = TieredCache(
+    "todo", settings.TODO_CACHE_SIZE, settings.TODO_CACHE_TTL, settings.TODO_CACHE_REDIS
+)
+
+
+async def fetch_todos(engine: AsyncEngine, todo_ids: list[UUID]) -> dict[UUID, Todo]:
+    """
+    Read todos by id with one query, caching every one found.
+    """
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        result = await session.scalars(
+            select(Todo).where(any_of(Todo.id, todo_ids, engine.dialect.name))
+        )
+        todos = {todo.id: todo for todo in result}
+
+    await todo_cache.set_many(
+        {str(todo_id): todo.model_dump(mode="json") for todo_id, todo in todos.items()}
+    )
+
+    return todos
+
+
+todo_loader = Loader(
+    fetch_todos, settings.TODO_LOADER_WINDOW, settings.TODO_LOADER_MAX_BATCH
+)
+
+
+async def get_todo(session: AsyncSession, todo_id: UUID) -> Todo | None:
+    """
+    Read a todo through the cache, only missing rows go to the database.
+
+    Concurrent misses on the same database are read together, see `todo_loader`.
+    """
+    cached = await todo_cache.get(str(todo_id))
+
+    if cached is not None:
+        return Todo.model_validate(cached)
+
+    if todo_loader.enabled:
+        return await todo_loader.load(session.bind, todo_id)
+
+    todo = await session.get(Todo, todo_id)
+
+    if todo is not None:
+        await todo_cache.set(str(todo_id), todo.model_dump(mode="json"))
+
+    return todo
+
+
+async def get_todos(session: AsyncSession, owner_id: UUID, todo_ids: list[UUID]) -> list[Todo]:  # noqa: E501
+    """
+    Read many of a user's todos through the cache, with one query for the rest.
+
+    Todos are returned in the order asked for, missing ones and other users' are
+    left out.
+    """
+    todo_ids = list(dict.fromkeys(todo_ids))
+
+    cached = await todo_cache.get_many([str(todo_id) for todo_id in todo_ids])
+    todos = {UUID(key): Todo.model_validate(value) for key, value in cached.items()}
+
+    missing = [todo_id for todo_id in todo_ids if todo_id not in todos]
+    if missing:
+        result = await session.scalars(
+            select(Todo).where(
+                any_of(Todo.id, missing, session.bind.dialect.name),
+                Todo.owner_id == owner_id,
+            )
+        )
+        loaded = {todo.id: todo for todo in result}
+        todos.update(loaded)
+
+        await todo_cache.set_many(
+            {str(todo_id): todo.model_dump(mode="json") for todo_id, todo in loaded.items()}
+        )
+
+    return [
+        todos[todo_id]
+        for todo_id in todo_ids
+        if todo_id in todos and todos[todo_id].owner_id == owner_id
+    ]
+
+
+async def invalidate_todos(*todo_ids: UUID) -> None:  # noqa: D103
+    await todo_cache.delete(*(str(todo_id) for todo_id in todo_ids))
@@ -0,0 +1,325 @@
+"""
+Optional hash partitioning of the todo table by `owner_id`, Postgres only.
+
+Every query the API makes for a user's todos is scoped to its owner, so it only
+reads that owner's partition, and each partition's indexes are small enough to
+stay cached and its vacuums short. Lookups by id alone, like GET /todos/{id},
+probe every partition's primary key instead.
+
+The partition key has to be part of the primary key, so the primary key alone
+only keeps ids unique per owner once the table is partitioned. Ids are kept
+unique across owners by `todo_ids`, which holds every id and is kept up to date by
+triggers on the partitioned table, so an insert reusing an id fails on its primary
+key. Ids are generated as UUIDv7s, so only imported ones can collide.
+
+The table is converted online by `python -m main.partition_todos`, in phases:
+
+1. `prepare` creates the partitioned copy, `todo_partitioned`, with `todo_ids`,
+   and a trigger mirroring every write to the todo table into it.
+2. `backfill` copies existing rows in batches of `batch_size` by id, each in its
+   own short transaction. A batch share-locks the rows it copies, so a row can't
+   be updated or deleted between being read and being copied. Once every batch
+   is done, the copy is marked as backfilled.
+3. `cutover` swaps the tables in one transaction, holding an exclusive lock on
+   the todo table only for the renames. It refuses to unless the copy is marked
+   as backfilled and holds as many rows as the todo table.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+from main.core.schema.todo import Todo
+from main.core.todo_stats import stats_triggers
+
+logger = logging.getLogger(__name__)
+
+NEW_TABLE = "todo_partitioned"
+
+IDS_TABLE = "todo_ids"
+
+# The copy's table comment once the backfill has finished
+BACKFILLED = "backfilled"
+
+# Every column the app writes, the search vector is generated from them
+COLUMNS = ", ".join(column.name for column in Todo.__table__.columns)
+
+# name: definition, must match the todo table's, see main.core.migrations. They're
+# created under temporary names and renamed when the tables are swapped
+INDEXES = {
+    "ix_todo_owner_id_due_at_id": "(owner_id, due_at, id)",
+    "ix_todo_owner_id_created_at_id": "(owner_id, created_at, id)",
+    "ix_todo_open_owner_id_due_at": "(owner_id, due_at) WHERE completed IS false",
+    "ix_todo_search_vector": "USING GIN (search_vector)",
+}
+
+
+def temporary_name(name: str) -> str:  # noqa: D103
+    return f"{name}_partitioned"
+
+
+@dataclass
+class BackfillResult:  # noqa: D101
+    copied: int = 0
+    batches: int = 0
+
+
+async def table_exists(connection: AsyncConnection, name: str) -> bool:  # noqa: D103
+    return await connection.scalar(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+    )
+
+
+async def is_partitioned(connection: AsyncConnection) -> bool:  # noqa: D103
+    if connection.dialect.name != "postgresql":
+        return False
+
+    return await connection.scalar(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass('todo'))"
+        )
+    )
+
+
+async def prepare(connection: AsyncConnection, partitions: int) -> None:
+    """
+    Create the partitioned copy with its partitions and indexes, and start
+    mirroring writes into it.
+    """
+    if connection.dialect.name != "postgresql":
+        raise RuntimeError("Partitioning is only supported on Postgres")
+
+    if await is_partitioned(connection):
+        raise RuntimeError("The todo table is already partitioned")
+
+    if await table_exists(connection, NEW_TABLE):
+        logger.info("%s already exists, resuming", NEW_TABLE)
+        return
+
+    await connection.execute(
+        text(
+            f"CREATE TABLE {NEW_TABLE} ("
+            "LIKE todo INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED, "
+            "PRIMARY KEY (id, owner_id), "
+            "FOREIGN KEY (owner_id) REFERENCES users (id)"
+            ") PARTITION BY HASH (owner_id)"
+        )
+    )
+
+    for remainder in range(partitions):
+        await connection.execute(
+            text(
+                f"CREATE TABLE todo_p{remainder} PARTITION OF {NEW_TABLE} "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            )
+        )
+
+    # Indexes created on the parent are created on every partition. Created before
+    # the backfill, as building them afterwards would need a lock at cutover
+    for name, definition in INDEXES.items():
+        await connection.execute(
+            text(f"CREATE INDEX {temporary_name(name)} ON {NEW_TABLE} {definition}")
+        )
+
+    await create_ids_table(connection)
+
+    updates = ", ".join(
+        f"{column.name} = excluded.{column.name}"
+        for column in Todo.__table__.columns
+        if not column.primary_key
+    )
+    values = ", ".join(f"NEW.{column.name}" for column in Todo.__table__.columns)
+
+    await connection.execute(
+        text(
+            f"""
+            CREATE OR REPLACE FUNCTION todo_partition_mirror() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM {NEW_TABLE}
+                    WHERE id = OLD.id AND owner_id = OLD.owner_id;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO {NEW_TABLE} ({COLUMNS}) VALUES ({values})
+                    ON CONFLICT (id, owner_id) DO UPDATE SET {updates};
+                END IF;
+                RETURN NULL;
+            END
+            $$
+            """
+        )
+    )
+    await connection.execute(
+        text(
+            "CREATE TRIGGER todo_partition_mirror AFTER INSERT OR UPDATE OR DELETE "
+            "ON todo FOR EACH ROW EXECUTE FUNCTION todo_partition_mirror()"
+        )
+    )
+
+
+async def create_ids_table(connection: AsyncConnection) -> None:
+    """
+    Create `todo_ids` and the triggers filling it from the partitioned copy, so the
+    mirror and the backfill fill it as they copy rows, and it's complete at cutover.
+    """
+    await connection.execute(text(f"CREATE TABLE {IDS_TABLE} (id uuid PRIMARY KEY)"))
+
+    # Statement level, so a batch or an import inserts its ids in one statement. Ids
+    # are never updated, so only inserts and deletes are followed
+    await connection.execute(
+        text(
+            f"""
+            CREATE OR REPLACE FUNCTION todo_ids_apply() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO {IDS_TABLE} (id) SELECT id FROM new_rows;
+                ELSE
+                    DELETE FROM {IDS_TABLE} WHERE id IN (SELECT id FROM old_rows);
+                END IF;
+                RETURN NULL;
+            END
+            $$
+            """
+        )
+    )
+
+    for event, tables in [
+        ("INSERT", "NEW TABLE AS new_rows"),
+        ("DELETE", "OLD TABLE AS old_rows"),
+    ]:
+        await connection.execute(
+            text(
+                f"CREATE TRIGGER todo_ids_{event.lower()} AFTER {event} ON {NEW_TABLE} "
+                f"REFERENCING {tables} FOR EACH STATEMENT "
+                "EXECUTE FUNCTION todo_ids_apply()"
+            )
+        )
+
+
+async def backfill_batch(connection: AsyncConnection, after: UUID, batch_size: int) -> tuple[UUID | None, int]:  # noqa: E501
+    """
+    Copy the next `batch_size` rows by id, returning the last id copied and how
+    many rows were.
+
+    Rows the mirror has already copied are left alone, as they're at least as new.
+    """
+    result = await connection.execute(
+        text(
+            f"WITH batch AS ("
+            f"SELECT {COLUMNS} FROM todo WHERE id > :after "
+            f"ORDER BY id LIMIT :batch_size FOR SHARE"
+            f"), copied AS ("
+            f"INSERT INTO {NEW_TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM batch "
+            f"ON CONFLICT (id, owner_id) DO NOTHING"
+            f") "
+            f"SELECT (SELECT id FROM batch ORDER BY id DESC LIMIT 1) AS last_id, "
+            f"(SELECT count(*) FROM batch) AS copied"
+        ),
+        {"after": after, "batch_size": batch_size},
+    )
+    row = result.one()
+
+    return row.last_id, row.copied
+
+
+async def backfill(engine: AsyncEngine, batch_size: int, batch_pause: float) -> BackfillResult:  # noqa: E501
+    """
+    Copy every row that existed before the mirror trigger, walking the table by id.
+    """
+    result = BackfillResult()
+    after = UUID(int=0)
+
+    while True:
+        async with engine.begin() as connection:
+            last_id, count = await backfill_batch(connection, after, batch_size)
+
+        result.copied += count
+        result.batches += 1
+
+        if result.batches % 100 == 0:
+            logger.info("Backfilled %d todos, up to %s", result.copied, last_id)
+
+        if count < batch_size:
+            break
+
+        after = last_id
+        await asyncio.sleep(batch_pause)
+
+    async with engine.begin() as connection:
+        await connection.execute(text(f"COMMENT ON TABLE {NEW_TABLE} IS '{BACKFILLED}'"))
+
+    logger.info("Backfilled %d todos in %d batches", result.copied, result.batches)
+
+    return result
+
+
+async def is_backfilled(connection: AsyncConnection) -> bool:  # noqa: D103
+    comment = await connection.scalar(
+        text("SELECT obj_description(to_regclass(:name), 'pg_class')"),
+        {"name": NEW_TABLE},
+    )
+    return comment == BACKFILLED
+
+
+async def row_counts(connection: AsyncConnection) -> tuple[int, int]:
+    """
+    Rows in the todo table and in its partitioned copy, these only differ by
+    writes in flight once the backfill is done.
+    """
+    old = await connection.scalar(text("SELECT count(*) FROM todo"))
+    new = await connection.scalar(text(f"SELECT count(*) FROM {NEW_TABLE}"))
+
+    return old, new
+
+
+async def cutover(connection: AsyncConnection) -> None:
+    """
+    Replace the todo table with its partitioned copy, which must be backfilled.
+
+    The old table is dropped, along with its triggers and indexes, so this raises
+    rather than lose any row the copy is missing.
+    """
+    if not await table_exists(connection, NEW_TABLE):
+        raise RuntimeError(f"{NEW_TABLE} doesn't exist, run prepare and backfill first")
+
+    if not await is_backfilled(connection):
+        raise RuntimeError(f"{NEW_TABLE} isn't fully backfilled, run backfill first")
+
+    # Blocks until requests using the table finish, then blocks new ones until the
+    # renames commit. The mirror keeps the copy complete up to the lock
+    await connection.execute(text("LOCK TABLE todo IN ACCESS EXCLUSIVE MODE"))
+
+    # Nothing can write now, so the counts only differ if rows are missing
+    old, new = await row_counts(connection)
+    if old != new:
+        raise RuntimeError(
+            f"{NEW_TABLE} has {new} of {old} todos, run backfill again first"
+        )
+
+    await connection.execute(text("DROP TABLE todo"))
+    await connection.execute(text("DROP FUNCTION IF EXISTS todo_partition_mirror()"))
+
+    await connection.execute(text(f"ALTER TABLE {NEW_TABLE} RENAME TO todo"))
+    await connection.execute(text("COMMENT ON TABLE todo IS NULL"))
+    await connection.execute(
+        text(f"ALTER TABLE todo RENAME CONSTRAINT {NEW_TABLE}_pkey TO todo_pkey")
+    )
+    await connection.execute(
+        text(
+            f"ALTER TABLE todo RENAME CONSTRAINT {NEW_TABLE}_owner_id_fkey "
+            "TO todo_owner_id_fkey"
+        )
+    )
+    for name in INDEXES:
+        await connection.execute(text(f"ALTER INDEX {temporary_name(name)} RENAME TO {name}"))  # noqa: E501
+
+    for statement in stats_triggers("todo"):
+        await connection.execute(text(statement))
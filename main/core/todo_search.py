@@ -0,0 +1,67 @@
+from uuid import UUID
+
+from sqlalchemy import Double, and_, case, cast, false, func, literal_column, or_
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import select
+from sqlmodel.sql.expression import SelectOfScalar
+
+from main.core.schema.todo import Todo
+
+# Must match the configuration the search_vector column is generated with, see
+# migration 5
+SEARCH_CONFIG = "english"
+
+# Only exists on Postgres, so it isn't part of the model
+search_vector = literal_column("todo.search_vector")
+
+
+def escape_like(term: str) -> str:  # noqa: D103
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def postgres_search(query: str) -> tuple[ColumnElement[bool], ColumnElement[float]]:
+    """
+    Match `query` against the GIN indexed search vector, in web search syntax, so
+    "quoted phrases", `or` and `-excluded` words work.
+    """
+    ts_query = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), query)
+    rank = cast(func.ts_rank_cd(search_vector, ts_query), Double)
+
+    return search_vector.op("@@")(ts_query), rank
+
+
+def fallback_search(query: str) -> tuple[ColumnElement[bool], ColumnElement[float]]:
+    """
+    Every word must appear in the title or description, matches in the title rank
+    higher. This scans every one of the owner's todos.
+    """
+    conditions, title_matches = [], []
+
+    for word in query.split():
+        pattern = f"%{escape_like(word)}%"
+        in_title = Todo.title.ilike(pattern, escape="\\")
+        conditions.append(or_(in_title, Todo.description.ilike(pattern, escape="\\")))
+        title_matches.append(case((in_title, 1.0), else_=0.0))
+
+    if not conditions:
+        return false(), cast(0.0, Double)
+
+    rank = cast(sum(title_matches, start=0.0) + 1.0, Double)
+
+    return and_(*conditions), rank
+
+
+def search_todos(
+    dialect: str, owner_id: UUID, query: str
+) -> tuple[SelectOfScalar, ColumnElement[float]]:
+    """
+    Select the owner's todos matching `query` with their rank, along with the rank
+    expression to order and paginate by.
+    """
+    if dialect == "postgresql":
+        matches, rank = postgres_search(query)
+    else:
+        matches, rank = fallback_search(query)
+
+    return select(Todo, rank.label("rank")).where(Todo.owner_id == owner_id, matches), rank
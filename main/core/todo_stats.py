@@ -0,0 +1,221 @@
+"""
+Per-user todo counters for the dashboard, see GET /todos/stats.
+
+On Postgres, totals are kept in `todo_stats` by triggers on the todo table, see
+migration 6, so every write path, batches and imports included, keeps them up to
+date and reading them is a primary key lookup. Overdue and due soon counts change
+with the clock rather than with writes, so they are counted per request instead,
+as a range scan of the owner's open todos on the partial `due_at` index. Anywhere
+else the totals are counted too.
+
+`StatsReconciler` periodically recounts the totals, correcting any drift.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from uuid import UUID
+
+import redis.asyncio as redis
+from sqlalchemy import BigInteger, Column, MetaData, Table, func, text
+from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlmodel import select
+
+from main.core.database import any_of
+from main.core.leader import LeaderElectedJob
+from main.core.schema.todo import Todo
+from main.core.schema.user import Users
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "reconciler:todo_stats:leader"
+
+DUE_SOON = timedelta(hours=24)
+
+# Only exists on Postgres, so it isn't on SQLModel.metadata
+todo_stats = Table(
+    "todo_stats",
+    MetaData(),
+    Column("owner_id", PostgresUUID(as_uuid=True), primary_key=True),
+    Column("total", BigInteger, nullable=False),
+    Column("completed", BigInteger, nullable=False),
+)
+
+
+def stats_triggers(table: str) -> list[str]:
+    """
+    (Re)create the triggers keeping the counters, see migration 6 for the function
+    they run.
+    """
+    statements = []
+
+    for event, tables in [
+        ("INSERT", "NEW TABLE AS new_rows"),
+        ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("DELETE", "OLD TABLE AS old_rows"),
+    ]:
+        name = f"todo_stats_{event.lower()}"
+        statements += [
+            f"DROP TRIGGER IF EXISTS {name} ON {table}",
+            f"CREATE TRIGGER {name} AFTER {event} ON {table} "
+            f"REFERENCING {tables} FOR EACH STATEMENT "
+            "EXECUTE FUNCTION todo_stats_apply()",
+        ]
+
+    return statements
+
+
+async def get_stats(session: AsyncSession, owner_id: UUID, now: datetime) -> dict[str, int]:
+    """
+    A user's todo counts, in one query.
+    """
+    if session.bind.dialect.name == "postgresql":
+        owner_stats = todo_stats.c.owner_id == owner_id
+        total = func.coalesce(
+            select(todo_stats.c.total).where(owner_stats).scalar_subquery(), 0
+        )
+        completed = func.coalesce(
+            select(todo_stats.c.completed).where(owner_stats).scalar_subquery(), 0
+        )
+    else:
+        owner_todos = Todo.owner_id == owner_id
+        total = select(func.count()).where(owner_todos).scalar_subquery()
+        completed = (
+            select(func.count())
+            .where(owner_todos, Todo.completed.is_(True))
+            .scalar_subquery()
+        )
+
+    # Matches the partial index's predicate, so only open todos due before the end
+    # of the window are read
+    result = await session.execute(
+        select(
+            total.label("total"),
+            completed.label("completed"),
+            func.count().filter(Todo.due_at < now).label("overdue"),
+            func.count().filter(Todo.due_at >= now).label("due_next_24h"),
+        ).where(
+            Todo.owner_id == owner_id,
+            Todo.completed.is_(False),
+            Todo.due_at < now + DUE_SOON,
+        )
+    )
+
+    return dict(result.one()._mapping)
+
+
+@dataclass
+class ReconcileResult:  # noqa: D101
+    owners: int = 0
+    corrected: int = 0
+    batches: int = 0
+
+
+class StatsReconciler(LeaderElectedJob):
+    """
+    Recounts every user's totals, correcting counters that have drifted, e.g.
+    through writes made with the triggers disabled.
+
+    Users are walked in batches of `batch_size`, each in its own short transaction
+    followed by a `batch_pause` second pause. A batch locks its users' counters
+    before counting, so writes racing the recount wait for it rather than being
+    overwritten by it. Only counters that are off are written.
+
+    Run in-process by every worker like the token reaper, at most once per interval
+    across the deployment, see `LeaderElectedJob`.
+    """
+
+    leader_key = LEADER_KEY
+    name = "stats reconciler"
+
+    def __init__(self, interval: int, batch_size: int, batch_pause: float) -> None:  # noqa: D107
+        super().__init__(interval)
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+
+    async def reconcile_batch(self, engine: AsyncEngine, owner_ids: list[UUID]) -> int:  # noqa: D102
+        async with engine.begin() as connection:
+            await connection.execute(
+                select(todo_stats.c.owner_id)
+                .where(any_of(todo_stats.c.owner_id, owner_ids, "postgresql"))
+                .with_for_update()
+            )
+
+            # A new statement, so it sees every write committed before the lock
+            result = await connection.execute(
+                text(
+                    "INSERT INTO todo_stats (owner_id, total, completed) "
+                    "SELECT users.id, count(todo.id), "
+                    "count(todo.id) FILTER (WHERE todo.completed) "
+                    "FROM users LEFT JOIN todo ON todo.owner_id = users.id "
+                    "WHERE users.id = ANY(:owner_ids) "
+                    "GROUP BY users.id "
+                    "ON CONFLICT (owner_id) DO UPDATE SET "
+                    "total = excluded.total, completed = excluded.completed "
+                    "WHERE (todo_stats.total, todo_stats.completed) "
+                    "IS DISTINCT FROM (excluded.total, excluded.completed) "
+                    "RETURNING owner_id"
+                ),
+                {"owner_ids": owner_ids},
+            )
+
+        return len(result.all())
+
+    async def run_once(self, engine: AsyncEngine) -> ReconcileResult:
+        """
+        Walk every user once, keyset paginated by id.
+        """
+        result = ReconcileResult()
+        last_id = None
+
+        while True:
+            query = select(Users.id).order_by(Users.id).limit(self.batch_size)
+            if last_id is not None:
+                query = query.where(Users.id > last_id)
+
+            async with engine.connect() as connection:
+                owner_ids = list((await connection.execute(query)).scalars())
+
+            if not owner_ids:
+                break
+
+            result.corrected += await self.reconcile_batch(engine, owner_ids)
+            result.owners += len(owner_ids)
+            result.batches += 1
+            last_id = owner_ids[-1]
+
+            if len(owner_ids) < self.batch_size:
+                break
+
+            await asyncio.sleep(self.batch_pause)
+
+        if result.corrected:
+            logger.warning(
+                "Corrected the todo stats of %d of %d users", result.corrected, result.owners
+            )
+        else:
+            logger.info("Todo stats of %d users are correct", result.owners)
+
+        return result
+
+    def start(self, engine: AsyncEngine, redis_client: redis.Redis) -> None:
+        """
+        Only Postgres keeps counters, so anywhere else there's nothing to reconcile.
+        """
+        if engine.dialect.name != "postgresql":
+            return
+
+        super().start(engine, redis_client)
+
+
+stats_reconciler = StatsReconciler(
+    settings.TODO_STATS_RECONCILE_INTERVAL,
+    settings.TODO_STATS_RECONCILE_BATCH_SIZE,
+    settings.TODO_STATS_RECONCILE_BATCH_PAUSE,
+)
@@ -0,0 +1,49 @@
+"""
+Apply pending database migrations.
+
+    python -m main.migrate          # migrate to the latest version
+    python -m main.migrate --check  # only report the current version
+"""
+
+import argparse
+import asyncio
+import logging
+
+from main.core.database import create_engine
+from main.core.migrations import LATEST_VERSION, get_version, migrate
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger("main.migrate")
+
+
+async def run(check: bool) -> None:  # noqa: D103
+    engine = create_engine()
+
+    try:
+        if check:
+            async with engine.connect() as connection:
+                version = await get_version(connection)
+            logger.info("Database is at version %d, latest is %d", version, LATEST_VERSION)
+            return
+
+        applied = await migrate(engine)
+        logger.info(
+            "Applied %d migrations, database is at version %d", len(applied), LATEST_VERSION
+        )
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--check", action="store_true", help="only report the version")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOGGING_LEVEL)
+    asyncio.run(run(args.check))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Hash partition the todo table by owner, online, Postgres only.
+
+    python -m main.partition_todos             # prepare, backfill and cut over
+    python -m main.partition_todos prepare     # create the copy and start mirroring
+    python -m main.partition_todos backfill    # copy existing rows, safe to rerun
+    python -m main.partition_todos cutover     # swap the tables
+    python -m main.partition_todos status
+
+The app keeps serving throughout, see main.core.todo_partitions. Defaults come
+from TODO_PARTITIONS, TODO_PARTITION_BATCH_SIZE and TODO_PARTITION_BATCH_PAUSE.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+from main.core.database import create_engine
+from main.core.settings import get_settings
+from main.core.todo_partitions import (
+    NEW_TABLE,
+    backfill,
+    cutover,
+    is_backfilled,
+    is_partitioned,
+    prepare,
+    row_counts,
+    table_exists,
+)
+
+settings = get_settings()
+
+logger = logging.getLogger("main.partition_todos")
+
+
+async def status(engine: AsyncEngine) -> None:  # noqa: D103
+    async with engine.connect() as connection:
+        if await is_partitioned(connection):
+            logger.info("The todo table is partitioned")
+        elif await table_exists(connection, NEW_TABLE):
+            old, new = await row_counts(connection)
+            logger.info("%d of %d todos copied to %s", new, old, NEW_TABLE)
+            if await is_backfilled(connection):
+                logger.info("The backfill has finished, ready to cut over")
+        else:
+            logger.info("The todo table isn't partitioned")
+
+
+async def run(args: argparse.Namespace) -> None:  # noqa: D103
+    engine = create_engine()
+
+    try:
+        if args.command == "status":
+            await status(engine)
+            return
+
+        if args.command in ["run", "prepare"]:
+            async with engine.begin() as connection:
+                await prepare(connection, args.partitions)
+            logger.info("Mirroring writes into %s", NEW_TABLE)
+
+        if args.command in ["run", "backfill"]:
+            await backfill(engine, args.batch_size, args.batch_pause)
+
+        if args.command in ["run", "cutover"]:
+            async with engine.begin() as connection:
+                await cutover(connection)
+            logger.info("The todo table is partitioned by owner")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["run", "prepare", "backfill", "cutover", "status"],
+        default="run",
+    )
+    parser.add_argument("--partitions", type=int, default=settings.TODO_PARTITIONS)
+    parser.add_argument("--batch-size", type=int, default=settings.TODO_PARTITION_BATCH_SIZE)
+    parser.add_argument(
+        "--batch-pause",
+        type=float,
+        default=settings.TODO_PARTITION_BATCH_PAUSE,
+        help="in seconds",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOGGING_LEVEL)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Delete expired and inactive tokens, e.g. from cron when TOKEN_REAPER_ENABLED is off.
+
+    python -m main.reap_tokens             # reap once
+    python -m main.reap_tokens partition   # range partition the table, Postgres only
+
+Batches skip rows that are locked, so this is safe to run alongside the app.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from main.core.database import create_engine
+from main.core.partitions import partition_tokens
+from main.core.reaper import token_reaper
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger("main.reap_tokens")
+
+
+async def run(command: str) -> None:  # noqa: D103
+    engine = create_engine()
+
+    try:
+        if command == "partition":
+            async with engine.begin() as connection:
+                await partition_tokens(connection)
+            logger.info("The tokens table is partitioned by expiry")
+        else:
+            await token_reaper.run_once(engine)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("command", nargs="?", choices=["reap", "partition"], default="reap")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOGGING_LEVEL)
+    asyncio.run(run(args.command))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Run the app in production, with one worker process per CPU by default.
+
+    python -m main.serve
+
+Gunicorn supervises the workers, restarting any that die or, with
+SERVER_MAX_REQUESTS, that have served enough requests. Each worker runs uvicorn on
+uvloop with the httptools parser. On SIGTERM workers stop accepting connections
+and get SERVER_GRACEFUL_TIMEOUT seconds to finish in-flight requests, after which
+lingering ones, like change feed streams, are cancelled and the app shuts down
+cleanly. Feed clients then reconnect to another worker with their Last-Event-ID.
+
+With SERVER_PRELOAD the app is imported once before forking. The Redis pool and
+database engine are only connected by the app's lifespan, which runs in every
+worker, but they're reset after the fork regardless so no socket is ever shared.
+
+Metrics from every worker are aggregated through PROMETHEUS_MULTIPROC_DIR, which
+defaults to a fresh temporary directory.
+"""
+
+import glob
+import logging
+import os
+import tempfile
+from typing import Any
+
+from gunicorn.app.base import BaseApplication
+from uvicorn_worker import UvicornWorker
+
+from main.core.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger("main.serve")
+
+
+class Worker(UvicornWorker):  # noqa: D101
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "lifespan": "on",
+        "timeout_graceful_shutdown": settings.SERVER_GRACEFUL_TIMEOUT,
+    }
+
+
+class Server(BaseApplication):
+    """
+    Gunicorn, configured from the settings instead of its command line.
+    """
+
+    def __init__(self, options: dict[str, Any]) -> None:  # noqa: D107
+        self.options = options
+        self.application = None
+        super().__init__()
+
+    def load_config(self) -> None:  # noqa: D102
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+        self.cfg.set("post_fork", self.post_fork)
+        self.cfg.set("child_exit", self.child_exit)
+
+    def load(self):  # noqa: ANN201, D102
+        if self.application is None:
+            from server import app
+
+            self.application = app
+
+        return self.application
+
+    def post_fork(self, server: Any, worker: Any) -> None:  # noqa: ANN401, ARG002, D102
+        if self.application is not None:
+            self.application.after_fork()
+
+    def child_exit(self, server: Any, worker: Any) -> None:  # noqa: ANN401, ARG002, D102
+        if settings.METRICS_ENABLED:
+            from prometheus_client import multiprocess
+
+            multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_count() -> int:  # noqa: D103
+    return settings.SERVER_WORKERS or os.cpu_count() or 1
+
+
+def prepare_metrics_dir() -> None:
+    """
+    Point every worker at the same, empty, metrics directory.
+
+    Must run before anything imports prometheus_client.
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+    if path is None:
+        path = tempfile.mkdtemp(prefix="todoapi-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+        return
+
+    # Samples left over from a previous run would be aggregated too
+    os.makedirs(path, exist_ok=True)
+    for leftover in glob.glob(os.path.join(path, "*.db")):
+        os.remove(leftover)
+
+
+def options() -> dict[str, Any]:  # noqa: D103
+    return {
+        "bind": f"{settings.SERVER_HOST}:{settings.SERVER_PORT}",
+        "workers": worker_count(),
+        "worker_class": "main.serve.Worker",
+        "preload_app": settings.SERVER_PRELOAD,
+        "max_requests": settings.SERVER_MAX_REQUESTS,
+        "max_requests_jitter": settings.SERVER_MAX_REQUESTS_JITTER,
+        # Leaves the app time to shut down after uvicorn's own timeout
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT + 5,
+        "keepalive": settings.SERVER_KEEPALIVE,
+        # Trusts the same proxies' X-Forwarded-For as the rate limiter
+        "forwarded_allow_ips": ",".join(settings.RATELIMIT_TRUSTED_PROXIES),
+        "loglevel": logging.getLevelName(settings.LOGGING_LEVEL).lower(),
+        "accesslog": "-" if settings.DEBUG else None,
+    }
+
+
+def main() -> None:  # noqa: D103
+    if settings.METRICS_ENABLED:
+        prepare_metrics_dir()
+
+    logging.basicConfig(level=settings.LOGGING_LEVEL)
+    logger.info("Starting %d workers on %s", worker_count(), options()["bind"])
+
+    Server(options()).run()
+
+
+if __name__ == "__main__":
+    main()
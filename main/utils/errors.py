@@ -11,3 +11,19 @@ invalid_token = HTTPException(
     detail="Invalid token",
     headers={"WWW-Authenticate": "Bearer"},
 )
+
+service_unavailable = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Server is busy. Retry later.",
+    headers={"Retry-After": "1"},
+)
+
+invalid_cursor = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Invalid cursor",
+)
+
+no_changes = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="No changes given",
+)
@@ -0,0 +1,37 @@
+def make_etag(row_id: object, version: int) -> str:
+    """
+    A strong ETag that changes whenever the row's version does.
+    """
+    return f'"{row_id}-{version}"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Check an If-None-Match or If-Match header, which may list several ETags.
+    """
+    if header.strip() == "*":
+        return True
+
+    return any(
+        candidate.strip().removeprefix("W/") == etag for candidate in header.split(",")
+    )
+
+
+def etag_versions(header: str, row_id: object) -> list[int] | None:
+    """
+    The versions of `row_id` an If-Match header lists, None if it matches any.
+    """
+    if header.strip() == "*":
+        return None
+
+    prefix = f'"{row_id}-'
+    versions = []
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith(prefix) and candidate.endswith('"'):
+            version = candidate[len(prefix) : -1]
+            if version.isdigit():
+                versions.append(int(version))
+
+    return versions
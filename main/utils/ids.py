@@ -0,0 +1,26 @@
+import os
+import time
+from uuid import UUID
+
+
+def uuid7() -> UUID:
+    """
+    A time-ordered UUID, version 7 of RFC 9562.
+
+    The first 48 bits are the Unix time in milliseconds and the next 12 a fraction
+    of the millisecond, so ids generated later sort later and new rows are appended
+    to the end of the primary key index instead of landing on random pages. The
+    remaining 62 bits are random.
+    """
+    nanoseconds = time.time_ns()
+    milliseconds, remainder = divmod(nanoseconds, 1_000_000)
+    fraction = remainder * 4096 // 1_000_000
+    random_bits = int.from_bytes(os.urandom(8)) & (1 << 62) - 1
+
+    return UUID(
+        int=(milliseconds & (1 << 48) - 1) << 80
+        | 0x7 << 76
+        | fraction << 64
+        | 0b10 << 62
+        | random_bits
+    )
@@ -0,0 +1,30 @@
+from collections.abc import AsyncIterable, AsyncIterator
+
+from fastapi import HTTPException, status
+
+MAX_LINE_SIZE = 1024 * 1024
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, bytes]]:
+    """
+    Split a byte stream into numbered lines without ever buffering more than one line.
+    """  # noqa: E501
+    buffer = b""
+    line_number = 0
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+
+        for line in lines:
+            line_number += 1
+            yield line_number, line
+
+        if len(buffer) > MAX_LINE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Line {line_number + 1} is longer than {MAX_LINE_SIZE} bytes",
+            )
+
+    if buffer:
+        yield line_number + 1, buffer
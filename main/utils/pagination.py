@@ -0,0 +1,39 @@
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+
+from main.utils.errors import invalid_cursor
+
+
+def encode_cursor(order_by: str, value: datetime | float, row_id: UUID) -> str:
+    """
+    Encode the position after a row as an opaque cursor.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+
+    payload = json.dumps([order_by, value, str(row_id)])
+
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, order_by: str) -> tuple[datetime | float, UUID]:
+    """
+    Decode a cursor made by `encode_cursor`, it must have been made for the same ordering.
+    """  # noqa: E501
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        cursor_order_by, value, row_id = payload
+
+        if cursor_order_by != order_by:
+            raise invalid_cursor
+
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, int | float):
+            raise invalid_cursor
+
+        return value, UUID(row_id)
+    except (ValueError, TypeError):
+        raise invalid_cursor from None
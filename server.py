@@ -3,36 +3,78 @@ from typing import Any
 
 import redis.asyncio as redis
 from fastapi import FastAPI
+from fastapi.datastructures import Default
 from fastapi.middleware.cors import CORSMiddleware
 from main.api.v1.router import router as main_api_router
+from main.core import database
+from main.core.auth_cache import token_cache
+from main.core.cache import invalidation_bus
+from main.core.change_feed import change_feed
+from main.core.metrics import MetricsMiddleware, instrument_engine, metrics_endpoint
+from main.core.migrations import check_schema
+from main.core.rate_limit_policies import BUCKETS, POLICIES, token_owner
 from main.core.rate_limiter import RateLimiterMiddleware
-from main.core.settings import AppSettings
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.ext.asyncio.engine import AsyncEngine
-from sqlmodel import SQLModel
+from main.core.reaper import token_reaper
+from main.core.replicas import replica_set
+from main.core.revocation import revocation_list
+from main.core.security import password_hasher
+from main.core.settings import get_settings
+from main.core.todo_cache import todo_cache
+from main.core.todo_stats import stats_reconciler
+from main.utils.responses import response_class
 
-settings = AppSettings()
+settings = get_settings()
 
 
 class CustomApp(FastAPI):  # noqa: D101
     def __init__(self, *args: any, **kwargs: dict[str, Any]) -> None:  # noqa: D107
         super().__init__(*args, **kwargs)
 
-    @staticmethod
-    def return_engine() -> AsyncEngine:  # noqa: D102
-        return create_async_engine(
-            settings.DATABASE_URL,
-            echo=settings.DEBUG,
-        )
-
     async def startup(self) -> None:  # noqa: D102
-        self.engine = self.return_engine()
+        # The only engine in the process, every session is opened on it
+        self.engine = database.init_engine()
+
+        # Migrations are run once per deploy by `python -m main.migrate`
+        await check_schema(self.engine)
+
+        replica_engines = replica_set.start(settings.DATABASE_REPLICA_URLS)
+
+        if settings.METRICS_ENABLED:
+            for engine in [self.engine, *replica_engines]:
+                instrument_engine(engine)
+
+        token_cache.bind(self.redis)
+        todo_cache.bind(self.redis)
+        change_feed.bind(self.redis)
+        if settings.AUTH_TOKEN_MODE == "jwt":
+            await revocation_list.load(self.redis)
+        await invalidation_bus.start(self.redis)
+
+        if settings.TOKEN_REAPER_ENABLED:
+            token_reaper.start(self.engine, self.redis)
+
+        if settings.TODO_STATS_RECONCILE_ENABLED:
+            stats_reconciler.start(self.engine, self.redis)
+
+    def after_fork(self) -> None:
+        """
+        Drop connections inherited from the process that loaded the app, see main.serve.
 
-        async with self.engine.begin() as conn:
-            await conn.run_sync(SQLModel.metadata.create_all)
+        Sockets can't be shared between processes, so every worker opens its own.
+        """
+        self.redis.connection_pool.reset()
+
+        if database.engine is not None:
+            database.engine.sync_engine.dispose(close=False)
 
     async def shutdown(self) -> None:  # noqa: D102
-        await self.engine.dispose()
+        await token_reaper.stop()
+        await stats_reconciler.stop()
+        await invalidation_bus.stop()
+        password_hasher.shutdown()
+        await replica_set.stop()
+        await database.dispose_engine()
+        await self.redis.aclose()
 
 
 @asynccontextmanager
@@ -44,11 +86,24 @@ async def lifespan(app: CustomApp):  # noqa: D103, ANN201
     await app.shutdown()
 
 
-def create_app() -> CustomApp:
+def create_app(redis_client: redis.Redis | None = None) -> CustomApp:
     """
     Create the FastAPI application.
-    """
-    app: CustomApp = CustomApp(lifespan=lifespan)
+
+    A single pooled Redis client is shared by everything in the app and is closed on shutdown.
+    """  # noqa: E501
+    # Wrapped in Default, so routes with a response model keep FastAPI's own fast
+    # path of serializing straight from the model
+    app: CustomApp = CustomApp(
+        lifespan=lifespan, default_response_class=Default(response_class)
+    )
+
+    if redis_client is None:
+        redis_client = redis.Redis(
+            connection_pool=redis.ConnectionPool.from_url(settings.REDIS_URL)
+        )
+
+    app.redis = redis_client
 
     app.add_middleware(
         CORSMiddleware,
@@ -58,15 +113,26 @@ def create_app() -> CustomApp:
         allow_headers=["*"],
     )
 
-    redis_pool = redis.ConnectionPool.from_url(settings.REDIS_URL)
-
     app.add_middleware(
         RateLimiterMiddleware,
         limit=settings.GLOBAL_RATELIMIT_LIMIT,
         interval=settings.GLOBAL_RATELIMIT_INTERVAL,
-        redis_pool=redis_pool,
+        redis_client=redis_client,
+        algorithm=settings.GLOBAL_RATELIMIT_ALGORITHM,
+        local_tier=settings.GLOBAL_RATELIMIT_LOCAL_TIER,
+        sync_interval=settings.GLOBAL_RATELIMIT_SYNC_INTERVAL,
+        max_error=settings.GLOBAL_RATELIMIT_MAX_ERROR,
+        buckets=BUCKETS,
+        policies=POLICIES,
+        trusted_proxies=settings.RATELIMIT_TRUSTED_PROXIES,
+        token_owner=token_owner,
     )
 
+    # Added last so it is the outermost middleware and times everything else too
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware, metrics_path=settings.METRICS_PATH)
+        app.add_route(settings.METRICS_PATH, metrics_endpoint, include_in_schema=False)
+
     for i in settings.ALL_API_VERSIONS:
         if i not in settings.DEPRECATED_API_VERSIONS:
             app.include_router(main_api_router, prefix=f"/{settings.API_PREFIX}/{i}")
@@ -0,0 +1,110 @@
+"""
+Every test gets the app running in-process on a fresh SQLite database and its own
+fakeredis, so tests never need a real Postgres or Redis:
+
+    pip install -r requirements.txt -r tests/requirements.txt
+    python -m pytest
+"""
+
+import os
+import tempfile
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+import pytest
+
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="todoapi-tests-"), "tests.sqlite")
+
+# Settings are read once, on first import, so this must run before the app is imported
+os.environ.setdefault("SECRET_KEY", "tests")
+os.environ.setdefault("REDIS_PASSWORD", "tests")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["METRICS_ENABLED"] = "false"
+os.environ["TOKEN_REAPER_ENABLED"] = "false"
+# Every request comes from the same client address, so it must never be limited
+os.environ["GLOBAL_RATELIMIT_LIMIT"] = str(10**9)
+os.environ["AUTH_RATELIMIT_LIMIT"] = str(10**9)
+os.environ["BULK_RATELIMIT_LIMIT"] = str(10**9)
+
+import httpx  # noqa: E402
+
+SignUp = Callable[[str], Awaitable[dict]]
+
+
+@pytest.fixture
+def anyio_backend() -> str:  # noqa: D103
+    return "asyncio"
+
+
+async def migrate_database() -> None:  # noqa: D103
+    from main.core.database import create_engine
+    from main.core.migrations import migrate
+
+    if os.path.exists(DATABASE_PATH):
+        os.remove(DATABASE_PATH)
+
+    engine = create_engine()
+    await migrate(engine)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def app():  # noqa: ANN201
+    import fakeredis
+
+    import server
+
+    await migrate_database()
+
+    app = server.create_app(redis_client=fakeredis.aioredis.FakeRedis())
+    async with app.router.lifespan_context(app):
+        yield app
+
+
+@pytest.fixture
+async def client(app) -> AsyncIterator[httpx.AsyncClient]:  # noqa: ANN001, D103
+    from main.core.settings import get_settings
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app),
+        base_url=f"http://test/{get_settings().API_PREFIX}/v1",
+    ) as client:
+        yield client
+
+
+@pytest.fixture
+def sign_up(client: httpx.AsyncClient) -> SignUp:
+    """
+    Create a user and log them in, returning their Authorization header.
+    """
+
+    async def sign_up(username: str) -> dict:
+        credentials = {"username": username, "password": "password"}
+        response = await client.post("/users/", json=credentials)
+        assert response.status_code == 200, response.text
+
+        response = await client.post("/users/token", json=credentials)
+        assert response.status_code == 200, response.text
+
+        return {"Authorization": f"Bearer {response.json()['token']}"}
+
+    return sign_up
+
+
+async def create_todo(client: httpx.AsyncClient, headers: dict, **fields: object) -> dict:
+    """
+    Create a todo, returning it.
+    """
+    response = await client.post(
+        "/todos/",
+        headers=headers,
+        json={
+            "title": "todo",
+            "description": "Created by the tests",
+            "due_at": "2030-01-01T00:00:00",
+            **fields,
+        },
+    )
+    assert response.status_code == 200, response.text
+
+    return response.json()
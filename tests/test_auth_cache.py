@@ -0,0 +1,22 @@
+import pytest
+
+from main.core.auth_cache import token_cache, token_key
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cached_tokens_leave_out_the_password_hash(client, sign_up):
+    headers = await sign_up("alice")
+    token = headers["Authorization"].removeprefix("Bearer ")
+
+    token_cache.local.clear()
+    response = await client.get("/users/", headers=headers)
+    assert response.status_code == 200
+
+    cached = token_cache.local.get(token_key(token))
+    assert "hashed_password" not in cached["User"]
+
+    # Served from the cache
+    response = await client.get("/users/", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "alice"
@@ -0,0 +1,67 @@
+from uuid import uuid4
+
+import fakeredis
+import pytest
+
+from main.core.change_feed import ChangeFeed
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def feed() -> ChangeFeed:  # noqa: D103
+    feed = ChangeFeed(queue_size=10, retention=3, ttl=60, heartbeat=1)
+    feed.bind(fakeredis.aioredis.FakeRedis())
+    return feed
+
+
+async def publish(feed: ChangeFeed, user_id: object, count: int) -> list[str]:
+    """
+    Publish `count` events one at a time, returning their ids.
+    """
+    for index in range(count):
+        await feed.publish(user_id, {"type": "created", "index": index})
+
+    entries = await feed.redis.xrange(f"todo:feed:{user_id}")
+    return [event_id.decode() for event_id, _ in entries]
+
+
+async def test_resumes_after_the_last_event_read(feed):
+    user_id = uuid4()
+    ids = await publish(feed, user_id, 3)
+
+    events, complete = await feed.read_since(str(user_id), ids[0])
+
+    assert complete
+    assert [event.id for event in events] == ids[1:]
+    assert [event.data["index"] for event in events] == [1, 2]
+
+
+async def test_reads_everything_from_the_start(feed):
+    user_id = uuid4()
+    ids = await publish(feed, user_id, 2)
+
+    events, complete = await feed.read_since(str(user_id), "0-0")
+
+    assert complete
+    assert [event.id for event in events] == ids
+
+
+async def test_is_incomplete_once_events_were_trimmed(feed):
+    user_id = uuid4()
+    ids = await publish(feed, user_id, 2)
+    # As the stream's retention would, before the client reconnects
+    await feed.redis.xtrim(f"todo:feed:{user_id}", maxlen=0)
+    await publish(feed, user_id, 3)
+
+    events, complete = await feed.read_since(str(user_id), ids[0])
+
+    assert not complete
+    assert len(events) == 3
+
+
+async def test_an_empty_stream_is_incomplete_unless_reading_from_the_start(feed):
+    user_id = str(uuid4())
+
+    assert await feed.read_since(user_id, "0-0") == ([], True)
+    assert await feed.read_since(user_id, "1-0") == ([], False)
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from main.core.database import InstrumentedQueuePool, pool_stats
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_only_checkouts_that_block_count_as_waits(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/pool.sqlite",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+    )
+
+    async def query(hold: float) -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            await asyncio.sleep(hold)
+
+    async def query_later() -> None:
+        await asyncio.sleep(0.05)
+        await query(0)
+
+    try:
+        await query(0)
+        await query(0)
+        await asyncio.gather(query(0.2), query_later())
+
+        stats = pool_stats(engine)
+    finally:
+        await engine.dispose()
+
+    assert stats["checkout_count"] == 4
+    assert stats["wait_count"] == 1
+    assert stats["wait_time_max"] >= 0.1
+
+
+async def test_pool_stats_are_not_served_by_default(client):
+    response = await client.get("/system/pool")
+
+    assert response.status_code == 404
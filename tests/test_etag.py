@@ -0,0 +1,32 @@
+from uuid import uuid4
+
+from main.utils.etag import etag_matches, etag_versions, make_etag
+
+
+def test_etag_versions_lists_versions_of_the_row():
+    row_id = uuid4()
+    header = f"{make_etag(row_id, 3)}, {make_etag(row_id, 5)}"
+
+    assert etag_versions(header, row_id) == [3, 5]
+
+
+def test_etag_versions_ignores_other_rows_and_garbage():
+    row_id = uuid4()
+    header = f'{make_etag(uuid4(), 1)}, "{row_id}-x", {make_etag(row_id, 2)}, nonsense'
+
+    assert etag_versions(header, row_id) == [2]
+    assert etag_versions(make_etag(uuid4(), 1), row_id) == []
+
+
+def test_etag_versions_matches_any_version_for_a_wildcard():
+    assert etag_versions(" * ", uuid4()) is None
+
+
+def test_etag_matches_weak_and_listed_etags():
+    row_id = uuid4()
+    etag = make_etag(row_id, 1)
+
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches(f"{make_etag(row_id, 2)}, {etag}", etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(make_etag(row_id, 2), etag)
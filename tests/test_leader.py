@@ -0,0 +1,26 @@
+import fakeredis
+import pytest
+
+from main.core.leader import LeaderElectedJob
+
+pytestmark = pytest.mark.anyio
+
+
+class Job(LeaderElectedJob):  # noqa: D101
+    leader_key = "test:leader"
+    name = "test job"
+
+    async def run_once(self, engine: object) -> None:  # noqa: D102
+        pass
+
+
+async def test_one_worker_claims_each_interval():
+    redis_client = fakeredis.aioredis.FakeRedis()
+    first, second = Job(60), Job(60)
+    second.worker_id = "another worker"
+
+    assert await first.is_leader(redis_client)
+    assert not await second.is_leader(redis_client)
+
+    # Held for the whole interval, as a worker may wake up again after 0.9 of it
+    assert await redis_client.pttl(Job.leader_key) > 59_000
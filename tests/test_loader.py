@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from main.core.loader import Loader
+from main.core.metrics import RequestStats, request_stats
+
+pytestmark = pytest.mark.anyio
+
+
+class Fetcher:  # noqa: D101
+    def __init__(self) -> None:  # noqa: D107
+        self.calls: list[tuple[object, list]] = []
+
+    async def __call__(self, engine: object, keys: list) -> dict:  # noqa: D102
+        self.calls.append((engine, keys))
+        return {key: f"value-{key}" for key in keys if key != "missing"}
+
+
+async def test_concurrent_loads_are_fetched_together():
+    fetch = Fetcher()
+    loader = Loader(fetch, 0.01, 100)
+
+    results = await asyncio.gather(*(loader.load("engine", key) for key in range(5)))
+
+    assert results == [f"value-{key}" for key in range(5)]
+    assert fetch.calls == [("engine", [0, 1, 2, 3, 4])]
+
+
+async def test_the_same_key_is_fetched_once():
+    fetch = Fetcher()
+    loader = Loader(fetch, 0.01, 100)
+
+    results = await asyncio.gather(*(loader.load("engine", "a") for _ in range(3)))
+
+    assert results == ["value-a"] * 3
+    assert fetch.calls == [("engine", ["a"])]
+
+
+async def test_missing_keys_resolve_to_none():
+    loader = Loader(Fetcher(), 0.01, 100)
+
+    assert await loader.load("engine", "missing") is None
+
+
+async def test_batches_are_per_engine():
+    fetch = Fetcher()
+    loader = Loader(fetch, 0.01, 100)
+
+    await asyncio.gather(loader.load("primary", 1), loader.load("replica", 2))
+
+    assert sorted(fetch.calls) == [("primary", [1]), ("replica", [2])]
+
+
+async def test_a_full_batch_is_fetched_before_the_window_closes():
+    fetch = Fetcher()
+    loader = Loader(fetch, 60, 2)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*(loader.load("engine", key) for key in range(4))), 1
+    )
+
+    assert results == [f"value-{key}" for key in range(4)]
+    assert fetch.calls == [("engine", [0, 1]), ("engine", [2, 3])]
+
+
+async def test_a_failed_fetch_fails_every_load():
+    async def fetch(engine: object, keys: list) -> dict:  # noqa: ARG001
+        raise RuntimeError("down")
+
+    loader = Loader(fetch, 0.01, 100)
+
+    results = await asyncio.gather(
+        loader.load("engine", 1), loader.load("engine", 2), return_exceptions=True
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_a_batch_is_not_charged_to_the_request_that_opened_it():
+    stats = RequestStats()
+    seen = []
+
+    async def fetch(engine: object, keys: list) -> dict:  # noqa: ARG001
+        seen.append(request_stats.get())
+        return {}
+
+    loader = Loader(fetch, 0.01, 100)
+    token = request_stats.set(stats)
+    try:
+        await loader.load("engine", 1)
+    finally:
+        request_stats.reset(token)
+
+    assert seen == [None]
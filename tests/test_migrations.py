@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+import main.core.schema.todo  # noqa: F401
+import main.core.schema.token  # noqa: F401
+import main.core.schema.user  # noqa: F401
+from main.core.migrations import LATEST_VERSION, get_version, migrate
+
+pytestmark = pytest.mark.anyio
+
+
+def describe(connection) -> dict:  # noqa: ANN001
+    """
+    Every model table's columns and indexes, as they are in the database.
+    """
+    inspector = inspect(connection)
+
+    return {
+        table: (
+            {column["name"] for column in inspector.get_columns(table)},
+            {index["name"] for index in inspector.get_indexes(table)},
+        )
+        for table in SQLModel.metadata.tables
+    }
+
+
+async def test_migrations_build_the_schema_of_the_models(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/migrated.sqlite")
+    models = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/models.sqlite")
+
+    try:
+        await migrate(engine)
+        async with models.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+
+        async with engine.connect() as connection:
+            migrated = await connection.run_sync(describe)
+            assert await get_version(connection) == LATEST_VERSION
+        async with models.connect() as connection:
+            expected = await connection.run_sync(describe)
+    finally:
+        await engine.dispose()
+        await models.dispose()
+
+    assert migrated == expected
+
+
+async def test_migrations_apply_over_tables_created_by_create_all(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/legacy.sqlite")
+
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+
+        applied = await migrate(engine)
+
+        assert [migration.version for migration in applied] == list(
+            range(1, LATEST_VERSION + 1)
+        )
+        assert await migrate(engine) == []
+    finally:
+        await engine.dispose()
@@ -0,0 +1,81 @@
+import os
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from main.core.migrations import migrate
+from main.core.partitions import (
+    ensure_partitions,
+    month_start,
+    months_ahead,
+    partition_tokens,
+)
+
+# Partitioning is Postgres only, so these run against a scratch database, every
+# table of the app in it is dropped
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.skipif(POSTGRES_URL is None, reason="TEST_POSTGRES_URL isn't set"),
+]
+
+
+@pytest.fixture
+async def engine():  # noqa: ANN201, D103
+    engine = create_async_engine(POSTGRES_URL)
+
+    async with engine.begin() as connection:
+        await connection.execute(
+            text(
+                "DROP TABLE IF EXISTS todo, todo_partitioned, todo_ids, todo_stats, "
+                "tokens, tokens_partitioned, users, schema_version CASCADE"
+            )
+        )
+    await migrate(engine)
+
+    async with engine.begin() as connection:
+        await partition_tokens(connection)
+
+    yield engine
+
+    await engine.dispose()
+
+
+async def test_rows_in_the_default_are_moved_into_a_new_partition(engine):
+    now = datetime.now()
+    # Past every partition created up front, so it lands in the default
+    start = month_start(now, months_ahead() + 1)
+    owner_id = uuid4()
+
+    async with engine.begin() as connection:
+        await connection.execute(
+            text(
+                "INSERT INTO users (id, username, hashed_password, created_at, disabled) "
+                "VALUES (:id, 'alice', '-', now(), false)"
+            ),
+            {"id": owner_id},
+        )
+        await connection.execute(
+            text(
+                "INSERT INTO tokens (id, user_id, created_at, expires_at, active, token, "
+                "token_type) VALUES (:id, :user_id, now(), :expires_at, true, 'token', "
+                "'bearer')"
+            ),
+            {"id": uuid4(), "user_id": owner_id, "expires_at": start + timedelta(days=1)},
+        )
+
+    async with engine.begin() as connection:
+        created = await ensure_partitions(connection, month_start(now, 1))
+
+    assert f"tokens_p{start:%Y%m}" in created
+
+    async with engine.connect() as connection:
+        assert await connection.scalar(text("SELECT count(*) FROM tokens_pdefault")) == 0
+        assert (
+            await connection.scalar(text(f"SELECT count(*) FROM tokens_p{start:%Y%m}"))
+            == 1
+        )
@@ -0,0 +1,98 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+
+from tests.conftest import migrate_database
+
+pytestmark = pytest.mark.anyio
+
+POOL_SIZE = 2
+
+
+def free_port() -> int:  # noqa: D103
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+async def base_url(monkeypatch):  # noqa: ANN001, ANN201
+    """
+    The app served over real HTTP, as streamed responses are only finished by the
+    ASGI transport once they end, with a small connection pool.
+    """
+    import fakeredis
+    import uvicorn
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    import server
+    from main.core import database
+    from main.core.settings import get_settings
+
+    settings = get_settings()
+    await migrate_database()
+
+    monkeypatch.setattr(
+        database,
+        "create_engine",
+        lambda url=None: create_async_engine(
+            url or settings.DATABASE_URL,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=POOL_SIZE,
+            max_overflow=0,
+            pool_timeout=2,
+        ),
+    )
+
+    app = server.create_app(redis_client=fakeredis.aioredis.FakeRedis())
+    port = free_port()
+    config = uvicorn.Config(
+        app, host="127.0.0.1", port=port, log_level="warning", timeout_graceful_shutdown=1
+    )
+    http_server = uvicorn.Server(config)
+    task = asyncio.create_task(http_server.serve())
+
+    while not http_server.started:
+        await asyncio.sleep(0.01)
+
+    yield f"http://127.0.0.1:{port}/{settings.API_PREFIX}/v1"
+
+    http_server.should_exit = True
+    await task
+
+
+async def test_open_feeds_hold_no_database_connections(base_url):
+    from main.core.auth_cache import token_cache
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=10) as http:
+        credentials = {"username": "alice", "password": "password"}
+        await http.post("/users/", json=credentials)
+        response = await http.post("/users/token", json=credentials)
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+        feeds, readers = [], []
+        try:
+            for _ in range(POOL_SIZE + 2):
+                # Every feed authenticates against the database
+                token_cache.local.clear()
+
+                feed = http.stream("GET", "/todos/feed", headers=headers)
+                response = await feed.__aenter__()
+                feeds.append(feed)
+
+                assert response.status_code == 200
+                # Kept, an iterator closes the response when it's garbage collected
+                chunks = response.aiter_text()
+                readers.append(chunks)
+                assert await anext(chunks) == ": connected\n\n"
+
+            token_cache.local.clear()
+            response = await http.get("/todos/", headers=headers)
+
+            assert response.status_code == 200
+        finally:
+            for feed in feeds:
+                await feed.__aexit__(None, None, None)
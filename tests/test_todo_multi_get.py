@@ -0,0 +1,22 @@
+from uuid import uuid4
+
+import pytest
+
+from tests.conftest import create_todo
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_multi_get_keeps_order_and_leaves_out_others_todos(client, sign_up):
+    headers = await sign_up("alice")
+    first = await create_todo(client, headers, title="first")
+    second = await create_todo(client, headers, title="second")
+    other = await create_todo(client, await sign_up("bob"))
+
+    ids = [second["id"], other["id"], first["id"], second["id"], str(uuid4())]
+    response = await client.get(
+        "/todos/", headers=headers, params=[("ids", todo_id) for todo_id in ids]
+    )
+
+    assert response.status_code == 200
+    assert [todo["title"] for todo in response.json()["items"]] == ["second", "first"]
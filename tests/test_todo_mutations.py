@@ -0,0 +1,93 @@
+from uuid import uuid4
+
+import pytest
+
+from tests.conftest import create_todo
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_update_returns_the_new_etag(client, sign_up):
+    headers = await sign_up("alice")
+    todo = await create_todo(client, headers)
+
+    etag = (await client.get(f"/todos/{todo['id']}", headers=headers)).headers["ETag"]
+    response = await client.patch(
+        f"/todos/{todo['id']}",
+        headers={**headers, "If-Match": etag},
+        json={"completed": True},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["completed"] is True
+    assert response.headers["ETag"] == f'"{todo["id"]}-2"'
+
+
+async def test_missing_todo_is_not_found(client, sign_up):
+    headers = await sign_up("alice")
+
+    response = await client.patch(f"/todos/{uuid4()}", headers=headers, json={"title": "x"})
+    assert response.status_code == 404
+
+    response = await client.delete(f"/todos/{uuid4()}", headers=headers)
+    assert response.status_code == 404
+
+
+async def test_another_users_todo_is_forbidden(client, sign_up):
+    todo = await create_todo(client, await sign_up("alice"))
+    headers = await sign_up("mallory")
+
+    response = await client.patch(f"/todos/{todo['id']}", headers=headers, json={"title": "x"})
+    assert response.status_code == 403
+
+    response = await client.delete(f"/todos/{todo['id']}", headers=headers)
+    assert response.status_code == 403
+
+
+async def test_stale_if_match_fails_with_the_current_etag(client, sign_up):
+    headers = await sign_up("alice")
+    todo = await create_todo(client, headers)
+    stale = f'"{todo["id"]}-1"'
+
+    await client.patch(f"/todos/{todo['id']}", headers=headers, json={"title": "new"})
+
+    response = await client.patch(
+        f"/todos/{todo['id']}", headers={**headers, "If-Match": stale}, json={"title": "x"}
+    )
+    assert response.status_code == 412
+    assert response.headers["ETag"] == f'"{todo["id"]}-2"'
+
+    response = await client.delete(
+        f"/todos/{todo['id']}", headers={**headers, "If-Match": stale}
+    )
+    assert response.status_code == 412
+
+    response = await client.delete(
+        f"/todos/{todo['id']}", headers={**headers, "If-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 200
+
+
+async def test_empty_update_is_rejected(client, sign_up):
+    headers = await sign_up("alice")
+    todo = await create_todo(client, headers)
+
+    response = await client.patch(f"/todos/{todo['id']}", headers=headers, json={})
+    assert response.status_code == 400
+
+
+async def test_batch_update_bumps_the_version_in_place(client, sign_up):
+    headers = await sign_up("alice")
+    todo = await create_todo(client, headers)
+
+    await client.patch(f"/todos/{todo['id']}", headers=headers, json={"title": "new"})
+    response = await client.post(
+        "/todos/batch",
+        headers=headers,
+        json={"operations": [{"op": "update", "id": todo["id"], "completed": True}]},
+    )
+    assert response.json()["results"][0]["status"] == 200
+
+    response = await client.get(f"/todos/{todo['id']}", headers=headers)
+    assert response.json()["title"] == "new"
+    assert response.headers["ETag"] == f'"{todo["id"]}-3"'
@@ -0,0 +1,95 @@
+import os
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from main.core.migrations import migrate
+from main.core.todo_partitions import backfill, backfill_batch, cutover, prepare
+
+# Partitioning is Postgres only, so these run against a scratch database, every
+# table of the app in it is dropped
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.skipif(POSTGRES_URL is None, reason="TEST_POSTGRES_URL isn't set"),
+]
+
+
+@pytest.fixture
+async def engine():  # noqa: ANN201, D103
+    engine = create_async_engine(POSTGRES_URL)
+
+    async with engine.begin() as connection:
+        await connection.execute(
+            text(
+                "DROP TABLE IF EXISTS todo, todo_partitioned, todo_ids, todo_stats, "
+                "tokens, users, schema_version CASCADE"
+            )
+        )
+    await migrate(engine)
+
+    owner_id = uuid4()
+    async with engine.begin() as connection:
+        await connection.execute(
+            text(
+                "INSERT INTO users (id, username, hashed_password, created_at, disabled) "
+                "VALUES (:id, 'alice', '-', now(), false)"
+            ),
+            {"id": owner_id},
+        )
+        for _ in range(3):
+            await connection.execute(
+                text(
+                    "INSERT INTO todo (id, owner_id, title, description, completed, "
+                    "created_at, due_at, version) "
+                    "VALUES (:id, :owner_id, 'todo', '', false, now(), now(), 1)"
+                ),
+                {"id": uuid4(), "owner_id": owner_id},
+            )
+
+    yield engine
+
+    await engine.dispose()
+
+
+async def count_todos(engine) -> int:  # noqa: ANN001, D103
+    async with engine.connect() as connection:
+        return await connection.scalar(text("SELECT count(*) FROM todo"))
+
+
+async def test_cutover_refuses_to_run_before_the_backfill(engine):
+    async with engine.begin() as connection:
+        await prepare(connection, 4)
+
+    with pytest.raises(RuntimeError, match="backfill"):
+        async with engine.begin() as connection:
+            await cutover(connection)
+
+    assert await count_todos(engine) == 3
+
+
+async def test_cutover_refuses_to_run_on_a_partial_backfill(engine):
+    async with engine.begin() as connection:
+        await prepare(connection, 4)
+    async with engine.begin() as connection:
+        await backfill_batch(connection, UUID(int=0), 1)
+
+    with pytest.raises(RuntimeError, match="backfill"):
+        async with engine.begin() as connection:
+            await cutover(connection)
+
+    assert await count_todos(engine) == 3
+
+
+async def test_cutover_keeps_every_row_once_backfilled(engine):
+    async with engine.begin() as connection:
+        await prepare(connection, 4)
+    await backfill(engine, 1, 0)
+
+    async with engine.begin() as connection:
+        await cutover(connection)
+
+    assert await count_todos(engine) == 3
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.conftest import create_todo
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_stats_count_the_users_todos(client, sign_up):
+    headers = await sign_up("alice")
+    now = datetime.now()
+
+    for due_at in [
+        now - timedelta(days=2),
+        now - timedelta(hours=1),
+        now + timedelta(hours=3),
+        now + timedelta(days=3),
+    ]:
+        await create_todo(client, headers, due_at=due_at.isoformat())
+
+    # Completed todos are neither overdue nor due soon
+    done = await create_todo(client, headers, due_at=(now - timedelta(hours=2)).isoformat())
+    await client.patch(f"/todos/{done['id']}", headers=headers, json={"completed": True})
+
+    await create_todo(client, await sign_up("bob"))
+
+    response = await client.get("/todos/stats", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "total": 5,
+        "completed": 1,
+        "overdue": 2,
+        "due_next_24h": 1,
+    }
+
+
+async def test_stats_follow_deletes(client, sign_up):
+    headers = await sign_up("alice")
+    todo = await create_todo(client, headers)
+    await create_todo(client, headers)
+
+    await client.delete(f"/todos/{todo['id']}", headers=headers)
+
+    response = await client.get("/todos/stats", headers=headers)
+    assert response.json()["total"] == 1
+
+
+async def test_stats_of_a_user_without_todos(client, sign_up):
+    response = await client.get("/todos/stats", headers=await sign_up("alice"))
+
+    assert response.json() == {
+        "total": 0,
+        "completed": 0,
+        "overdue": 0,
+        "due_next_24h": 0,
+    }